@@ -0,0 +1,357 @@
+# hot path benchmarks on synthetic universes, runs offline with benchmarks/fake_xtquant when xtquant is missing
+#   python benchmarks/bench.py --symbols 50 --strategies 5 --ticks 2000 --orders 2000 --out benchmarks/output/bench.json
+#   python benchmarks/bench.py --save-baseline            # store the results as benchmarks/baseline.json
+#   python benchmarks/bench.py --baseline benchmarks/baseline.json --tolerance 0.2   # exit 1 on regression
+from typing import Callable, Dict, List
+from datetime import datetime, timedelta
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# results & reports, kept out of git
+OUTPUT = os.path.join(ROOT, 'benchmarks', 'output')
+sys.path.insert(0, ROOT)
+try:
+    import xtquant.xttrader
+except ImportError:
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks', 'fake_xtquant'))
+
+import toml
+import numpy as np
+from loguru import logger
+
+from open_quant_app.backtest.BackTester import BackTester
+from open_quant_app.backtest.FillModel import TickFillModel
+from open_quant_app.data.MarketDataHub import MarketDataHub
+from open_quant_app.manager.OrderManager import OrderManager, OrderTuple, Order
+from open_quant_app.manager.RiskManager import RiskManager
+from open_quant_app.trade.Trader import Trader, TradeMode
+from open_quant_app.utils.TimeUtils import TimeUtils
+from xtquant import xtconstant
+from xtquant.xttrader import XtQuantTrader
+from xtquant.xttype import XtPosition, XtAsset
+
+START = datetime(2024, 3, 4, 9, 30)
+
+
+class Universe:
+    # synthetic symbols split into strategy tuples, random walk ticks with a level 1 book
+    def __init__(self, symbols: int, strategies: int, ticks: int, seed: int = 7):
+        self.stock_ids = [f'{600000 + i}.SH' for i in range(symbols)]
+        self.tuples = [list(tuple_ids) for tuple_ids in np.array_split(self.stock_ids, strategies)]
+        self.config = toml.load(os.path.join(ROOT, 'config', 'config.toml'))
+        self.config['stock']['stock_ids'] = self.tuples
+        self.config['backtest']['report_dir'] = OUTPUT
+        rng = np.random.default_rng(seed)
+        start_ms = int(START.timestamp() * 1000)
+        # 3s snapshots, like level 1 ticks
+        self.times = start_ms + np.arange(ticks, dtype=np.int64) * 3000
+        steps = rng.choice([-0.01, 0.0, 0.01], size=(symbols, ticks))
+        self.prices = np.round(np.maximum(10 + np.cumsum(steps, axis=1), 1.0), 2)
+        self.volumes = rng.integers(0, 5000, size=(symbols, ticks)).astype(np.float64)
+        self.book_volumes = rng.integers(100, 10000, size=(symbols, ticks)).astype(np.float64)
+
+    def strategy_of(self, i: int) -> int:
+        return next(k for k, tuple_ids in enumerate(self.tuples) if self.stock_ids[i] in tuple_ids)
+
+
+def measure(fn: Callable[[int], None], n: int, batch: int = 1) -> np.ndarray:
+    # per call latency in ns, calls cheaper than the clock are timed in batches
+    latencies = np.empty(max(n // batch, 1), dtype=np.int64)
+    i = 0
+    for k in range(len(latencies)):
+        start = time.perf_counter_ns()
+        for _ in range(batch):
+            fn(i)
+            i += 1
+        latencies[k] = (time.perf_counter_ns() - start) // batch
+    return latencies
+
+
+# every bench returns (units done, per unit latencies in ns[, counters]), setup is not part of the latencies
+def bench_backtest_order_stock(universe: Universe, args) -> tuple:
+    back_tester = BackTester(universe.config, 1e12)
+    n = args.orders
+    prices = universe.prices[:, 0]
+    symbols = len(universe.stock_ids)
+    strategies = [universe.strategy_of(i) for i in range(symbols)]
+
+    def order(i: int):
+        s = i % symbols
+        order_type = xtconstant.STOCK_BUY if (i // symbols) % 2 == 0 else xtconstant.STOCK_SELL
+        back_tester.order_stock(universe.stock_ids[s], order_type, 100, float(prices[s]), strategies[s])
+
+    return n, measure(order, n)
+
+
+def bench_backtest_value(universe: Universe, args) -> tuple:
+    back_tester = BackTester(universe.config, 1e12)
+    for i, stock_id in enumerate(universe.stock_ids):
+        back_tester.order_stock(stock_id, xtconstant.STOCK_BUY, 100, float(universe.prices[i, 0]),
+                                universe.strategy_of(i))
+    n = args.orders * 10
+    return n, measure(lambda i: back_tester.value(), n, batch=100)
+
+
+def bench_risk_check(universe: Universe, args) -> tuple:
+    risk_manager = RiskManager(universe.config)
+    positions = [XtPosition('', stock_id, 100, 100, 10.0, 1000.0, 0, 0, 0, 10.0) for stock_id in universe.tuples[0]]
+    risk_manager.load(positions, XtAsset('', 1e12, 0.0, 0.0, 1e12), [])
+    stock_id = universe.tuples[0][0]
+    n = args.orders * 10
+    return n, measure(lambda i: risk_manager.check([stock_id], [xtconstant.STOCK_BUY], [100], [10.0], [0]), n,
+                      batch=100)
+
+
+def bench_next_trade_timestamp(universe: Universe, args) -> tuple:
+    state = {'timestamp': START}
+
+    def step(i: int):
+        state['timestamp'] = TimeUtils.next_trade_timestamp(state['timestamp'], 3)
+
+    n = args.ticks * 10
+    return n, measure(step, n, batch=100)
+
+
+def bench_max_can_buy(universe: Universe, args) -> tuple:
+    trader = Trader(universe.config, TradeMode.BACKTEST, 1e9)
+    symbols = len(universe.stock_ids)
+    strategies = [universe.strategy_of(i) for i in range(symbols)]
+
+    def check(i: int):
+        s = i % symbols
+        trader.max_can_buy(100, float(universe.prices[s, 0]), strategies[s], universe.stock_ids[s])
+
+    return args.orders, measure(check, args.orders)
+
+
+class CountingXtQuantTrader(XtQuantTrader):
+    # broker round trips of the order path, every query_* call goes to QMT in market mode
+    def __init__(self):
+        super().__init__()
+        self.cash = 1e12
+        self.queries = 0
+
+    def query_stock_orders(self, account, cancelable_only: bool = False):
+        self.queries += 1
+        return super().query_stock_orders(account, cancelable_only)
+
+    def query_stock_positions(self, account):
+        self.queries += 1
+        return super().query_stock_positions(account)
+
+    def query_stock_asset(self, account):
+        self.queries += 1
+        return super().query_stock_asset(account)
+
+
+def bench_market_order_stock(universe: Universe, args) -> tuple:
+    # risk checked order & cancel against the in memory broker, the cancel push releases the working volume
+    broker = CountingXtQuantTrader()
+    trader = Trader(universe.config, TradeMode.MARKET, xt_trader=broker)
+    trader.start()
+    symbols = len(universe.stock_ids)
+    strategies = [universe.strategy_of(i) for i in range(symbols)]
+
+    def order(i: int):
+        s = i % symbols
+        order_id = trader.order_stock(universe.stock_ids[s], xtconstant.STOCK_BUY, 100, float(universe.prices[s, 0]),
+                                      strategies[s])
+        trader.cancel_order_stock(order_id)
+
+    latencies = measure(order, args.orders)
+    trader.close()
+    return args.orders, latencies, {'queries_per_order': broker.queries / args.orders}
+
+
+def order_manager_with_orders(universe: Universe, args, delay: float) -> tuple:
+    # outstanding orders rest in a fill model without ticks, so they never fill
+    trader = Trader(universe.config, TradeMode.BACKTEST, 1e12, fill_model=TickFillModel())
+    order_manager = OrderManager(trader, universe.stock_ids, delay)
+    trader.back_tester.advance(START)
+    for k in range(args.outstanding):
+        s = k % len(universe.stock_ids)
+        stock_id, price = universe.stock_ids[s], float(universe.prices[s, 0]) - 0.05
+        order_id = trader.order_stock(stock_id, xtconstant.STOCK_BUY, 100, price, universe.strategy_of(s))
+        order_manager.insert(OrderTuple([stock_id], [Order(order_id, START, stock_id, xtconstant.STOCK_BUY, 100,
+                                                           price, universe.strategy_of(s))]))
+    return trader, order_manager
+
+
+def bench_order_manager_handle(universe: Universe, args) -> tuple:
+    # steady state: many working orders, none due
+    trader, order_manager = order_manager_with_orders(universe, args, 3600)
+    n = args.orders
+    return n, measure(lambda i: order_manager.handle(START + timedelta(seconds=i % 60)), n)
+
+
+def bench_order_manager_expire(universe: Universe, args) -> tuple:
+    # every outstanding order expires at once, is canceled and chased once, per order latency
+    trader, order_manager = order_manager_with_orders(universe, args, 1)
+    now = START + timedelta(seconds=2)
+    trader.back_tester.advance(now)
+    start = time.perf_counter_ns()
+    order_manager.handle(now)
+    order_manager.handle(now)
+    elapsed = time.perf_counter_ns() - start
+    return args.outstanding, np.array([elapsed // max(args.outstanding, 1)])
+
+
+def bench_fill_model_ticks(universe: Universe, args) -> tuple:
+    # resting buy orders below the market on every symbol, the clock steps through every tick time
+    fill_model = TickFillModel()
+    for i, stock_id in enumerate(universe.stock_ids):
+        prices = universe.prices[i]
+        fill_model.load(stock_id, universe.times, prices, universe.volumes[i], prices - 0.01,
+                        universe.book_volumes[i], prices + 0.01, universe.book_volumes[i])
+    back_tester = BackTester(universe.config, 1e12, fill_model=fill_model)
+    back_tester.advance(START)
+    for k in range(args.outstanding):
+        s = k % len(universe.stock_ids)
+        back_tester.order_stock(universe.stock_ids[s], xtconstant.STOCK_BUY, 100,
+                                float(universe.prices[s, 0]) - 0.02 * (1 + k // len(universe.stock_ids)),
+                                universe.strategy_of(s))
+    timestamps = [datetime.fromtimestamp(t / 1000) for t in universe.times.tolist()]
+    latencies = measure(lambda i: back_tester.advance(timestamps[i]), len(timestamps))
+    # per tick of the whole universe
+    symbols = len(universe.stock_ids)
+    return len(timestamps) * symbols, latencies // symbols
+
+
+def bench_hub_ticks(universe: Universe, args) -> tuple:
+    hub = MarketDataHub(len(universe.stock_ids))
+    hub.subscribe(universe.stock_ids, ['tick'], lambda batch, period: None)
+    symbols, ticks = len(universe.stock_ids), len(universe.times)
+    # one payload per symbol, updated in place before every push
+    payloads = [{stock_id: {'time': 0, 'lastPrice': 0.0, 'volume': 0, 'bidPrice': [0.0], 'askPrice': [0.0],
+                            'bidVol': [100], 'askVol': [100]}} for stock_id in universe.stock_ids]
+    times, prices = universe.times.tolist(), universe.prices.tolist()
+
+    def push(i: int):
+        s, t = i % symbols, i // symbols % ticks
+        payload = payloads[s]
+        quote = payload[universe.stock_ids[s]]
+        quote['time'], quote['lastPrice'], quote['volume'] = times[t], prices[s][t], i
+        quote['bidPrice'][0], quote['askPrice'][0] = prices[s][t] - 0.01, prices[s][t] + 0.01
+        hub.on_data_callback(payload)
+
+    n = ticks * symbols
+    return n, measure(push, n)
+
+
+BENCHES: Dict[str, tuple] = {
+    # name: (function, unit)
+    'backtest_order_stock': (bench_backtest_order_stock, 'orders'),
+    'backtest_value': (bench_backtest_value, 'calls'),
+    'risk_check': (bench_risk_check, 'calls'),
+    'next_trade_timestamp': (bench_next_trade_timestamp, 'ticks'),
+    'max_can_buy': (bench_max_can_buy, 'orders'),
+    'order_manager_handle': (bench_order_manager_handle, 'calls'),
+    'order_manager_expire': (bench_order_manager_expire, 'orders'),
+    'fill_model_ticks': (bench_fill_model_ticks, 'ticks'),
+    'hub_ticks': (bench_hub_ticks, 'ticks'),
+    'market_order_stock': (bench_market_order_stock, 'orders'),
+}
+
+
+def run(name: str, universe: Universe, args) -> dict:
+    fn, unit = BENCHES[name]
+    gc.collect()
+    start = time.perf_counter()
+    # benches may return extra counters, e.g. broker queries per order
+    units, latencies, *extra = fn(universe, args)
+    elapsed = time.perf_counter() - start
+    result = {
+        'unit': unit,
+        'count': int(units),
+        'seconds': elapsed,
+        # setup included in seconds, throughput from the timed calls only
+        f'{unit}_per_s': 1e9 / float(latencies.mean()) if latencies.mean() > 0 else float('inf'),
+        'p50_us': float(np.percentile(latencies, 50)) / 1e3,
+        'p99_us': float(np.percentile(latencies, 99)) / 1e3,
+        'max_us': float(latencies.max()) / 1e3,
+    }
+    for counters in extra:
+        result.update(counters)
+    if args.memory:
+        # second run under tracemalloc, it slows the code down so it is not timed
+        gc.collect()
+        tracemalloc.start()
+        fn(universe, args)
+        result['peak_kb'] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return result
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        key = f"{result['unit']}_per_s"
+        ratio = result[key] / baseline[name][key] if baseline[name][key] > 0 else float('inf')
+        result['baseline_ratio'] = ratio
+        status = 'REGRESSION' if ratio < 1 - tolerance else 'ok'
+        if status != 'ok':
+            regressions.append(name)
+        print(f"{name:24s} {result[key]:14.1f} {key:14s} x{ratio:.2f} of baseline  {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='open quant app hot path benchmarks')
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--strategies', type=int, default=5)
+    parser.add_argument('--ticks', type=int, default=2000, help='ticks per symbol')
+    parser.add_argument('--orders', type=int, default=2000, help='orders / calls of the order path benches')
+    parser.add_argument('--outstanding', type=int, default=500, help='working orders of the order manager benches')
+    parser.add_argument('--only', nargs='*', default=None, help=f'subset of {list(BENCHES)}')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='skip the peak memory runs')
+    parser.add_argument('--out', default=os.path.join(OUTPUT, 'bench.json'))
+    parser.add_argument('--baseline', default=os.path.join(ROOT, 'benchmarks', 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed throughput drop vs the baseline')
+    args = parser.parse_args()
+
+    # sinks off, benches measure the code and not the terminal
+    logger.remove()
+    universe = Universe(args.symbols, args.strategies, args.ticks)
+    results = {}
+    for name in args.only or BENCHES:
+        results[name] = run(name, universe, args)
+        result = results[name]
+        peak = f"{result['peak_kb']:.0f}KB" if 'peak_kb' in result else '-'
+        print(f"{name:24s} {result[result['unit'] + '_per_s']:14.1f} {result['unit']}/s  p50 = "
+              f"{result['p50_us']:.2f}us  p99 = {result['p99_us']:.2f}us  peak = {peak}")
+    report = {
+        'meta': {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'params': {key: value for key, value in vars(args).items() if key not in ('out', 'baseline')},
+        },
+        'results': results,
+    }
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+    path = args.baseline if args.save_baseline else args.out
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"results saved to {path}")
+    if len(regressions) != 0:
+        print(f"regressions: {regressions}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
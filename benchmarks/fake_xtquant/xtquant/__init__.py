@@ -0,0 +1 @@
+# offline stand-in for the parts of xtquant used by open_quant_app, benchmarks only
@@ -0,0 +1,22 @@
+# quote subscriptions are recorded, callers push synthetic payloads themselves
+subscriptions = {}
+
+
+def subscribe_quote(stock_code, period='1d', start_time='', end_time='', count=0, callback=None) -> int:
+    seq = len(subscriptions) + 1
+    subscriptions[seq] = (stock_code, period, callback)
+    return seq
+
+
+def unsubscribe_quote(seq):
+    subscriptions.pop(seq, None)
+
+
+def download_history_data2(stock_list, period, start_time='', end_time='', callback=None, incrementally=None):
+    if callback is not None:
+        callback({'total': len(stock_list), 'finished': len(stock_list), 'stockcode': '', 'message': ''})
+
+
+def get_market_data_ex(field_list=None, stock_list=None, period='1d', start_time='', end_time='', count=-1,
+                       dividend_type='none', fill_data=True) -> dict:
+    return {}
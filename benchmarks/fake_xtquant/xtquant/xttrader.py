@@ -0,0 +1,76 @@
+import time
+
+from xtquant import xtconstant
+from xtquant.xttype import XtAsset, XtOrder, XtOrderResponse
+
+
+class XtQuantTraderCallback:
+    pass
+
+
+class XtQuantTrader:
+    # in memory account: orders are accepted and stay reported, pushes are fired synchronously
+    def __init__(self, path: str = '', session: int = 0, callback: XtQuantTraderCallback = None):
+        self.callback = callback
+        self.cash: float = 1e8
+        self.seq: int = 0
+        self.orders = {}
+
+    def register_callback(self, callback: XtQuantTraderCallback):
+        self.callback = callback
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def connect(self) -> int:
+        return 0
+
+    def subscribe(self, account) -> int:
+        return 0
+
+    def unsubscribe(self, account) -> int:
+        return 0
+
+    def order_stock(self, account, stock_code, order_type, order_volume, price_type, price, strategy_name='',
+                    order_remark='') -> int:
+        self.seq += 1
+        self.orders[self.seq] = XtOrder(account.account_id, stock_code, self.seq, str(self.seq), int(time.time()),
+                                        order_type, order_volume, price_type, price, 0, 0.0,
+                                        xtconstant.ORDER_REPORTED, '', strategy_name, order_remark)
+        return self.seq
+
+    def order_stock_async(self, account, stock_code, order_type, order_volume, price_type, price, strategy_name='',
+                          order_remark='') -> int:
+        order_id = self.order_stock(account, stock_code, order_type, order_volume, price_type, price, strategy_name,
+                                    order_remark)
+        if self.callback is not None:
+            self.callback.on_order_stock_async_response(
+                XtOrderResponse(account.account_id, order_id, strategy_name, order_remark, '', order_id))
+        return order_id
+
+    def cancel_order_stock(self, account, order_id) -> int:
+        order = self.orders.get(order_id)
+        if order is None or order.order_status == xtconstant.ORDER_CANCELED:
+            return -1
+        order.order_status = xtconstant.ORDER_CANCELED
+        if self.callback is not None:
+            self.callback.on_stock_order(order)
+        return 0
+
+    def query_stock_orders(self, account, cancelable_only: bool = False):
+        return list(self.orders.values())
+
+    def query_stock_order(self, account, order_id):
+        return self.orders.get(order_id)
+
+    def query_stock_positions(self, account):
+        return []
+
+    def query_stock_position(self, account, stock_code):
+        return None
+
+    def query_stock_asset(self, account):
+        return XtAsset(account.account_id, self.cash, 0.0, 0.0, self.cash)
@@ -0,0 +1,103 @@
+class StockAccount:
+    def __init__(self, account_id: str, account_type: str = 'STOCK'):
+        self.account_id = account_id
+        self.account_type = account_type
+
+
+class XtPosition:
+    def __init__(self, account_id, stock_code, volume, can_use_volume, open_price, market_value, frozen_volume=0,
+                 on_road_volume=0, yesterday_volume=0, avg_price=0.0):
+        self.account_id = account_id
+        self.stock_code = stock_code
+        self.volume = volume
+        self.can_use_volume = can_use_volume
+        self.open_price = open_price
+        self.market_value = market_value
+        self.frozen_volume = frozen_volume
+        self.on_road_volume = on_road_volume
+        self.yesterday_volume = yesterday_volume
+        self.avg_price = avg_price
+
+
+class XtAsset:
+    def __init__(self, account_id, cash, frozen_cash, market_value, total_asset):
+        self.account_id = account_id
+        self.cash = cash
+        self.frozen_cash = frozen_cash
+        self.market_value = market_value
+        self.total_asset = total_asset
+
+
+class XtOrder:
+    def __init__(self, account_id, stock_code, order_id, order_sysid, order_time, order_type, order_volume,
+                 price_type, price, traded_volume, traded_price, order_status, status_msg='', strategy_name='',
+                 order_remark=''):
+        self.account_id = account_id
+        self.stock_code = stock_code
+        self.order_id = order_id
+        self.order_sysid = order_sysid
+        self.order_time = order_time
+        self.order_type = order_type
+        self.order_volume = order_volume
+        self.price_type = price_type
+        self.price = price
+        self.traded_volume = traded_volume
+        self.traded_price = traded_price
+        self.order_status = order_status
+        self.status_msg = status_msg
+        self.strategy_name = strategy_name
+        self.order_remark = order_remark
+
+
+class XtTrade:
+    def __init__(self, account_id, stock_code, order_type, traded_id, traded_time, traded_price, traded_volume,
+                 traded_amount, order_id, order_sysid, strategy_name='', order_remark=''):
+        self.account_id = account_id
+        self.stock_code = stock_code
+        self.order_type = order_type
+        self.traded_id = traded_id
+        self.traded_time = traded_time
+        self.traded_price = traded_price
+        self.traded_volume = traded_volume
+        self.traded_amount = traded_amount
+        self.order_id = order_id
+        self.order_sysid = order_sysid
+        self.strategy_name = strategy_name
+        self.order_remark = order_remark
+
+
+class XtOrderError:
+    def __init__(self, account_id, order_id, error_id=None, error_msg=None, strategy_name=None, order_remark=None):
+        self.account_id = account_id
+        self.order_id = order_id
+        self.error_id = error_id
+        self.error_msg = error_msg
+        self.strategy_name = strategy_name
+        self.order_remark = order_remark
+
+
+class XtCancelError:
+    def __init__(self, account_id, order_id, market=None, order_sysid=None, error_id=None, error_msg=None):
+        self.account_id = account_id
+        self.order_id = order_id
+        self.market = market
+        self.order_sysid = order_sysid
+        self.error_id = error_id
+        self.error_msg = error_msg
+
+
+class XtOrderResponse:
+    def __init__(self, account_id, order_id, strategy_name, order_remark, error_msg, seq):
+        self.account_id = account_id
+        self.order_id = order_id
+        self.strategy_name = strategy_name
+        self.order_remark = order_remark
+        self.error_msg = error_msg
+        self.seq = seq
+
+
+class XtAccountStatus:
+    def __init__(self, account_id, account_type, status):
+        self.account_id = account_id
+        self.account_type = account_type
+        self.status = status
@@ -0,0 +1,147 @@
+from typing import Dict, Tuple
+import json
+import math
+import os
+
+from open_quant_app.utils.Indicators import RollingMean, RollingVariance, RollingMax
+from xtquant import xtconstant
+
+from loguru import logger
+import numpy as np
+
+
+class Analytics:
+    # 252 days * 4 trading hours
+    TRADING_SECONDS_PER_YEAR = 252 * 4 * 3600
+
+    @staticmethod
+    def periods_per_year(timestamps: np.ndarray) -> float:
+        # from the median sample interval, overnight gaps do not count
+        timestamps = np.asarray(timestamps).astype('datetime64[ms]').astype(np.int64)
+        if len(timestamps) < 2:
+            return 252.0
+        interval = float(np.median(np.diff(timestamps))) / 1000
+        if interval <= 0:
+            return 252.0
+        if interval >= 24 * 3600:
+            return 252.0 * 24 * 3600 / interval
+        return Analytics.TRADING_SECONDS_PER_YEAR / interval
+
+    @staticmethod
+    def returns(equity: np.ndarray) -> np.ndarray:
+        equity = np.asarray(equity, dtype=np.float64)
+        if len(equity) < 2:
+            return np.empty(0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = np.diff(equity) / equity[:-1]
+        return np.where(np.isfinite(result), result, 0.0)
+
+    @staticmethod
+    def sharpe(returns: np.ndarray, periods_per_year: float) -> float:
+        if len(returns) < 2:
+            return math.nan
+        std = returns.std(ddof=1)
+        return float(returns.mean() / std * math.sqrt(periods_per_year)) if std > 0 else math.nan
+
+    @staticmethod
+    def sortino(returns: np.ndarray, periods_per_year: float) -> float:
+        if len(returns) < 2:
+            return math.nan
+        downside = math.sqrt(float((np.minimum(returns, 0.0) ** 2).mean()))
+        return float(returns.mean() / downside * math.sqrt(periods_per_year)) if downside > 0 else math.nan
+
+    @staticmethod
+    def drawdown(equity: np.ndarray) -> np.ndarray:
+        equity = np.asarray(equity, dtype=np.float64)
+        peak = np.maximum.accumulate(equity) if len(equity) != 0 else equity
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(peak > 0, equity / peak - 1, 0.0)
+
+    @staticmethod
+    def max_drawdown(equity: np.ndarray) -> Tuple[float, int]:
+        # (max drawdown, longest number of samples spent below a previous peak)
+        equity = np.asarray(equity, dtype=np.float64)
+        if len(equity) == 0:
+            return 0.0, 0
+        index = np.arange(len(equity))
+        peak_index = np.maximum.accumulate(np.where(equity >= np.maximum.accumulate(equity), index, 0))
+        return float(Analytics.drawdown(equity).min()), int((index - peak_index).max())
+
+    @staticmethod
+    def realized_pnl(order_types: np.ndarray, prices: np.ndarray, volumes: np.ndarray,
+                     stocks: np.ndarray) -> np.ndarray:
+        # pnl of every sell fill against the average cost of the stock, 0 for buys
+        pnl = np.zeros(len(order_types))
+        volume: Dict[object, float] = {}
+        cost: Dict[object, float] = {}
+        for i in range(len(order_types)):
+            stock, price, size = stocks[i], float(prices[i]), float(volumes[i])
+            held, total = volume.get(stock, 0.0), cost.get(stock, 0.0)
+            if order_types[i] == xtconstant.STOCK_BUY:
+                volume[stock], cost[stock] = held + size, total + price * size
+            elif held > 0:
+                avg_price = total / held
+                pnl[i] = (price - avg_price) * size
+                volume[stock], cost[stock] = max(held - size, 0.0), avg_price * max(held - size, 0.0)
+        return pnl
+
+    @staticmethod
+    def win_rate(order_types: np.ndarray, prices: np.ndarray, volumes: np.ndarray, stocks: np.ndarray) -> float:
+        is_sell = np.asarray(order_types) == xtconstant.STOCK_SELL
+        if not is_sell.any():
+            return math.nan
+        pnl = Analytics.realized_pnl(order_types, prices, volumes, stocks)
+        return float((pnl[is_sell] > 0).mean())
+
+    @staticmethod
+    def rolling(equity: np.ndarray, window: int, periods_per_year: float) -> Dict[str, np.ndarray]:
+        # rolling sharpe & drawdown from the rolling peak, aligned with equity, NaN until the window is full
+        equity = np.asarray(equity, dtype=np.float64)
+        returns = np.r_[np.nan, Analytics.returns(equity)] if len(equity) != 0 else np.empty(0)
+        mean = RollingMean.batch(np.nan_to_num(returns), window)
+        std = np.sqrt(RollingVariance.batch(np.nan_to_num(returns), window))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sharpe = np.where(std > 0, mean / std * math.sqrt(periods_per_year), np.nan)
+            drawdown = equity / RollingMax.batch(equity, window) - 1
+        return {'rolling_sharpe': sharpe, 'rolling_drawdown': drawdown}
+
+    @staticmethod
+    def metrics(timestamps: np.ndarray, equity: np.ndarray, strategy_values: np.ndarray, traded: np.ndarray,
+                order_types: np.ndarray, prices: np.ndarray, volumes: np.ndarray, stocks: np.ndarray) -> dict:
+        # strategy_values: (samples, strategies), traded: notional per strategy
+        periods = Analytics.periods_per_year(timestamps)
+        returns = Analytics.returns(equity)
+        max_drawdown, max_drawdown_duration = Analytics.max_drawdown(equity)
+        mean_equity = float(np.mean(equity)) if len(equity) != 0 else math.nan
+        result = {
+            'samples': len(equity),
+            'total_return': float(equity[-1] / equity[0] - 1) if len(equity) != 0 and equity[0] != 0 else math.nan,
+            'sharpe': Analytics.sharpe(returns, periods),
+            'sortino': Analytics.sortino(returns, periods),
+            'max_drawdown': max_drawdown,
+            'max_drawdown_duration': max_drawdown_duration,
+            'turnover': float(np.sum(traded) / mean_equity) if mean_equity > 0 else math.nan,
+            'win_rate': Analytics.win_rate(order_types, prices, volumes, stocks),
+            'fills': len(order_types),
+        }
+        # attribution: pnl of each strategy since the first sample
+        if len(strategy_values) != 0:
+            for strategy_id, pnl in enumerate(strategy_values[-1] - strategy_values[0]):
+                result[f'pnl_{strategy_id}'] = float(pnl)
+        return result
+
+    @staticmethod
+    def save(report_dir: str, name: str, metrics: dict, curves: Dict[str, np.ndarray]):
+        # metrics as json, curves (equal length columns) as parquet, csv when no parquet engine is installed
+        os.makedirs(report_dir, exist_ok=True)
+        with open(os.path.join(report_dir, f'{name}.json'), 'w') as f:
+            json.dump({key: None if isinstance(value, float) and math.isnan(value) else value
+                       for key, value in metrics.items()}, f, indent=2)
+        # pandas is only loaded when a report is written
+        import pandas as pd
+        df = pd.DataFrame(curves)
+        try:
+            df.to_parquet(os.path.join(report_dir, f'{name}.parquet'))
+        except ImportError:
+            logger.warning("no parquet engine (pyarrow), equity curve saved as csv")
+            df.to_csv(os.path.join(report_dir, f'{name}.csv'), index=False)
@@ -0,0 +1,133 @@
+from typing import List, Dict
+
+import numpy as np
+
+
+class FillLedger:
+    # 25 bytes per fill, stock ids are stored as indexes into PositionBook.stock_ids
+    DTYPE = np.dtype([('order_type', 'i1'), ('price', 'f8'), ('volume', 'i8'), ('stock', 'i4'),
+                      ('strategy_id', 'i4')])
+
+    def __init__(self, capacity: int = 1024):
+        self.fills: np.ndarray = np.zeros(capacity, dtype=FillLedger.DTYPE)
+        self.size: int = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, order_type: int, price: float, volume: int, stock: int, strategy_id: int):
+        if self.size == len(self.fills):
+            grown = np.zeros(len(self.fills) * 2, dtype=FillLedger.DTYPE)
+            grown[:self.size] = self.fills
+            self.fills = grown
+        self.fills[self.size] = (order_type, price, volume, stock, strategy_id)
+        self.size += 1
+
+    def view(self) -> np.ndarray:
+        return self.fills[:self.size]
+
+
+class PositionBook:
+    def __init__(self, capacity: int = 64):
+        self.stock_ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.volume: np.ndarray = np.zeros(capacity, dtype=np.int64)
+        self.avg_price: np.ndarray = np.zeros(capacity)
+        self.price: np.ndarray = np.zeros(capacity)
+        # sum(price * volume), maintained incrementally
+        self.market_value: float = 0.0
+
+    def __contains__(self, stock_id: str) -> bool:
+        return stock_id in self.index
+
+    def get(self, stock_id: str) -> int:
+        i = self.index.get(stock_id)
+        if i is not None:
+            return i
+        i = len(self.stock_ids)
+        if i == len(self.volume):
+            self.volume = np.concatenate([self.volume, np.zeros(i, dtype=np.int64)])
+            self.avg_price = np.concatenate([self.avg_price, np.zeros(i)])
+            self.price = np.concatenate([self.price, np.zeros(i)])
+        self.stock_ids.append(stock_id)
+        self.index[stock_id] = i
+        return i
+
+    def buy(self, i: int, price: float, volume: int):
+        if volume == 0:
+            return
+        old_volume, old_price = int(self.volume[i]), float(self.price[i])
+        self.avg_price[i] = (self.avg_price[i] * old_volume + price * volume) / (old_volume + volume)
+        self.volume[i] = old_volume + volume
+        self.price[i] = price
+        self.market_value += price * (old_volume + volume) - old_price * old_volume
+
+    def sell(self, i: int, price: float, volume: int) -> float:
+        old_volume, old_price = int(self.volume[i]), float(self.price[i])
+        self.volume[i] = old_volume - volume
+        self.price[i] = price
+        self.market_value += price * (old_volume - volume) - old_price * old_volume
+        return price * volume
+
+    def mark(self, i: int, price: float):
+        self.market_value += (price - float(self.price[i])) * int(self.volume[i])
+        self.price[i] = price
+
+
+class StrategyBook:
+    # cash flows & holdings per strategy, value = flow + holdings @ prices attributes pnl to the strategy that traded
+    def __init__(self, strategies: int, capacity: int = 64):
+        self.flows: np.ndarray = np.zeros(strategies)
+        self.volumes: np.ndarray = np.zeros((strategies, capacity))
+        # traded notional
+        self.traded: np.ndarray = np.zeros(strategies)
+
+    def fill(self, strategy_id: int, stock: int, is_buy: bool, price: float, volume: int):
+        if not 0 <= strategy_id < len(self.flows):
+            return
+        if stock >= self.volumes.shape[1]:
+            self.volumes = np.concatenate([self.volumes, np.zeros((len(self.flows), stock + 1))], axis=1)
+        notional = price * volume
+        self.flows[strategy_id] += -notional if is_buy else notional
+        self.volumes[strategy_id, stock] += volume if is_buy else -volume
+        self.traded[strategy_id] += notional
+
+    def values(self, prices: np.ndarray) -> np.ndarray:
+        # stocks registered after the book was sized hold no strategy volume yet
+        if len(prices) > self.volumes.shape[1]:
+            self.volumes = np.concatenate(
+                [self.volumes, np.zeros((len(self.flows), len(prices) - self.volumes.shape[1]))], axis=1)
+        return self.flows + self.volumes[:, :len(prices)] @ prices
+
+
+class EquityCurve:
+    # one sample per bar: timestamp (epoch ms), equity, cash & per strategy value
+    def __init__(self, strategies: int, capacity: int = 1024):
+        self.timestamps: np.ndarray = np.zeros(capacity, dtype=np.int64)
+        self.equity: np.ndarray = np.zeros(capacity)
+        self.cash: np.ndarray = np.zeros(capacity)
+        self.strategy_values: np.ndarray = np.zeros((capacity, strategies))
+        self.size: int = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, timestamp: int, equity: float, cash: float, strategy_values: np.ndarray):
+        if self.size == len(self.equity):
+            self.timestamps = np.concatenate([self.timestamps, np.zeros_like(self.timestamps)])
+            self.equity = np.concatenate([self.equity, np.zeros_like(self.equity)])
+            self.cash = np.concatenate([self.cash, np.zeros_like(self.cash)])
+            self.strategy_values = np.concatenate([self.strategy_values, np.zeros_like(self.strategy_values)])
+        self.timestamps[self.size] = timestamp
+        self.equity[self.size] = equity
+        self.cash[self.size] = cash
+        self.strategy_values[self.size] = strategy_values
+        self.size += 1
+
+    def view(self) -> Dict[str, np.ndarray]:
+        return {
+            'timestamp': self.timestamps[:self.size],
+            'equity': self.equity[:self.size],
+            'cash': self.cash[:self.size],
+            'strategy_values': self.strategy_values[:self.size],
+        }
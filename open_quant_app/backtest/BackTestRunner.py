@@ -0,0 +1,95 @@
+from typing import List, Dict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import itertools
+import os
+
+from open_quant_app.backtest.VectorBackTester import VectorBackTester
+from open_quant_app.data.BarStore import BarStore
+from open_quant_app.trade.Trader import Trader, TradeMode
+from open_quant_app.utils.TradingCalendar import TradingCalendar
+
+from loguru import logger
+
+
+class BackTestTask:
+    def __init__(self, strategy_id: int, params: dict = None):
+        self.strategy_id: int = strategy_id
+        self.params: dict = params if params is not None else {}
+
+
+class BackTestRunner:
+    def __init__(self, config: dict, strategy_cls: type, start: datetime, end: datetime, cash: float = 100000,
+                 calendar: TradingCalendar = None, max_workers: int = None):
+        # strategy_cls must be importable at module level, workers receive it by reference
+        self.config = config
+        self.strategy_cls = strategy_cls
+        self.start = start
+        self.end = end
+        self.cash = cash
+        self.calendar = calendar
+        self.max_workers = max_workers if max_workers is not None else os.cpu_count()
+
+    def tasks_from_config(self) -> List[BackTestTask]:
+        return [BackTestTask(strategy_id) for strategy_id in range(len(self.config['stock']['stock_ids']))]
+
+    @staticmethod
+    def tasks_from_grid(strategy_id: int, grid: Dict[str, list]) -> List[BackTestTask]:
+        names = list(grid.keys())
+        return [BackTestTask(strategy_id, dict(zip(names, values)))
+                for values in itertools.product(*[grid[name] for name in names])]
+
+    @staticmethod
+    def make_strategy(config: dict, strategy_cls: type, task: BackTestTask, trader: Trader = None):
+        strategy = strategy_cls(task.strategy_id, trader, config)
+        for name, value in task.params.items():
+            setattr(strategy, name, value)
+        return strategy
+
+    @staticmethod
+    def run_event(config: dict, strategy_cls: type, task: BackTestTask, start: datetime, end: datetime,
+                  cash: float, calendar: TradingCalendar) -> dict:
+        # every worker owns its trader & back tester, accounts are never shared across tasks
+        trader = Trader(config, TradeMode.BACKTEST, cash)
+        strategy = BackTestRunner.make_strategy(config, strategy_cls, task, trader)
+        strategy.main_loop_back(start, end, calendar, report=False)
+        return trader.back_tester.summary(task.strategy_id)
+
+    @staticmethod
+    def run_vector(config: dict, strategy_cls: type, task: BackTestTask, start: datetime, end: datetime,
+                   cash: float, period: str) -> dict:
+        # bars are memory mapped from the local store, nothing is pickled into the worker
+        back_tester = VectorBackTester(config, cash)
+        stock_ids = [stock_id for stock_id_tuple in config['stock']['stock_ids'] for stock_id in stock_id_tuple]
+        timestamps, prices = BarStore.from_config(config).read_aligned(stock_ids, period, start, end)
+        back_tester.load(timestamps, prices)
+        strategy = BackTestRunner.make_strategy(config, strategy_cls, task, None)
+        strategy.main_loop_vector(back_tester, report=False)
+        return back_tester.summary(task.strategy_id)
+
+    def run(self, tasks: List[BackTestTask] = None, vector: bool = False, period: str = '1m') -> 'pd.DataFrame':
+        tasks = self.tasks_from_config() if tasks is None else tasks
+        logger.info(f"run {len(tasks)} backtest tasks with {self.max_workers} workers")
+        rows: List[dict] = [{} for _ in range(len(tasks))]
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            for i in range(len(tasks)):
+                if vector:
+                    future = executor.submit(BackTestRunner.run_vector, self.config, self.strategy_cls, tasks[i],
+                                             self.start, self.end, self.cash, period)
+                else:
+                    future = executor.submit(BackTestRunner.run_event, self.config, self.strategy_cls, tasks[i],
+                                             self.start, self.end, self.cash, self.calendar)
+                futures[future] = i
+            for finished, future in enumerate(as_completed(futures)):
+                i = futures[future]
+                try:
+                    rows[i] = future.result()
+                except Exception as e:
+                    logger.error(f"task {i}, strategy id = {tasks[i].strategy_id} failed: {e}")
+                    rows[i] = {'strategy_id': tasks[i].strategy_id, 'error': str(e)}
+                rows[i].update(tasks[i].params)
+                logger.success(f"task {i} done, {finished + 1}/{len(tasks)} finished")
+        # kept out of the module imports, spawned workers import this module too
+        import pandas as pd
+        return pd.DataFrame(rows)
@@ -1,11 +1,15 @@
-from typing import List, Dict
+from typing import List, Dict, Callable, Tuple
+from datetime import datetime
+import os
 
-from open_quant_app.manager.PositionManager import PositionManager
+from open_quant_app.backtest.Analytics import Analytics
+from open_quant_app.backtest.BackLedger import FillLedger, PositionBook, StrategyBook, EquityCurve
+from open_quant_app.backtest.FillModel import TickFillModel, SimOrder
+from open_quant_app.manager.RiskManager import RiskManager
 from xtquant import xtconstant
-from xtquant.xttype import XtPosition
 
 from loguru import logger
-import pandas as pd
+import numpy as np
 
 
 class BackPosition:
@@ -43,84 +47,241 @@ class BackAccount:
         self.cash -= money
 
 
-class BackOrder:
-    def __init__(self, order_type: int, price: float, volume: int, stock_id: str, strategy_id: int):
-        self.order_type = order_type
-        self.price = price
-        self.volume = volume
-        self.stock_id = stock_id
-        self.strategy_id = strategy_id
-
-
 class BackTester:
-    def __init__(self, config: dict, cash: float = 100000, stock_list: List[str] = None):
+    def __init__(self, config: dict, cash: float = 100000, stock_list: List[str] = None,
+                 fill_model: TickFillModel = None):
         self.account = BackAccount(cash)
         self.stock_ids = config['stock']['stock_ids']
-        self.stocks: Dict[str, BackPosition] = {}
-        for stock_id in self.stocks:
-            self.stocks[stock_id] = BackPosition(stock_id)
-        self.records: List[BackOrder] = []
-        self.position_manager = PositionManager(config)
+        self.stocks = PositionBook()
+        for stock_id_tuple in self.stock_ids:
+            for stock_id in stock_id_tuple:
+                self.stocks.get(stock_id)
+        self.records = FillLedger()
+        # equity is sampled once per equity_interval seconds of simulated time
+        backtest = config.get('backtest', {})
+        self.strategy_book = StrategyBook(len(self.stock_ids), max(len(self.stocks.stock_ids), 64))
+        self.equity = EquityCurve(len(self.stock_ids))
+        self.equity_interval: int = int(backtest.get('equity_interval', 60) * 1000)
+        self.next_sample: int = 0
+        self.report_dir: str = backtest.get('report_dir', '../output')
+        self.risk_manager = RiskManager(config)
+        self.risk_manager.cash = cash
+        # without a fill model orders fill instantly at the order price
+        self.fill_model: TickFillModel = fill_model
+        self.order_listeners: List[Callable[[SimOrder], None]] = []
+        self.order_seq: int = 0
+        # simulated clock, epoch ms
+        self.now: int = 0
 
     def info(self):
         logger.info(f"initial cash = {self.account.cash}")
 
-    def can_buy(self, volume: int, price: float, strategy_id: int) -> bool:
-        xt_positions = []
-        for stock_id in self.stock_ids[strategy_id]:
-            back_position = self.stocks[stock_id]
-            # simulate position data
-            xt_position = XtPosition('backtester', stock_id, back_position.volume, back_position.volume, 0, 0, 0, 0, 0,
-                                     back_position.avg_price)
-            xt_positions.append(xt_position)
-        total_assets = self.value()
-        return not self.position_manager.is_position_limit(xt_positions, strategy_id, volume, price, total_assets)
-
-    def can_sell(self, stock_id: str, volume: int, strategy_id: int) -> bool:
-        if stock_id not in self.stocks:
-            logger.warning(f"you have 0 position for stock {stock_id}, cannot sell !")
-            return False
-        else:
-            position = self.stocks[stock_id]
-            if position.volume < volume:
-                logger.warning(f"position available volume = {position.volume} < sell volume {volume}, cancel !")
-                return False
-            else:
-                return True
+    def state(self) -> dict:
+        # everything but the tick data of the fill model, which is reloaded by the caller
+        return {
+            'account': self.account,
+            'stocks': self.stocks,
+            'records': self.records,
+            'strategy_book': self.strategy_book,
+            'equity': self.equity,
+            'next_sample': self.next_sample,
+            'risk_manager': self.risk_manager,
+            'order_seq': self.order_seq,
+            'now': self.now,
+            'fill_orders': None if self.fill_model is None else (self.fill_model.orders, self.fill_model.pending),
+        }
+
+    def load_state(self, state: dict):
+        self.account = state['account']
+        self.stocks = state['stocks']
+        self.records = state['records']
+        self.strategy_book = state['strategy_book']
+        self.equity = state['equity']
+        self.next_sample = state['next_sample']
+        self.risk_manager = state['risk_manager']
+        self.order_seq = state['order_seq']
+        self.now = state['now']
+        if self.fill_model is not None and state['fill_orders'] is not None:
+            self.fill_model.orders, self.fill_model.pending = state['fill_orders']
+
+    def check_orders(self, stock_ids: List[str], order_types: List[int], volumes: List[int], prices: List[float],
+                     strategy_ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        self.risk_manager.total_asset = self.value()
+        return self.risk_manager.check(stock_ids, order_types, volumes, prices, strategy_ids, self.now / 1000)
+
+    def can_buy(self, volume: int, price: float, strategy_id: int, stock_id: str = None) -> bool:
+        mask, max_volumes = self.check_orders([stock_id], [xtconstant.STOCK_BUY], [volume], [price], [strategy_id])
+        if not mask[0]:
+            logger.warning(f"id = {strategy_id}: cannot buy {stock_id} volume = {volume}, price = {price}, "
+                           f"max buy volume = {max_volumes[0]}")
+        return bool(mask[0])
+
+    def can_sell(self, stock_id: str, volume: int, strategy_id: int, price: float = 0.0) -> bool:
+        mask, max_volumes = self.check_orders([stock_id], [xtconstant.STOCK_SELL], [volume], [price], [strategy_id])
+        if not mask[0]:
+            logger.warning(f"position available volume = {max_volumes[0]} < sell volume {volume}, cancel !")
+        return bool(mask[0])
 
     def report(self, strategy_id: int, save_as_file: bool = True):
         logger.critical(
             f"init = {self.account.initial_cash}, curr = {self.value()}, "
             f"ratio = {(self.value() - self.account.initial_cash) / self.account.initial_cash}")
+        fills = self.records.view()
         if not save_as_file:
-            for i in range(len(self.records)):
-                record = self.records[i]
+            for i in range(len(fills)):
                 logger.info(
-                    f"[{i}], stock id = {record.stock_id}, type = {'buy' if record.order_type == xtconstant.STOCK_BUY else 'sell'}"
-                    f", price = {record.price}, volume = {record.volume}")
-        elif len(self.records) != 0:
-            df = pd.DataFrame([vars(record) for record in self.records])
-            df[df['strategy_id'] == strategy_id].to_csv(f'../output/strategy-{strategy_id}.csv')
+                    f"[{i}], stock id = {self.stocks.stock_ids[fills['stock'][i]]}, "
+                    f"type = {'buy' if fills['order_type'][i] == xtconstant.STOCK_BUY else 'sell'}"
+                    f", price = {fills['price'][i]}, volume = {fills['volume'][i]}")
+        elif len(fills) != 0:
+            mask = fills['strategy_id'] == strategy_id
+            fills = fills[mask]
+            import pandas as pd
+            df = pd.DataFrame({
+                'order_type': fills['order_type'].astype(np.int64),
+                'price': fills['price'],
+                'volume': fills['volume'],
+                'stock_id': np.array(self.stocks.stock_ids, dtype=object)[fills['stock']],
+                'strategy_id': fills['strategy_id'].astype(np.int64),
+            }, index=np.nonzero(mask)[0])
+            os.makedirs(self.report_dir, exist_ok=True)
+            df.to_csv(os.path.join(self.report_dir, f'strategy-{strategy_id}.csv'))
+        if save_as_file:
+            self.sample()
+            Analytics.save(self.report_dir, f'strategy-{strategy_id}-analytics', self.analytics(strategy_id),
+                           self.curves(strategy_id))
+
+    def summary(self, strategy_id: int) -> dict:
+        order_types = self.records.view()['order_type'][self.records.view()['strategy_id'] == strategy_id]
+        self.sample()
+        summary = {
+            'strategy_id': strategy_id,
+            'init': self.account.initial_cash,
+            'curr': self.value(),
+            'ratio': (self.value() - self.account.initial_cash) / self.account.initial_cash,
+            'orders': len(order_types),
+            'buy_orders': int((order_types == xtconstant.STOCK_BUY).sum()),
+            'sell_orders': int((order_types == xtconstant.STOCK_SELL).sum()),
+        }
+        summary.update(self.analytics(strategy_id))
+        return summary
+
+    def sample(self):
+        # append the current equity, at most once per timestamp
+        if len(self.equity) != 0 and self.equity.timestamps[len(self.equity) - 1] >= self.now:
+            return
+        prices = self.stocks.price[:len(self.stocks.stock_ids)]
+        self.equity.append(self.now, self.value(), self.account.cash, self.strategy_book.values(prices))
+
+    def analytics(self, strategy_id: int) -> dict:
+        # metrics of the whole account, fills & turnover of strategy_id, pnl attribution of every strategy
+        curve = self.equity.view()
+        fills = self.records.view()
+        fills = fills[fills['strategy_id'] == strategy_id]
+        traded = self.strategy_book.traded[strategy_id:strategy_id + 1]
+        return Analytics.metrics(curve['timestamp'], curve['equity'], curve['strategy_values'], traded,
+                                 fills['order_type'], fills['price'], fills['volume'], fills['stock'])
+
+    def curves(self, strategy_id: int, window: int = 240) -> Dict[str, np.ndarray]:
+        curve = self.equity.view()
+        curves = {
+            'timestamp': curve['timestamp'].astype('datetime64[ms]'),
+            'equity': curve['equity'],
+            'cash': curve['cash'],
+            'drawdown': Analytics.drawdown(curve['equity']),
+        }
+        if strategy_id < curve['strategy_values'].shape[1]:
+            curves['strategy_value'] = curve['strategy_values'][:, strategy_id]
+        curves.update(Analytics.rolling(curve['equity'], window, Analytics.periods_per_year(curve['timestamp'])))
+        return curves
+
+    def position(self, stock_id: str) -> BackPosition:
+        i = self.stocks.get(stock_id)
+        position = BackPosition(stock_id, float(self.stocks.price[i]), int(self.stocks.volume[i]))
+        position.avg_price = float(self.stocks.avg_price[i])
+        return position
+
+    def mark(self, stock_id: str, price: float):
+        # mark a position to market without trading
+        self.stocks.mark(self.stocks.get(stock_id), price)
 
     def value(self) -> float:
-        sum = 0
-        for stock_id in self.stocks:
-            sum += self.stocks[stock_id].value()
-        sum += self.account.cash
-        return sum
+        return self.stocks.market_value + self.account.cash
 
     def order_stock(self, stock_id: str, order_type: int, volume: int, price: float, strategy_id: int) -> int:
-        if stock_id not in self.stocks:
-            self.stocks[stock_id] = BackPosition(stock_id)
-        if order_type == xtconstant.STOCK_BUY and self.can_buy(volume, price, strategy_id):
-            self.stocks[stock_id].buy(price, volume)
+        if self.fill_model is not None:
+            return self.submit_order(stock_id, order_type, volume, price, strategy_id)
+        if order_type == xtconstant.STOCK_BUY:
+            passed = self.can_buy(volume, price, strategy_id, stock_id)
+        else:
+            passed = order_type == xtconstant.STOCK_SELL and self.can_sell(stock_id, volume, strategy_id, price)
+        if not passed:
+            return -1
+        self.risk_manager.on_submit(stock_id, order_type, volume, price, strategy_id, self.now / 1000)
+        self.fill(stock_id, order_type, volume, price, strategy_id, price)
+        return 0
+
+    def fill(self, stock_id: str, order_type: int, volume: int, price: float, strategy_id: int, order_price: float):
+        i = self.stocks.get(stock_id)
+        if order_type == xtconstant.STOCK_BUY:
+            self.stocks.buy(i, price, volume)
             self.account.withdraw(price * volume)
-            self.records.append(BackOrder(xtconstant.STOCK_BUY, price, volume, stock_id, strategy_id))
-            return 0
-        elif order_type == xtconstant.STOCK_SELL and self.can_sell(stock_id, volume, strategy_id):
-            money = self.stocks[stock_id].sell(price, volume)
-            self.account.deposit(money)
-            self.records.append(BackOrder(xtconstant.STOCK_SELL, price, volume, stock_id, strategy_id))
-            return 0
         else:
+            self.account.deposit(self.stocks.sell(i, price, volume))
+        self.records.append(order_type, price, volume, i, strategy_id)
+        self.strategy_book.fill(strategy_id, i, order_type == xtconstant.STOCK_BUY, price, volume)
+        self.risk_manager.on_fill(stock_id, order_type, volume, price, strategy_id, order_price)
+
+    def submit_order(self, stock_id: str, order_type: int, volume: int, price: float, strategy_id: int) -> int:
+        # order stays pending until the fill model matches it against ticks
+        if order_type == xtconstant.STOCK_BUY:
+            passed = self.can_buy(volume, price, strategy_id, stock_id)
+        else:
+            passed = order_type == xtconstant.STOCK_SELL and self.can_sell(stock_id, volume, strategy_id, price)
+        if not passed:
+            return -1
+        self.risk_manager.on_submit(stock_id, order_type, volume, price, strategy_id, self.now / 1000)
+        self.order_seq += 1
+        order = SimOrder(self.order_seq, stock_id, order_type, volume, price, self.now, strategy_id)
+        self.fill_model.submit(order)
+        self.notify(order)
+        return order.order_id
+
+    def cancel_order_stock(self, order_id: int) -> int:
+        if self.fill_model is None:
+            return -1
+        order = self.fill_model.cancel(order_id)
+        if order is None:
             return -1
+        self.risk_manager.on_cancel(order.stock_code, order.order_type, order.remaining(), order.price)
+        order.order_status = xtconstant.ORDER_PART_CANCEL if order.traded_volume > 0 else xtconstant.ORDER_CANCELED
+        self.notify(order)
+        return 0
+
+    def advance(self, timestamp: datetime):
+        # move the simulated clock, apply fills up to timestamp, mark positions to the last trade price and
+        # sample equity on bar boundaries
+        self.now = int(round(timestamp.timestamp() * 1000))
+        if self.fill_model is not None:
+            self.match()
+        if self.now >= self.next_sample:
+            self.sample()
+            self.next_sample = (self.now // self.equity_interval + 1) * self.equity_interval
+
+    def match(self):
+        updated: Dict[int, SimOrder] = {}
+        for order, volume, price in self.fill_model.advance(self.now):
+            self.fill(order.stock_code, order.order_type, volume, price, order.strategy_id, order.price)
+            order.traded_price = price
+            updated[order.order_id] = order
+        for order in updated.values():
+            order.order_status = xtconstant.ORDER_SUCCEEDED if order.remaining() <= 0 else xtconstant.ORDER_PART_SUCC
+            self.notify(order)
+        for stock_id in self.fill_model.updated:
+            if stock_id in self.stocks:
+                ticks = self.fill_model.ticks[stock_id]
+                self.mark(stock_id, float(ticks.prices[ticks.end - 1]))
+
+    def notify(self, order: SimOrder):
+        for listener in self.order_listeners:
+            listener(order)
@@ -0,0 +1,94 @@
+from typing import Tuple
+from datetime import date, datetime
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+
+from loguru import logger
+
+
+class Checkpoint:
+    # end of day snapshots of an event backtest, one file per day under checkpoint_dir/key,
+    # key = hash of the config, the strategy & simulator code and the run parameters
+    SIM_MODULES = ['backtest/BackTester.py', 'backtest/BackLedger.py', 'backtest/FillModel.py',
+                   'manager/RiskManager.py', 'manager/OrderManager.py']
+
+    def __init__(self, checkpoint_dir: str, key: str):
+        self.checkpoint_dir: str = checkpoint_dir
+        self.key: str = key
+        self.run_dir: str = os.path.join(checkpoint_dir, key)
+
+    @staticmethod
+    def from_config(config: dict, strategy_cls: type, params: dict):
+        # None when checkpoints are off
+        checkpoint_dir = config.get('backtest', {}).get('checkpoint_dir', '')
+        if checkpoint_dir == '':
+            return None
+        return Checkpoint(checkpoint_dir, Checkpoint.hash(config, strategy_cls, params))
+
+    @staticmethod
+    def code(strategy_cls: type) -> str:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        sources = []
+        for module in Checkpoint.SIM_MODULES:
+            with open(os.path.join(root, module), 'r', encoding='utf-8') as f:
+                sources.append(f.read())
+        try:
+            sources.append(inspect.getsource(sys.modules[strategy_cls.__module__]))
+        except (KeyError, OSError, TypeError):
+            # e.g. defined in an interactive session, only the name is known
+            sources.append(f'{strategy_cls.__module__}.{strategy_cls.__qualname__}')
+        return '\n'.join(sources)
+
+    @staticmethod
+    def hash(config: dict, strategy_cls: type, params: dict) -> str:
+        digest = hashlib.sha1()
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        digest.update(Checkpoint.code(strategy_cls).encode())
+        return digest.hexdigest()[:16]
+
+    @staticmethod
+    def day_closed(day: date, end: datetime) -> bool:
+        # a run ending at `end` simulated the whole day, the loops step past the 15:00 close
+        return end.date() > day
+
+    def path(self, day: date) -> str:
+        return os.path.join(self.run_dir, f'{day:%Y%m%d}.ckpt')
+
+    def save(self, day: date, state: dict):
+        # state is pickled as one object graph, objects shared between components stay shared on load
+        os.makedirs(self.run_dir, exist_ok=True)
+        path = self.path(day)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump({'key': self.key, 'day': day, 'state': state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+        logger.info(f"checkpoint saved: {path}")
+
+    def latest(self, before: datetime) -> Tuple[date, dict]:
+        # latest readable snapshot of a day closed by `before`, (None, None) if there is none
+        if not os.path.isdir(self.run_dir):
+            return None, None
+        days = []
+        for name in os.listdir(self.run_dir):
+            if name.endswith('.ckpt'):
+                try:
+                    days.append(datetime.strptime(name[:-len('.ckpt')], '%Y%m%d').date())
+                except ValueError:
+                    continue
+        for day in sorted(days, reverse=True):
+            if not Checkpoint.day_closed(day, before):
+                continue
+            try:
+                with open(self.path(day), 'rb') as f:
+                    snapshot = pickle.load(f)
+            except Exception as e:
+                logger.warning(f"skip unreadable checkpoint {self.path(day)}: {e}")
+                continue
+            if snapshot.get('key') == self.key and snapshot.get('day') == day:
+                return day, snapshot['state']
+        return None, None
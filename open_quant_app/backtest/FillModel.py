@@ -0,0 +1,186 @@
+from typing import List, Dict, Tuple
+from datetime import datetime
+
+from open_quant_app.data.BarStore import BarStore
+from xtquant import xtconstant
+
+import numpy as np
+
+
+class SimOrder:
+    # stand-in for XtOrder, carries the fields read by order status listeners
+    def __init__(self, order_id: int, stock_code: str, order_type: int, order_volume: int, price: float,
+                 order_time: int, strategy_id: int):
+        self.order_id: int = order_id
+        self.order_sysid: str = str(order_id)
+        self.stock_code: str = stock_code
+        self.order_type: int = order_type
+        self.order_volume: int = order_volume
+        self.price: float = price
+        # epoch ms
+        self.order_time: int = order_time
+        self.strategy_id: int = strategy_id
+        self.traded_volume: int = 0
+        self.traded_price: float = 0.0
+        self.order_status: int = xtconstant.ORDER_REPORTED
+        # index of the next tick to match, -1 before the order reaches the exchange
+        self.cursor: int = -1
+        # volume queued before this order at its price level
+        self.queue_ahead: float = 0.0
+
+    def remaining(self) -> int:
+        return self.order_volume - self.traded_volume
+
+
+class TickData:
+    def __init__(self, times: np.ndarray, prices: np.ndarray, volumes: np.ndarray, bid_prices: np.ndarray = None,
+                 bid_volumes: np.ndarray = None, ask_prices: np.ndarray = None, ask_volumes: np.ndarray = None):
+        self.times = np.asarray(times, dtype=np.int64)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        # traded volume of each tick (not cumulative)
+        self.volumes = np.asarray(volumes, dtype=np.float64)
+        self.has_book = bid_prices is not None and ask_prices is not None
+        if self.has_book:
+            self.bid_prices = np.asarray(bid_prices, dtype=np.float64)
+            self.bid_volumes = np.asarray(bid_volumes, dtype=np.float64)
+            self.ask_prices = np.asarray(ask_prices, dtype=np.float64)
+            self.ask_volumes = np.asarray(ask_volumes, dtype=np.float64)
+        # number of ticks at or before the simulated clock
+        self.end: int = 0
+
+    def seek(self, now: int) -> bool:
+        # returns True when new ticks arrived, a scalar check skips the search between ticks
+        if self.end >= len(self.times) or self.times[self.end] > now:
+            return False
+        self.end = int(np.searchsorted(self.times, now, 'right'))
+        return True
+
+
+class TickFillModel:
+    def __init__(self, latency: float = 0.05, slippage: float = 0.0):
+        # submit to exchange latency in seconds, slippage as a fraction of the price taken from the book
+        self.latency_ms: int = int(round(latency * 1000))
+        self.slippage: float = slippage
+        self.ticks: Dict[str, TickData] = {}
+        # order id -> order, and grouped by stock
+        self.orders: Dict[int, SimOrder] = {}
+        self.pending: Dict[str, Dict[int, SimOrder]] = {}
+        # stocks with new ticks in the last advance
+        self.updated: List[str] = []
+
+    @staticmethod
+    def from_config(config: dict):
+        return TickFillModel(config['backtest'].get('fill_latency', 0.05), config['backtest'].get('slippage', 0.0))
+
+    def load(self, stock_id: str, times: np.ndarray, prices: np.ndarray, volumes: np.ndarray,
+             bid_prices: np.ndarray = None, bid_volumes: np.ndarray = None, ask_prices: np.ndarray = None,
+             ask_volumes: np.ndarray = None):
+        self.ticks[stock_id] = TickData(times, prices, volumes, bid_prices, bid_volumes, ask_prices, ask_volumes)
+
+    def load_store(self, store: BarStore, stock_ids: List[str], start: datetime, end: datetime,
+                   period: str = 'tick'):
+        # xtdata ticks carry the cumulative day volume, level 1 columns are used when they were stored
+        for stock_id in stock_ids:
+            schema = store.load_schema(stock_id, period)
+            book = [column for column in ('bidPrice1', 'bidVol1', 'askPrice1', 'askVol1') if column in schema]
+            data = store.read(stock_id, period, start, end, ['lastPrice', 'volume'] + book)
+            if len(data[BarStore.TIME]) == 0:
+                continue
+            levels = [data[column] for column in book] if len(book) == 4 else [None] * 4
+            self.load(stock_id, data[BarStore.TIME], data['lastPrice'], TickFillModel.tick_volumes(data['volume']),
+                      *levels)
+
+    @staticmethod
+    def tick_volumes(cum_volume: np.ndarray) -> np.ndarray:
+        # per tick traded volume from the cumulative day volume, which restarts every day
+        cum_volume = np.asarray(cum_volume, dtype=np.float64)
+        volumes = np.diff(cum_volume, prepend=0.0)
+        return np.where(volumes < 0, cum_volume, volumes)
+
+    def submit(self, order: SimOrder):
+        self.orders[order.order_id] = order
+        self.pending.setdefault(order.stock_code, {})[order.order_id] = order
+
+    def cancel(self, order_id: int) -> SimOrder:
+        order = self.orders.pop(order_id, None)
+        if order is not None:
+            del self.pending[order.stock_code][order_id]
+        return order
+
+    def activate(self, order: SimOrder, ticks: TickData, i: int) -> Tuple[int, float]:
+        # first book seen by the order: take liquidity if marketable, then queue behind the resting volume
+        is_buy = order.order_type == xtconstant.STOCK_BUY
+        order.cursor = i + 1
+        if ticks.has_book:
+            take_price = ticks.ask_prices[i] if is_buy else ticks.bid_prices[i]
+            take_volume = ticks.ask_volumes[i] if is_buy else ticks.bid_volumes[i]
+            same_side_price = ticks.bid_prices[i] if is_buy else ticks.ask_prices[i]
+            same_side_volume = ticks.bid_volumes[i] if is_buy else ticks.ask_volumes[i]
+            order.queue_ahead = same_side_volume if same_side_price == order.price else 0.0
+        else:
+            take_price, take_volume = ticks.prices[i], ticks.volumes[i]
+        marketable = take_price > 0 and (take_price <= order.price if is_buy else take_price >= order.price)
+        if not marketable:
+            return 0, 0.0
+        volume = int(min(order.remaining(), take_volume))
+        price = take_price * (1 + self.slippage) if is_buy else take_price * (1 - self.slippage)
+        return volume, price
+
+    def match(self, orders: List[SimOrder], ticks: TickData) -> np.ndarray:
+        # resting orders of one stock against the trades in [cursor, end), one (orders x ticks) pass:
+        # trades at the limit price consume the queue ahead first, a trade through the limit fills everything left
+        begin, end = min(order.cursor for order in orders), ticks.end
+        if begin >= end:
+            return np.zeros(len(orders), dtype=np.int64)
+        prices, volumes = ticks.prices[begin:end], ticks.volumes[begin:end]
+        cursors = np.array([order.cursor for order in orders])
+        limits = np.array([order.price for order in orders])[:, None]
+        is_buy = np.array([order.order_type == xtconstant.STOCK_BUY for order in orders])[:, None]
+        queue_ahead = np.array([order.queue_ahead for order in orders])
+        remaining = np.array([order.remaining() for order in orders])
+        started = np.arange(begin, end)[None, :] >= cursors[:, None]
+        eligible = started & np.where(is_buy, prices <= limits, prices >= limits)
+        through = (started & np.where(is_buy, prices < limits, prices > limits)).any(axis=1)
+        traded = np.where(eligible, volumes, 0.0).sum(axis=1)
+        filled = np.where(through, remaining, np.clip(traded - queue_ahead, 0, remaining)).astype(np.int64)
+        queue_ahead = np.maximum(queue_ahead - traded, 0.0)
+        for k in range(len(orders)):
+            orders[k].queue_ahead = float(queue_ahead[k])
+            orders[k].cursor = end
+        return filled
+
+    def advance(self, now: int) -> List[Tuple[SimOrder, int, float]]:
+        # match pending orders against the ticks up to now (epoch ms), returns (order, volume, price) fills,
+        # orders of a stock are only visited when the stock has new ticks
+        fills = []
+        self.updated = []
+        for stock_id, ticks in self.ticks.items():
+            if not ticks.seek(now):
+                continue
+            self.updated.append(stock_id)
+            orders = self.pending.get(stock_id)
+            if not orders:
+                continue
+            resting = []
+            for order in list(orders.values()):
+                if order.cursor < 0:
+                    i = int(np.searchsorted(ticks.times, order.order_time + self.latency_ms, 'left'))
+                    if i >= ticks.end:
+                        continue
+                    volume, price = self.activate(order, ticks, i)
+                    if volume > 0:
+                        fills.append((order, volume, price))
+                        order.traded_volume += volume
+                if order.remaining() > 0:
+                    resting.append(order)
+            if len(resting) != 0:
+                filled = self.match(resting, ticks)
+                for k in np.nonzero(filled)[0]:
+                    order = resting[k]
+                    fills.append((order, int(filled[k]), order.price))
+                    order.traded_volume += int(filled[k])
+            for order in list(orders.values()):
+                if order.remaining() <= 0:
+                    del orders[order.order_id]
+                    del self.orders[order.order_id]
+        return fills
@@ -0,0 +1,255 @@
+from typing import List, Dict, Tuple
+from collections import deque
+from datetime import datetime
+import os
+import time
+
+from open_quant_app.backtest.BackTester import BackTester
+from open_quant_app.backtest.FillModel import TickFillModel, SimOrder
+from open_quant_app.strategy.Strategy import Strategy
+from open_quant_app.trade.Trader import Trader
+from open_quant_app.utils.QuoteRecorder import QuoteRecorder
+
+from loguru import logger
+import numpy as np
+
+
+# stand-ins for the xttype pushes & query results, with the fields read by the callback & caches
+class SimTrade:
+    def __init__(self, account_id: str, order: SimOrder, traded_id: int, traded_time: int, volume: int,
+                 price: float):
+        self.account_id: str = account_id
+        self.stock_code: str = order.stock_code
+        self.order_type: int = order.order_type
+        self.traded_id: int = traded_id
+        self.traded_time: int = traded_time
+        self.traded_price: float = price
+        self.traded_volume: int = volume
+        self.traded_amount: float = price * volume
+        self.order_id: int = order.order_id
+        self.order_sysid: str = order.order_sysid
+
+
+class SimPosition:
+    def __init__(self, account_id: str, stock_code: str, volume: int, open_price: float, price: float):
+        self.account_id: str = account_id
+        self.stock_code: str = stock_code
+        self.volume: int = volume
+        self.can_use_volume: int = volume
+        self.frozen_volume: int = 0
+        self.open_price: float = open_price
+        self.avg_price: float = open_price
+        self.market_value: float = price * volume
+
+
+class SimAsset:
+    def __init__(self, account_id: str, cash: float, market_value: float):
+        self.account_id: str = account_id
+        self.cash: float = cash
+        self.frozen_cash: float = 0.0
+        self.market_value: float = market_value
+        self.total_asset: float = cash + market_value
+
+
+class SimOrderResponse:
+    def __init__(self, account_id: str, order_id: int, seq: int, error_msg: str = ''):
+        self.account_id: str = account_id
+        self.order_id: int = order_id
+        self.seq: int = seq
+        self.error_msg: str = error_msg
+
+
+class SimOrderError:
+    def __init__(self, account_id: str, order_id: int, error_msg: str):
+        self.account_id: str = account_id
+        self.order_id: int = order_id
+        self.error_id: int = -1
+        self.error_msg: str = error_msg
+
+
+class SimBroker:
+    # local stand-in for XtQuantTrader: orders are matched by a TickFillModel over the replayed ticks and
+    # pushes are queued, then fired on the registered callback by dispatch(), like the xt callback thread
+    def __init__(self, config: dict, cash: float = 100000, strategy_id: int = 0):
+        self.account_id: str = config['trade']['account_id']
+        self.strategy_id: int = strategy_id
+        self.fill_model = TickFillModel.from_config(config)
+        self.back_tester = BackTester(config, cash, fill_model=self.fill_model)
+        self.back_tester.order_listeners.append(self.on_order)
+        self.callback = None
+        self.events: deque = deque()
+        self.orders: Dict[int, SimOrder] = {}
+        # traded volume already pushed as trades, per order id
+        self.pushed: Dict[int, int] = {}
+        self.trade_seq: int = 0
+        self.async_seq: int = 0
+
+    def load_quotes(self, records: List[Tuple[int, str, dict]]):
+        # ticks of the recorded payloads, timed by arrival so fills only see quotes the strategy has seen
+        columns: Dict[str, List[tuple]] = {}
+        for timestamp, period, data in records:
+            if period != 'tick':
+                continue
+            for stock_id, quotes in data.items():
+                for quote in quotes if isinstance(quotes, list) else [quotes]:
+                    if not isinstance(quote, dict) or 'lastPrice' not in quote:
+                        continue
+                    bid_prices, bid_volumes = quote.get('bidPrice') or [0.0], quote.get('bidVol') or [0.0]
+                    ask_prices, ask_volumes = quote.get('askPrice') or [0.0], quote.get('askVol') or [0.0]
+                    columns.setdefault(stock_id, []).append(
+                        (timestamp, quote['lastPrice'], quote.get('volume', 0), bid_prices[0], bid_volumes[0],
+                         ask_prices[0], ask_volumes[0]))
+        for stock_id, rows in columns.items():
+            times, prices, cum_volumes, bid_prices, bid_volumes, ask_prices, ask_volumes = (np.array(column)
+                                                                                            for column in zip(*rows))
+            volumes = TickFillModel.tick_volumes(cum_volumes)
+            if (bid_prices > 0).any() or (ask_prices > 0).any():
+                self.fill_model.load(stock_id, times, prices, volumes, bid_prices, bid_volumes, ask_prices,
+                                     ask_volumes)
+            else:
+                self.fill_model.load(stock_id, times, prices, volumes)
+
+    def clock(self) -> float:
+        # simulated epoch seconds
+        return self.back_tester.now / 1000
+
+    # XtQuantTrader api used by Trader
+    def register_callback(self, callback):
+        self.callback = callback
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def connect(self) -> int:
+        return 0
+
+    def subscribe(self, account) -> int:
+        return 0
+
+    def unsubscribe(self, account) -> int:
+        return 0
+
+    def order_stock(self, account, stock_code: str, order_type: int, order_volume: int, price_type: int,
+                    price: float, strategy_name: str = '', order_remark: str = '') -> int:
+        order_id = self.back_tester.order_stock(stock_code, order_type, order_volume, price, self.strategy_id)
+        if order_id <= 0:
+            self.events.append(('on_order_error', SimOrderError(self.account_id, -1, "rejected by the sim broker")))
+            return -1
+        return order_id
+
+    def order_stock_async(self, account, stock_code: str, order_type: int, order_volume: int, price_type: int,
+                          price: float, strategy_name: str = '', order_remark: str = '') -> int:
+        self.async_seq += 1
+        order_id = self.order_stock(account, stock_code, order_type, order_volume, price_type, price, strategy_name,
+                                    order_remark)
+        self.events.append(('on_order_stock_async_response',
+                            SimOrderResponse(self.account_id, order_id, self.async_seq,
+                                             '' if order_id > 0 else "rejected by the sim broker")))
+        return self.async_seq
+
+    def cancel_order_stock(self, account, order_id: int) -> int:
+        return self.back_tester.cancel_order_stock(order_id)
+
+    def query_stock_orders(self, account, cancelable_only: bool = False) -> List[SimOrder]:
+        return list(self.orders.values())
+
+    def query_stock_order(self, account, order_id: int) -> SimOrder:
+        return self.orders.get(order_id)
+
+    def query_stock_positions(self, account) -> List[SimPosition]:
+        stocks = self.back_tester.stocks
+        return [SimPosition(self.account_id, stocks.stock_ids[i], int(stocks.volume[i]), float(stocks.avg_price[i]),
+                            float(stocks.price[i])) for i in range(len(stocks.stock_ids)) if stocks.volume[i] > 0]
+
+    def query_stock_position(self, account, stock_code: str) -> SimPosition:
+        for position in self.query_stock_positions(account):
+            if position.stock_code == stock_code:
+                return position
+        return None
+
+    def query_stock_asset(self, account) -> SimAsset:
+        return SimAsset(self.account_id, self.back_tester.account.cash, self.back_tester.stocks.market_value)
+
+    # pushes
+    def on_order(self, order: SimOrder):
+        self.orders[order.order_id] = order
+        traded = order.traded_volume - self.pushed.get(order.order_id, 0)
+        if traded > 0:
+            self.pushed[order.order_id] = order.traded_volume
+            self.trade_seq += 1
+            self.events.append(('on_stock_trade', SimTrade(self.account_id, order, self.trade_seq,
+                                                           self.back_tester.now, traded, order.traded_price)))
+            self.events.append(('on_stock_position', self.query_stock_position(None, order.stock_code) or
+                                SimPosition(self.account_id, order.stock_code, 0, 0.0, 0.0)))
+            self.events.append(('on_stock_asset', self.query_stock_asset(None)))
+        self.events.append(('on_stock_order', order))
+
+    def advance(self, timestamp: int):
+        # epoch ms, fills up to timestamp are queued as pushes
+        self.back_tester.advance(datetime.fromtimestamp(timestamp / 1000))
+
+    def dispatch(self) -> int:
+        dispatched = 0
+        while len(self.events) != 0:
+            name, payload = self.events.popleft()
+            if self.callback is not None:
+                getattr(self.callback, name)(payload)
+            dispatched += 1
+        return dispatched
+
+
+class MarketReplay:
+    # drives a live Strategy from recorded subscribe_quote payloads: quotes go through on_data_callback and the
+    # event loop step, orders through Trader & CommonXtQuantTraderCallback against a SimBroker, time is simulated
+    def __init__(self, config: dict, strategy: Strategy, broker: SimBroker, record_dir: str, speed: float = 0):
+        # speed = 0: as fast as possible, N: N x the recorded pace
+        self.config: dict = config
+        self.strategy: Strategy = strategy
+        self.broker: SimBroker = broker
+        self.record_dir: str = record_dir
+        self.speed: float = speed
+        self.trader: Trader = strategy.trader
+        # pushes & risk checks follow the simulated clock
+        self.trader.xt_trader = broker
+        self.trader.clock = broker.clock
+        self.trader.account_cache.clock = broker.clock
+        # replayed quotes are not recorded again
+        if self.strategy.recorder is not None:
+            self.strategy.recorder.close()
+        self.strategy.recorder = None
+
+    @staticmethod
+    def create(config: dict, strategy_cls: type, strategy_id: int, cash: float = 100000, record_dir: str = None,
+               speed: float = None):
+        replay = config.get('replay', {})
+        broker = SimBroker(config, cash, strategy_id)
+        trader = Trader(config, xt_trader=broker)
+        strategy = strategy_cls(strategy_id, trader, config)
+        # recorded by QuoteRecorder.from_config of the same strategy id
+        record_dir = os.path.join(replay.get('record_dir', ''), str(strategy_id)) if record_dir is None else record_dir
+        speed = replay.get('speed', 0) if speed is None else speed
+        return MarketReplay(config, strategy, broker, record_dir, speed)
+
+    def run(self, start: datetime, end: datetime, report: bool = True) -> dict:
+        records = QuoteRecorder.read(self.record_dir, start, end)
+        logger.info(f"replay {len(records)} quote records from {start} to {end}")
+        self.broker.load_quotes(records)
+        self.trader.start()
+        wall_start = time.perf_counter()
+        for timestamp, period, data in records:
+            if self.speed > 0:
+                delay = (timestamp - records[0][0]) / 1000 / self.speed - (time.perf_counter() - wall_start)
+                if delay > 0:
+                    time.sleep(delay)
+            self.broker.advance(timestamp)
+            self.broker.dispatch()
+            self.strategy.on_data_callback(data, period)
+            self.strategy.on_quote_batch(self.strategy.quote_queue.get(0), datetime.fromtimestamp(timestamp / 1000))
+            self.broker.dispatch()
+        logger.success(f"replay done in {time.perf_counter() - wall_start:.1f}s")
+        if report:
+            self.broker.back_tester.report(self.strategy.strategy_id, save_as_file=True)
+        return self.broker.back_tester.summary(self.strategy.strategy_id)
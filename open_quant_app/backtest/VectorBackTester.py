@@ -0,0 +1,220 @@
+from typing import List, Dict, Tuple
+import os
+
+from open_quant_app.backtest.Analytics import Analytics
+from open_quant_app.backtest.BackTester import BackAccount
+from open_quant_app.manager.PositionManager import PositionManager
+from xtquant import xtconstant
+
+from loguru import logger
+import numpy as np
+
+
+class VectorBackTester:
+    def __init__(self, config: dict, cash: float = 100000):
+        self.account = BackAccount(cash)
+        self.stock_ids: List[List[str]] = config['stock']['stock_ids']
+        self.position_manager = PositionManager(config)
+        self.report_dir: str = config.get('backtest', {}).get('report_dir', '../output')
+        # one column per (strategy_id, stock_id), strategies laid out contiguously
+        self.columns: List[Tuple[int, str]] = []
+        self.slices: List[slice] = []
+        for strategy_id in range(len(self.stock_ids)):
+            begin = len(self.columns)
+            for stock_id in self.stock_ids[strategy_id]:
+                self.columns.append((strategy_id, stock_id))
+            self.slices.append(slice(begin, len(self.columns)))
+        self.column_stock_ids = np.array([column[1] for column in self.columns], dtype=object)
+        self.column_strategy_ids = np.array([column[0] for column in self.columns], dtype=np.int64)
+        # market data & strategy output, shape = (timestamps, columns)
+        self.timestamps: np.ndarray = np.empty(0, dtype='datetime64[ms]')
+        self.prices: np.ndarray = np.empty((0, len(self.columns)))
+        self.targets: np.ndarray = np.zeros((0, len(self.columns)), dtype=np.int64)
+        # results
+        self.records: Dict[str, np.ndarray] = {}
+        self.record_timestamps: np.ndarray = np.empty(0, dtype='datetime64[ms]')
+        self.cash: np.ndarray = np.empty(0)
+        self.equity: np.ndarray = np.empty(0)
+        # shape = (timestamps, strategies), value of each strategy's cash flows & holdings
+        self.strategy_values: np.ndarray = np.empty((0, len(self.stock_ids)))
+        self.traded: np.ndarray = np.zeros(len(self.stock_ids))
+        self.last_prices: np.ndarray = np.zeros(len(self.columns))
+
+    def info(self):
+        logger.info(f"initial cash = {self.account.cash}, {len(self.columns)} columns, "
+                    f"{len(self.timestamps)} timestamps")
+
+    def load(self, timestamps: np.ndarray, prices: Dict[str, np.ndarray]):
+        self.timestamps = np.asarray(timestamps)
+        self.prices = np.empty((len(self.timestamps), len(self.columns)))
+        for i, (strategy_id, stock_id) in enumerate(self.columns):
+            if stock_id not in prices:
+                logger.error(f"no price data for stock {stock_id}, strategy id = {strategy_id}")
+                self.prices[:, i] = np.nan
+                continue
+            column = np.asarray(prices[stock_id], dtype=np.float64)
+            if len(column) != len(self.timestamps):
+                raise ValueError(f"price length {len(column)} of {stock_id} != timestamp length "
+                                 f"{len(self.timestamps)}")
+            self.prices[:, i] = column
+        # forward fill missing prices (suspension, no tick in this bar)
+        valid = ~np.isnan(self.prices)
+        index = np.where(valid, np.arange(len(self.timestamps))[:, None], 0)
+        np.maximum.accumulate(index, axis=0, out=index)
+        self.prices = np.take_along_axis(self.prices, index, axis=0)
+        self.targets = np.zeros((len(self.timestamps), len(self.columns)), dtype=np.int64)
+
+    def strategy_prices(self, strategy_id: int) -> np.ndarray:
+        return self.prices[:, self.slices[strategy_id]]
+
+    def set_targets(self, strategy_id: int, targets: np.ndarray):
+        targets = np.asarray(targets, dtype=np.int64)
+        expected = (len(self.timestamps), self.slices[strategy_id].stop - self.slices[strategy_id].start)
+        if targets.shape != expected:
+            raise ValueError(f"target shape {targets.shape} != expected shape {expected}")
+        if (targets < 0).any():
+            logger.warning(f"id = {strategy_id}: negative target position, clip to 0")
+            targets = np.maximum(targets, 0)
+        self.targets[:, self.slices[strategy_id]] = targets
+
+    def set_signals(self, strategy_id: int, signals: np.ndarray, volume: int):
+        # signal > 0: buy volume, signal < 0: sell volume, a sell never exceeds the holding
+        steps = np.sign(np.asarray(signals)).astype(np.int64) * volume
+        running = np.cumsum(steps, axis=0)
+        floor = np.minimum(np.minimum.accumulate(running, axis=0), 0)
+        self.set_targets(strategy_id, running - floor)
+
+    def run(self) -> np.ndarray:
+        deltas = np.diff(self.targets, axis=0, prepend=np.zeros((1, len(self.columns)), dtype=np.int64))
+        if np.isnan(self.prices[deltas != 0]).any():
+            raise ValueError("order on a timestamp without price data")
+        prices = np.where(np.isnan(self.prices), 0.0, self.prices)
+        # buys over the cash or the position limit are rejected, same as the back tester
+        targets = self.limit_targets(deltas, prices)
+        if targets is not self.targets:
+            rejected = int((targets != self.targets).any(axis=1).sum())
+            logger.warning(f"{rejected} timestamps hold less than the target, buys over cash or position limit")
+            self.targets = targets
+            deltas = np.diff(self.targets, axis=0, prepend=np.zeros((1, len(self.columns)), dtype=np.int64))
+        filled = deltas != 0
+        # cash & equity curve
+        flows = (deltas * prices).sum(axis=1)
+        self.cash = self.account.initial_cash - np.cumsum(flows)
+        self.equity = self.cash + (self.targets * prices).sum(axis=1)
+        column_values = self.targets * prices - np.cumsum(deltas * prices, axis=0)
+        self.strategy_values = np.stack([column_values[:, columns].sum(axis=1) for columns in self.slices], axis=1) \
+            if len(self.slices) != 0 else np.empty((len(self.timestamps), 0))
+        self.traded = np.array([np.abs(deltas[:, columns] * prices[:, columns]).sum() for columns in self.slices])
+        # order records, same fields & order as BackTester.records
+        rows, cols = np.nonzero(deltas)
+        volumes = deltas[rows, cols]
+        self.records = {
+            'order_type': np.where(volumes > 0, xtconstant.STOCK_BUY, xtconstant.STOCK_SELL),
+            'price': prices[rows, cols],
+            'volume': np.abs(volumes),
+            'stock_id': self.column_stock_ids[cols],
+            'strategy_id': self.column_strategy_ids[cols],
+        }
+        self.record_timestamps = self.timestamps[rows]
+        # positions are valued at the last fill price, same as BackPosition
+        self.last_prices = np.zeros(len(self.columns))
+        last_rows = np.where(filled, np.arange(len(self.timestamps))[:, None], -1).max(axis=0, initial=-1)
+        has_fill = last_rows >= 0
+        self.last_prices[has_fill] = prices[last_rows[has_fill], np.nonzero(has_fill)[0]]
+        self.account.cash = self.cash[-1] if len(self.cash) != 0 else self.account.initial_cash
+        return self.equity
+
+    def limit_targets(self, deltas: np.ndarray, prices: np.ndarray) -> np.ndarray:
+        # returns self.targets when every fill fits, else the held positions: per timestamp sells fill first, then
+        # buys in column order while the cash and the strategy's position limit * equity allow
+        limits = np.asarray(self.position_manager.positions, dtype=np.float64)
+        cash = self.account.initial_cash - np.cumsum((deltas * prices).sum(axis=1))
+        values = self.targets * prices
+        # fills at the current price leave the equity unchanged
+        equity = cash + values.sum(axis=1)
+        violated = cash < 0
+        for strategy_id, columns in enumerate(self.slices):
+            buys = (deltas[:, columns] > 0).any(axis=1)
+            violated |= buys & (values[:, columns].sum(axis=1) > limits[strategy_id] * equity)
+        if not violated.any():
+            return self.targets
+        # timestamps before the first violation fill as targeted
+        first = int(np.argmax(violated))
+        targets = self.targets.copy()
+        held = targets[first - 1].copy() if first > 0 else np.zeros(len(self.columns), dtype=np.int64)
+        cash = cash[first - 1] if first > 0 else self.account.initial_cash
+        for row in range(first, len(targets)):
+            row_prices, wanted = prices[row], self.targets[row]
+            sells = wanted < held
+            cash += float(((held - wanted) * row_prices)[sells].sum())
+            held[sells] = wanted[sells]
+            strategy_values = [float((held[columns] * row_prices[columns]).sum()) for columns in self.slices]
+            room = limits * (cash + float((held * row_prices).sum()))
+            for column in np.nonzero(wanted > held)[0]:
+                strategy_id = self.column_strategy_ids[column]
+                cost = float((wanted[column] - held[column]) * row_prices[column])
+                if cost <= cash and strategy_values[strategy_id] + cost <= room[strategy_id]:
+                    cash -= cost
+                    strategy_values[strategy_id] += cost
+                    held[column] = wanted[column]
+            targets[row] = held
+        return targets
+
+    def summary(self, strategy_id: int) -> dict:
+        order_types = self.records.get('order_type', np.empty(0))[
+            self.records.get('strategy_id', np.empty(0)) == strategy_id]
+        summary = {
+            'strategy_id': strategy_id,
+            'init': self.account.initial_cash,
+            'curr': self.value(),
+            'ratio': (self.value() - self.account.initial_cash) / self.account.initial_cash,
+            'orders': len(order_types),
+            'buy_orders': int((order_types == xtconstant.STOCK_BUY).sum()),
+            'sell_orders': int((order_types == xtconstant.STOCK_SELL).sum()),
+        }
+        summary.update(self.analytics(strategy_id))
+        return summary
+
+    def analytics(self, strategy_id: int) -> dict:
+        mask = self.records.get('strategy_id', np.empty(0)) == strategy_id
+        fills = {name: values[mask] for name, values in self.records.items()} if len(self.records) != 0 else {
+            name: np.empty(0) for name in ('order_type', 'price', 'volume', 'stock_id')}
+        return Analytics.metrics(self.timestamps, self.equity, self.strategy_values,
+                                 self.traded[strategy_id:strategy_id + 1], fills['order_type'], fills['price'],
+                                 fills['volume'], fills['stock_id'])
+
+    def curves(self, strategy_id: int, window: int = 240) -> Dict[str, np.ndarray]:
+        curves = {
+            'timestamp': self.timestamps.astype('datetime64[ms]'),
+            'equity': self.equity,
+            'cash': self.cash,
+            'drawdown': Analytics.drawdown(self.equity),
+            'strategy_value': self.strategy_values[:, strategy_id],
+        }
+        curves.update(Analytics.rolling(self.equity, window, Analytics.periods_per_year(self.timestamps)))
+        return curves
+
+    def value(self) -> float:
+        if len(self.targets) == 0:
+            return self.account.cash
+        return float(self.account.cash + (self.targets[-1] * self.last_prices).sum())
+
+    def report(self, strategy_id: int, save_as_file: bool = True):
+        logger.critical(
+            f"init = {self.account.initial_cash}, curr = {self.value()}, "
+            f"ratio = {(self.value() - self.account.initial_cash) / self.account.initial_cash}")
+        size = len(self.records.get('volume', []))
+        if not save_as_file:
+            for i in range(size):
+                logger.info(
+                    f"[{i}], stock id = {self.records['stock_id'][i]}, "
+                    f"type = {'buy' if self.records['order_type'][i] == xtconstant.STOCK_BUY else 'sell'}"
+                    f", price = {self.records['price'][i]}, volume = {self.records['volume'][i]}")
+        elif size != 0:
+            import pandas as pd
+            df = pd.DataFrame(self.records)
+            os.makedirs(self.report_dir, exist_ok=True)
+            df[df['strategy_id'] == strategy_id].to_csv(os.path.join(self.report_dir, f'strategy-{strategy_id}.csv'))
+        if save_as_file and len(self.equity) != 0:
+            Analytics.save(self.report_dir, f'strategy-{strategy_id}-analytics', self.analytics(strategy_id),
+                           self.curves(strategy_id))
@@ -0,0 +1,166 @@
+from typing import List, Dict, Tuple
+from datetime import datetime
+import json
+import os
+import shutil
+
+from loguru import logger
+import numpy as np
+
+
+class BarStore:
+    # layout: {root}/{period}/{stock_id}/{year}/{column}.bin, raw little-endian arrays,
+    # 'time' (int64 epoch ms) is written last and decides how many rows are valid
+    TIME = 'time'
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def from_config(config: dict):
+        return BarStore(config['data']['store_path'])
+
+    @staticmethod
+    def to_ms(timestamp: datetime) -> int:
+        # epoch ms like xtdata 'time', naive datetimes are local time
+        return int(round(timestamp.timestamp() * 1000))
+
+    @staticmethod
+    def year_of(ms: np.ndarray) -> np.ndarray:
+        return ms.astype('datetime64[ms]').astype('datetime64[Y]').astype(np.int64) + 1970
+
+    def symbol_path(self, stock_id: str, period: str) -> str:
+        return os.path.join(self.root, period, stock_id)
+
+    def load_schema(self, stock_id: str, period: str) -> Dict[str, str]:
+        path = os.path.join(self.symbol_path(stock_id, period), 'schema.json')
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def save_schema(self, stock_id: str, period: str, schema: Dict[str, str]):
+        os.makedirs(self.symbol_path(stock_id, period), exist_ok=True)
+        with open(os.path.join(self.symbol_path(stock_id, period), 'schema.json'), 'w') as f:
+            json.dump(schema, f)
+
+    def years(self, stock_id: str, period: str) -> List[int]:
+        path = self.symbol_path(stock_id, period)
+        if not os.path.exists(path):
+            return []
+        return sorted(int(name) for name in os.listdir(path) if name.isdigit())
+
+    def stock_ids(self, period: str) -> List[str]:
+        path = os.path.join(self.root, period)
+        if not os.path.exists(path):
+            return []
+        return sorted(os.listdir(path))
+
+    def open_column(self, stock_id: str, period: str, year: int, column: str, dtype: str) -> np.ndarray:
+        path = os.path.join(self.symbol_path(stock_id, period), str(year), f"{column}.bin")
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def last_time(self, stock_id: str, period: str) -> int:
+        # newest committed row, year directories without a committed row (interrupted append) are skipped
+        for year in reversed(self.years(stock_id, period)):
+            times = self.open_column(stock_id, period, year, self.TIME, '<i8')
+            if len(times) != 0:
+                return int(times[-1])
+        return -1
+
+    def repair(self, stock_id: str, period: str, schema: Dict[str, str]):
+        # drop year directories without a committed 'time' row and column rows written after the last committed
+        # 'time' row (interrupted append)
+        for year in reversed(self.years(stock_id, period)):
+            path = os.path.join(self.symbol_path(stock_id, period), str(year))
+            rows = len(self.open_column(stock_id, period, year, self.TIME, '<i8'))
+            if rows == 0:
+                logger.warning(f"{stock_id} {period}: remove uncommitted partition {year}")
+                shutil.rmtree(path)
+                continue
+            for column, dtype in schema.items():
+                column_path = os.path.join(path, f"{column}.bin")
+                size = rows * np.dtype(dtype).itemsize
+                if os.path.exists(column_path) and os.path.getsize(column_path) > size:
+                    logger.warning(f"{stock_id} {period}: truncate uncommitted rows of {column}")
+                    os.truncate(column_path, size)
+            break
+
+    def append(self, stock_id: str, period: str, bars: Dict[str, np.ndarray]) -> int:
+        times = np.asarray(bars[self.TIME], dtype='<i8')
+        # keep only rows after the stored history, appends are idempotent per day
+        mask = times > self.last_time(stock_id, period)
+        if len(times) > 1 and (np.diff(times) <= 0).any():
+            raise ValueError(f"{stock_id} {period}: bar times must be strictly increasing")
+        if not mask.any():
+            return 0
+        schema = self.load_schema(stock_id, period)
+        names = [column for column in bars.keys() if column != self.TIME]
+        if len(schema) != 0 and sorted(names) != sorted(schema.keys()):
+            raise ValueError(f"{stock_id} {period}: columns {sorted(names)} != stored columns "
+                             f"{sorted(schema.keys())}")
+        columns = {}
+        for column in names:
+            values = np.asarray(bars[column])[mask]
+            # raw column files hold fixed width numbers only, object arrays would store pointers
+            if values.dtype.kind not in 'biuf' or values.ndim != 1:
+                raise ValueError(f"{stock_id} {period}: column {column} of dtype {values.dtype} and shape "
+                                 f"{values.shape} is not a 1d numeric column")
+            schema[column] = schema.get(column, values.dtype.newbyteorder('<').str)
+            columns[column] = values.astype(schema[column])
+        self.repair(stock_id, period, schema)
+        self.save_schema(stock_id, period, schema)
+        times = times[mask]
+        years = self.year_of(times)
+        for year in np.unique(years):
+            rows = years == year
+            path = os.path.join(self.symbol_path(stock_id, period), str(year))
+            os.makedirs(path, exist_ok=True)
+            for column, values in columns.items():
+                with open(os.path.join(path, f"{column}.bin"), 'ab') as f:
+                    f.write(values[rows].tobytes())
+            with open(os.path.join(path, f"{self.TIME}.bin"), 'ab') as f:
+                f.write(times[rows].tobytes())
+        return int(mask.sum())
+
+    def read(self, stock_id: str, period: str, start: datetime, end: datetime,
+             columns: List[str] = None) -> Dict[str, np.ndarray]:
+        schema = self.load_schema(stock_id, period)
+        columns = list(schema.keys()) if columns is None else columns
+        start_ms, end_ms = self.to_ms(start), self.to_ms(end)
+        chunks: Dict[str, List[np.ndarray]] = {column: [] for column in [self.TIME] + columns}
+        first_year, last_year = self.year_of(np.int64(start_ms)), self.year_of(np.int64(end_ms))
+        for year in self.years(stock_id, period):
+            if not (first_year <= year <= last_year):
+                continue
+            times = self.open_column(stock_id, period, year, self.TIME, '<i8')
+            begin, stop = np.searchsorted(times, start_ms, 'left'), np.searchsorted(times, end_ms, 'right')
+            chunks[self.TIME].append(times[begin:stop])
+            for column in columns:
+                values = self.open_column(stock_id, period, year, column, schema[column])
+                chunks[column].append(values[begin:stop])
+        result = {}
+        for column, arrays in chunks.items():
+            dtype = '<i8' if column == self.TIME else schema[column]
+            if len(arrays) == 0:
+                result[column] = np.empty(0, dtype=dtype)
+            elif len(arrays) == 1:
+                # zero copy view of the memory map
+                result[column] = arrays[0]
+            else:
+                result[column] = np.concatenate(arrays)
+        return result
+
+    def read_aligned(self, stock_ids: List[str], period: str, start: datetime, end: datetime,
+                     column: str = 'close') -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        bars = {stock_id: self.read(stock_id, period, start, end, [column]) for stock_id in stock_ids}
+        times = np.unique(np.concatenate([data[self.TIME] for data in bars.values()] + [np.empty(0, '<i8')]))
+        values = {}
+        for stock_id, data in bars.items():
+            aligned = np.full(len(times), np.nan)
+            aligned[np.searchsorted(times, data[self.TIME])] = data[column]
+            values[stock_id] = aligned
+        return times.astype('datetime64[ms]'), values
@@ -0,0 +1,160 @@
+from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+import threading
+import time
+
+from open_quant_app.data.BarStore import BarStore
+import xtquant.xtdata as xt_data
+
+from loguru import logger
+import numpy as np
+
+
+class DownloadJob:
+    def __init__(self, period: str, stock_ids: List[str], start_time: str, end_time: str):
+        self.period: str = period
+        self.stock_ids: List[str] = stock_ids
+        self.start_time: str = start_time
+        self.end_time: str = end_time
+        self.attempts: int = 0
+        self.finished: int = 0
+
+    def on_progress(self, data, attempt: int):
+        # late pushes of an earlier attempt are ignored
+        if attempt == self.attempts:
+            self.finished = data['finished']
+
+
+class DownloadManager:
+    # tick order book columns hold one list per row, stored as bidPrice1 .. bidPrice5 (level 1 = best price)
+    BOOK_COLUMNS = ['bidPrice', 'askPrice', 'bidVol', 'askVol']
+    BOOK_DEPTH = 5
+
+    def __init__(self, config: dict, store: BarStore = None, max_workers: int = 4, chunk_size: int = 100,
+                 retries: int = 3, backoff: float = 1.0):
+        self.stock_ids = [stock_id for stock_id_tuple in config['stock']['stock_ids'] for stock_id in stock_id_tuple]
+        # with a store, stored date ranges are skipped and downloaded bars are appended to it
+        self.store: BarStore = store
+        self.max_workers: int = max_workers
+        self.chunk_size: int = chunk_size
+        self.retries: int = retries
+        # seconds before the first retry, doubled on every further one
+        self.backoff: float = backoff
+        self.lock = threading.Lock()
+        self.jobs: List[DownloadJob] = []
+        self.failed: List[DownloadJob] = []
+        self.start_timestamp: float = 0
+        self.symbols_done: int = 0
+        self.bars_stored: int = 0
+
+    def plan(self, period_list: [str], start_time: str, end_time: str) -> List[DownloadJob]:
+        jobs = []
+        for period in period_list:
+            # group stocks by the first date still missing locally
+            groups: Dict[str, List[str]] = {}
+            for stock_id in self.stock_ids:
+                begin = self.missing_from(stock_id, period, start_time)
+                if end_time != "" and begin > end_time:
+                    continue
+                groups.setdefault(begin, []).append(stock_id)
+            for begin, stock_ids in groups.items():
+                for i in range(0, len(stock_ids), self.chunk_size):
+                    jobs.append(DownloadJob(period, stock_ids[i:i + self.chunk_size], begin, end_time))
+        skipped = len(self.stock_ids) * len(period_list) - sum(len(job.stock_ids) for job in jobs)
+        logger.info(f"planned {len(jobs)} download jobs, {skipped} (stock, period) pairs already stored")
+        return jobs
+
+    def missing_from(self, stock_id: str, period: str, start_time: str) -> str:
+        if self.store is None:
+            return start_time
+        last_time = self.store.last_time(stock_id, period)
+        if last_time < 0:
+            return start_time
+        # re-download the last stored day, the store only appends bars after its last one
+        last_day = datetime.fromtimestamp(last_time / 1000).strftime("%Y%m%d")
+        return max(last_day, start_time)
+
+    def run_job(self, job: DownloadJob) -> DownloadJob:
+        while True:
+            job.attempts += 1
+            try:
+                # returns once the download is over, progress is not pushed when there is nothing to download
+                xt_data.download_history_data2(job.stock_ids, job.period, job.start_time, job.end_time,
+                                               lambda data, attempt=job.attempts: job.on_progress(data, attempt))
+                if self.store is not None:
+                    self.store_job(job)
+                with self.lock:
+                    self.symbols_done += len(job.stock_ids)
+                return job
+            except Exception as e:
+                logger.warning(f"download {job.period} {job.stock_ids[0]}.. ({len(job.stock_ids)} stocks) "
+                               f"attempt {job.attempts} failed: {e}")
+                if job.attempts > self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** (job.attempts - 1))
+
+    def store_job(self, job: DownloadJob):
+        data = xt_data.get_market_data_ex([], job.stock_ids, job.period, job.start_time, job.end_time)
+        for stock_id, df in data.items():
+            bars = self.to_bars(df)
+            appended = self.store.append(stock_id, job.period, bars)
+            with self.lock:
+                self.bars_stored += appended
+
+    @staticmethod
+    def to_bars(df) -> Dict[str, np.ndarray]:
+        bars = {}
+        for column in df.columns:
+            values = df[column].to_numpy()
+            if column in DownloadManager.BOOK_COLUMNS:
+                levels = np.zeros((len(values), DownloadManager.BOOK_DEPTH))
+                for row, book in enumerate(values):
+                    book = list(book)[:DownloadManager.BOOK_DEPTH]
+                    levels[row, :len(book)] = book
+                for level in range(DownloadManager.BOOK_DEPTH):
+                    bars[f"{column}{level + 1}"] = levels[:, level]
+            elif values.dtype.kind in 'biuf':
+                bars[column] = values
+            else:
+                # e.g. 'stime', the store only holds numeric columns
+                logger.debug(f"skip non-numeric column {column} of dtype {values.dtype}")
+        return bars
+
+    def run(self, period_list: [str], start_time: str, end_time: str = "") -> dict:
+        self.jobs = self.plan(period_list, start_time, end_time)
+        self.failed = []
+        self.symbols_done = 0
+        self.bars_stored = 0
+        self.start_timestamp = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self.run_job, job): job for job in self.jobs}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    self.failed.append(futures[future])
+                    logger.error(f"download job gave up: {e}")
+                logger.info(f"download progress: {self.metrics()}")
+        metrics = self.metrics()
+        if len(self.failed) != 0:
+            logger.error(f"{len(self.failed)} download jobs failed, run again to resume")
+        else:
+            logger.success(f"download finished: {metrics}")
+        return metrics
+
+    def metrics(self) -> dict:
+        elapsed = time.monotonic() - self.start_timestamp
+        total = sum(len(job.stock_ids) for job in self.jobs)
+        return {
+            'jobs': len(self.jobs),
+            'failed_jobs': len(self.failed),
+            'symbols': total,
+            'symbols_done': self.symbols_done,
+            'bars_stored': self.bars_stored,
+            'elapsed': elapsed,
+            'symbols_per_second': self.symbols_done / elapsed if elapsed > 0 else 0.0,
+            # (period, first stock, stocks, finished, attempts) of every job
+            'job_progress': [(job.period, job.stock_ids[0], len(job.stock_ids), job.finished, job.attempts)
+                             for job in self.jobs],
+        }
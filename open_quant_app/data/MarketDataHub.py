@@ -0,0 +1,169 @@
+from typing import List, Dict, Tuple, Callable
+import math
+import threading
+
+import numpy as np
+
+
+class MarketDataHub:
+    # one xtdata subscription per (stock, period) shared by every listener, the latest tick and the bars being
+    # built from ticks are kept per symbol in preallocated tables, rows are written by the quote callback thread
+    TICK_FIELDS = ['time', 'lastPrice', 'open', 'high', 'low', 'lastClose', 'volume', 'amount',
+                   'bidPrice1', 'bidVol1', 'askPrice1', 'askVol1']
+    TIME, LAST, VOLUME = 0, 1, 6
+    # bar columns, time = bar start in epoch ms
+    BAR_FIELDS = ['time', 'open', 'high', 'low', 'close', 'volume']
+    PERIODS = {'1m': 60 * 1000, '5m': 5 * 60 * 1000, '15m': 15 * 60 * 1000, '30m': 30 * 60 * 1000,
+               '1h': 60 * 60 * 1000}
+
+    def __init__(self, capacity: int = 1024, bar_periods: List[str] = None, bar_history: int = 240):
+        self.bar_periods: List[str] = ['1m', '5m'] if bar_periods is None else bar_periods
+        self.bar_history: int = bar_history
+        self.lock = threading.Lock()
+        self.symbols: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.ticks = np.full((capacity, len(MarketDataHub.TICK_FIELDS)), np.nan)
+        # building bar per period & symbol, and a ring of the completed ones
+        self.building = {period: np.full((capacity, len(MarketDataHub.BAR_FIELDS)), np.nan)
+                         for period in self.bar_periods}
+        self.history = {period: np.zeros((capacity, bar_history, len(MarketDataHub.BAR_FIELDS)))
+                        for period in self.bar_periods}
+        self.history_count = {period: np.zeros(capacity, dtype=np.int64) for period in self.bar_periods}
+        self.subscriptions: Dict[Tuple[str, str], int] = {}
+        # listeners per (stock, period), called with (payloads, period)
+        self.listeners: Dict[Tuple[str, str], List[Callable[[dict, str], None]]] = {}
+        self.received: int = 0
+
+    @staticmethod
+    def from_config(config: dict):
+        hub = config.get('hub', {})
+        return MarketDataHub(hub.get('capacity', 1024), hub.get('bar_periods', ['1m', '5m']),
+                             hub.get('bar_history', 240))
+
+    def row(self, symbol: str) -> int:
+        i = self.index.get(symbol)
+        if i is not None:
+            return i
+        with self.lock:
+            i = self.index.get(symbol)
+            if i is not None:
+                return i
+            i = len(self.symbols)
+            if i == len(self.ticks):
+                # grow by doubling, readers keep working on the old tables until the swap
+                self.ticks = np.concatenate([self.ticks, np.full_like(self.ticks, np.nan)])
+                for period in self.bar_periods:
+                    self.building[period] = np.concatenate([self.building[period],
+                                                            np.full_like(self.building[period], np.nan)])
+                    self.history[period] = np.concatenate([self.history[period],
+                                                           np.zeros_like(self.history[period])])
+                    self.history_count[period] = np.concatenate([self.history_count[period],
+                                                                 np.zeros_like(self.history_count[period])])
+            self.symbols.append(symbol)
+            self.index[symbol] = i
+        return i
+
+    def subscribe(self, stock_ids: List[str], period_list: List[str],
+                  callback: Callable[[dict, str], None] = None):
+        # callback gets the payloads of its own stocks & periods only, vendor subscriptions are made once
+        import xtquant.xtdata as xtdata
+        for stock_id in stock_ids:
+            self.row(stock_id)
+            for period in period_list:
+                key = (stock_id, period)
+                if callback is not None and callback not in self.listeners.setdefault(key, []):
+                    self.listeners[key].append(callback)
+                if key not in self.subscriptions:
+                    self.subscriptions[key] = xtdata.subscribe_quote(
+                        stock_id, period=period,
+                        callback=lambda data_cbk, period=period: self.on_data_callback(data_cbk, period))
+
+    def unsubscribe(self):
+        import xtquant.xtdata as xtdata
+        for seq in self.subscriptions.values():
+            xtdata.unsubscribe_quote(seq)
+        self.subscriptions = {}
+        self.listeners = {}
+
+    def on_data_callback(self, data_cbk: dict, period: str = 'tick'):
+        batches: Dict[int, Tuple[Callable[[dict, str], None], dict]] = {}
+        for stock_id, quotes in data_cbk.items():
+            for quote in quotes if isinstance(quotes, list) else [quotes]:
+                if isinstance(quote, dict) and 'lastPrice' in quote:
+                    self.update(stock_id, quote)
+            for listener in self.listeners.get((stock_id, period), []):
+                batches.setdefault(id(listener), (listener, {}))[1][stock_id] = quotes
+        for listener, batch in batches.values():
+            listener(batch, period)
+
+    def update(self, symbol: str, quote: dict):
+        self.received += 1
+        i = self.row(symbol)
+        # python scalars via item(), numpy scalar indexing costs more than the update itself
+        previous_volume = self.ticks.item(i, MarketDataHub.VOLUME)
+        bid_prices, bid_volumes = quote.get('bidPrice') or [math.nan], quote.get('bidVol') or [math.nan]
+        ask_prices, ask_volumes = quote.get('askPrice') or [math.nan], quote.get('askVol') or [math.nan]
+        self.ticks[i] = (quote.get('time', math.nan), quote['lastPrice'], quote.get('open', math.nan),
+                         quote.get('high', math.nan), quote.get('low', math.nan), quote.get('lastClose', math.nan),
+                         quote.get('volume', math.nan), quote.get('amount', math.nan), bid_prices[0], bid_volumes[0],
+                         ask_prices[0], ask_volumes[0])
+        # traded volume since the previous tick, the cumulative volume restarts every day
+        volume = quote.get('volume', 0)
+        if math.isnan(previous_volume):
+            previous_volume = volume
+        elif volume < previous_volume:
+            previous_volume = 0
+        self.aggregate(i, quote.get('time', 0), quote['lastPrice'], volume - previous_volume)
+
+    def aggregate(self, i: int, timestamp: int, price: float, volume: float):
+        for period in self.bar_periods:
+            building = self.building[period]
+            start = timestamp // MarketDataHub.PERIODS[period] * MarketDataHub.PERIODS[period]
+            bar_start, high, low, bar_volume = (building.item(i, 0), building.item(i, 2), building.item(i, 3),
+                                                building.item(i, 5))
+            if bar_start == start:
+                building[i, 2:] = (high if high > price else price, low if low < price else price, price,
+                                   bar_volume + volume)
+                continue
+            if not math.isnan(bar_start):
+                count = self.history_count[period].item(i)
+                self.history[period][i, count % self.bar_history] = building[i]
+                self.history_count[period][i] = count + 1
+            building[i] = (start, price, price, price, price, volume)
+
+    def latest(self, symbol: str) -> np.ndarray:
+        # latest tick as a row of TICK_FIELDS, None for unknown symbols
+        i = self.index.get(symbol)
+        return None if i is None else self.ticks[i].copy()
+
+    def snapshot(self, symbols: List[str]) -> Dict[str, np.ndarray]:
+        # TICK_FIELDS columns of the symbols in one gather, NaN for symbols without a tick yet & unknown symbols
+        rows = np.array([self.index.get(symbol, -1) for symbol in symbols], dtype=np.int64)
+        table = self.ticks[np.maximum(rows, 0)]
+        table[rows < 0] = np.nan
+        return {field: table[:, k] for k, field in enumerate(MarketDataHub.TICK_FIELDS)}
+
+    def bar(self, symbol: str, period: str) -> np.ndarray:
+        # bar being built, a row of BAR_FIELDS
+        i = self.index.get(symbol)
+        return None if i is None else self.building[period][i].copy()
+
+    def bars(self, symbol: str, period: str) -> np.ndarray:
+        # completed bars, oldest first, at most bar_history
+        i = self.index.get(symbol)
+        if i is None:
+            return np.empty((0, len(MarketDataHub.BAR_FIELDS)))
+        count = int(self.history_count[period][i])
+        ring = self.history[period][i]
+        if count <= self.bar_history:
+            return ring[:count].copy()
+        k = count % self.bar_history
+        return np.concatenate([ring[k:], ring[:k]])
+
+    def stats(self) -> dict:
+        return {
+            'symbols': len(self.symbols),
+            'subscriptions': len(self.subscriptions),
+            'listeners': sum(len(listeners) for listeners in self.listeners.values()),
+            'received': self.received,
+        }
@@ -1,16 +1,43 @@
 import enum
-from typing import Dict, List
+from typing import Dict, List, Set, Tuple
 from datetime import datetime, timedelta
+from collections import deque
+import heapq
+import itertools
+import threading
 
 from open_quant_app.trade.Trader import Trader
+from xtquant import xtconstant
+from xtquant.xttype import XtOrder, XtCancelError
 
 from loguru import logger
 
 
 class Order:
-    def __init__(self, order_id: int, order_timestamp: datetime):
+    FINAL_STATUS = {xtconstant.ORDER_SUCCEEDED, xtconstant.ORDER_CANCELED, xtconstant.ORDER_PART_CANCEL,
+                    xtconstant.ORDER_JUNK}
+
+    def __init__(self, order_id: int, order_timestamp: datetime, stock_id: str = '',
+                 order_type: int = xtconstant.STOCK_BUY, volume: int = 0, price: float = 0.0, strategy_id: int = -1):
         self.order_id: int = order_id
         self.order_timestamp = order_timestamp
+        self.stock_id: str = stock_id
+        self.order_type: int = order_type
+        self.volume: int = volume
+        self.price: float = price
+        self.strategy_id: int = strategy_id
+        self.traded_volume: int = 0
+        self.status: int = xtconstant.ORDER_UNREPORTED
+        self.canceling: bool = False
+        self.chasing: bool = False
+        self.chase: int = 0
+
+    def is_final(self) -> bool:
+        # order id <= 0: rejected before submission or filled instantly by the back tester
+        return self.order_id <= 0 or self.status in Order.FINAL_STATUS
+
+    def remaining(self) -> int:
+        return self.volume - self.traded_volume
 
 
 class OrderTuple:
@@ -28,15 +55,73 @@ class OrderStatus(enum.Enum):
 
 
 class OrderManager:
-    def __init__(self, trader: Trader, stock_ids: List[str], delay: float = 1, sliding_point: float = 0.0005):
+    def __init__(self, trader: Trader, stock_ids: List[str], delay: float = 1, sliding_point: float = 0.0005,
+                 max_chase: int = 5):
         self.orders: List[OrderTuple] = []
         self.trader: Trader = trader
         self.stock_ids: [str] = stock_ids
         self.delay: float = delay
         self.sliding_point: float = sliding_point
+        self.max_chase: int = max_chase
+        self.lock = threading.RLock()
+        # indexes over working orders
+        self.order_index: Dict[int, Tuple[OrderTuple, Order]] = {}
+        self.stock_index: Dict[str, Set[int]] = {}
+        # (deadline, seq, order id), entries of orders that are no longer working are skipped lazily
+        self.timeouts: List[Tuple[datetime, int, int]] = []
+        self.seq = itertools.count()
+        # canceled by timeout, waiting to be re-priced on the strategy thread
+        self.chase_queue: deque = deque()
+        self.has_finished: bool = False
+        # timestamp of the last handle, simulated in backtest, re-arms timeouts from the callback thread
+        self.now: datetime = None
+        if trader is not None:
+            trader.order_listeners.append(self.on_order)
+            trader.cancel_error_listeners.append(self.on_cancel_error)
 
     def insert(self, order_tuple: OrderTuple):
-        self.orders.append(order_tuple)
+        with self.lock:
+            self.orders.append(order_tuple)
+            for order in order_tuple.orders:
+                self.track(order_tuple, order)
+            self.handle_once(order_tuple)
+
+    def track(self, order_tuple: OrderTuple, order: Order):
+        if order.is_final():
+            return
+        self.order_index[order.order_id] = (order_tuple, order)
+        self.stock_index.setdefault(order.stock_id, set()).add(order.order_id)
+        heapq.heappush(self.timeouts,
+                       (order.order_timestamp + timedelta(seconds=self.delay), next(self.seq), order.order_id))
+
+    def untrack(self, order: Order):
+        self.order_index.pop(order.order_id, None)
+        order_ids = self.stock_index.get(order.stock_id)
+        if order_ids is not None:
+            order_ids.discard(order.order_id)
+            if len(order_ids) == 0:
+                del self.stock_index[order.stock_id]
+
+    def state(self) -> dict:
+        with self.lock:
+            return {
+                'orders': self.orders,
+                'order_index': self.order_index,
+                'stock_index': self.stock_index,
+                'timeouts': self.timeouts,
+                'seq': next(self.seq),
+                'chase_queue': self.chase_queue,
+            }
+
+    def load_state(self, state: dict):
+        with self.lock:
+            self.orders = state['orders']
+            self.order_index = state['order_index']
+            self.stock_index = state['stock_index']
+            self.timeouts = state['timeouts']
+            self.seq = itertools.count(state['seq'])
+            self.chase_queue = state['chase_queue']
+            self.has_finished = any(order_tuple.status == OrderStatus.FINISHED for order_tuple in self.orders)
 
     def size(self) -> int:
         return len(self.orders)
@@ -44,16 +129,106 @@ class OrderManager:
     def empty(self) -> bool:
         return self.size() == 0
 
+    def working_orders(self, stock_id: str = None) -> List[Order]:
+        with self.lock:
+            if stock_id is None:
+                return [order for order_tuple, order in self.order_index.values()]
+            return [self.order_index[order_id][1] for order_id in self.stock_index.get(stock_id, set())]
+
     def clear_finished(self):
         self.orders = list(filter(lambda order_tuple: order_tuple.status != OrderStatus.FINISHED, self.orders))
+        self.has_finished = False
 
     def handle_once(self, order_tuple: OrderTuple) -> OrderTuple:
+        working = [order for order in order_tuple.orders if not order.is_final() or order.chasing]
+        if len(working) == 0:
+            order_tuple.status = OrderStatus.FINISHED
+            self.has_finished = True
+        elif any(order.order_type == xtconstant.STOCK_SELL for order in working):
+            order_tuple.status = OrderStatus.SELL_UNFINISHED
+        else:
+            order_tuple.status = OrderStatus.BUY_UNFINISHED
         return order_tuple
 
-    def handle(self):
-        logger.success(f"handle begin. {self.size()} order tuples left")
-        for i in range(self.size()):
-            self.orders[i] = self.handle_once(self.orders[i])
-        self.clear_finished()
-
-        logger.success(f"handle done. {self.size()} order tuples left")
+    def on_order(self, xt_order: XtOrder):
+        # called from the xt trader callback thread
+        with self.lock:
+            if xt_order.order_id not in self.order_index:
+                return
+            order_tuple, order = self.order_index[xt_order.order_id]
+            order.status = xt_order.order_status
+            order.traded_volume = xt_order.traded_volume
+            if not order.is_final():
+                return
+            self.untrack(order)
+            if order.canceling and order.remaining() > 0 and order.status != xtconstant.ORDER_JUNK:
+                order.chasing = True
+                self.chase_queue.append((order_tuple, order))
+            else:
+                self.handle_once(order_tuple)
+
+    def on_cancel_error(self, cancel_error: XtCancelError):
+        # called from the xt trader callback thread, the order keeps working and is canceled again later
+        with self.lock:
+            if cancel_error.order_id not in self.order_index:
+                return
+            order_tuple, order = self.order_index[cancel_error.order_id]
+            if not order.canceling:
+                return
+            order.canceling = False
+            now = datetime.now() if self.now is None else self.now
+            heapq.heappush(self.timeouts, (now + timedelta(seconds=self.delay), next(self.seq), order.order_id))
+        logger.warning(f"order id = {cancel_error.order_id}: cancel failed, {cancel_error.error_msg}, retry later")
+
+    def chase(self, order_tuple: OrderTuple, order: Order, now: datetime):
+        order.chasing = False
+        if order.chase >= self.max_chase:
+            logger.warning(f"order id = {order.order_id}, stock id = {order.stock_id}: chased {order.chase} times, "
+                           f"give up remaining volume = {order.remaining()}")
+            self.handle_once(order_tuple)
+            return
+        # slide at least one price tick (0.01)
+        slide = max(order.price * self.sliding_point, 0.01)
+        if order.order_type == xtconstant.STOCK_BUY:
+            price = round(order.price + slide, 2)
+        else:
+            price = round(order.price - slide, 2)
+        order_id = self.trader.order_stock(order.stock_id, order.order_type, order.remaining(), price,
+                                           order.strategy_id)
+        new_order = Order(order_id, now, order.stock_id, order.order_type, order.remaining(), price,
+                          order.strategy_id)
+        new_order.chase = order.chase + 1
+        order_tuple.orders[order_tuple.orders.index(order)] = new_order
+        self.track(order_tuple, new_order)
+        self.handle_once(order_tuple)
+
+    def handle(self, now: datetime = None):
+        # pass the simulated timestamp in backtest
+        now = datetime.now() if now is None else now
+        with self.lock:
+            self.now = now
+            # re-price orders whose timeout cancel is confirmed
+            chased = len(self.chase_queue)
+            while len(self.chase_queue) != 0:
+                order_tuple, order = self.chase_queue.popleft()
+                self.chase(order_tuple, order, now)
+            # cancel expired orders, only the expired heap entries are visited
+            expired = 0
+            while len(self.timeouts) != 0 and self.timeouts[0][0] <= now:
+                deadline, seq, order_id = heapq.heappop(self.timeouts)
+                if order_id not in self.order_index:
+                    continue
+                order_tuple, order = self.order_index[order_id]
+                if order.canceling:
+                    continue
+                expired += 1
+                # flag first, the cancel confirmation may be pushed before cancel_order_stock returns
+                order.canceling = True
+                if self.trader.cancel_order_stock(order_id) != 0:
+                    order.canceling = False
+                    heapq.heappush(self.timeouts, (now + timedelta(seconds=self.delay), next(self.seq), order_id))
+            if self.has_finished:
+                self.clear_finished()
+        if chased != 0 or expired != 0:
+            logger.success(f"handle done. {chased} orders chased, {expired} orders expired, "
+                           f"{self.size()} order tuples left")
@@ -0,0 +1,355 @@
+from typing import List, Tuple, Dict
+from datetime import datetime, timedelta
+import math
+import threading
+import time
+
+from open_quant_app.manager.PositionManager import PositionManager
+from xtquant import xtconstant
+from xtquant.xttype import XtOrder, XtAsset, XtPosition, XtTrade
+
+import numpy as np
+
+
+class RiskManager:
+    WORKING_STATUS = {xtconstant.ORDER_UNREPORTED, xtconstant.ORDER_WAIT_REPORTING, xtconstant.ORDER_REPORTED,
+                      xtconstant.ORDER_REPORTED_CANCEL, xtconstant.ORDER_PARTSUCC_CANCEL, xtconstant.ORDER_PART_SUCC}
+    # final states that leave a remaining volume unfilled
+    CLOSED_STATUS = {xtconstant.ORDER_CANCELED, xtconstant.ORDER_PART_CANCEL, xtconstant.ORDER_JUNK}
+    SIZING_DIVISOR = 10
+
+    def __init__(self, config: dict):
+        risk = config.get('risk', {})
+        stock_id_tuples = config['stock']['stock_ids']
+        self.stock_ids: List[str] = []
+        self.index = {}
+        for stock_id_tuple in stock_id_tuples:
+            for stock_id in stock_id_tuple:
+                if stock_id not in self.index:
+                    self.index[stock_id] = len(self.stock_ids)
+                    self.stock_ids.append(stock_id)
+        # membership[strategy, stock] = 1 if the stock belongs to the strategy's tuple, owners[stock] = strategy ids
+        self.membership = np.zeros((len(stock_id_tuples), len(self.stock_ids)))
+        self.owners: List[List[int]] = [[] for _ in self.stock_ids]
+        for strategy_id, stock_id_tuple in enumerate(stock_id_tuples):
+            for stock_id in stock_id_tuple:
+                if self.membership[strategy_id, self.index[stock_id]] == 0:
+                    self.membership[strategy_id, self.index[stock_id]] = 1.0
+                    self.owners[self.index[stock_id]].append(strategy_id)
+        # limits, as fractions of total assets except the order rate
+        self.position_limits = np.array(PositionManager(config).positions, dtype=np.float64)
+        self.max_symbol_weight: float = risk.get('max_symbol_weight', 1.0)
+        self.max_turnover: float = risk.get('max_turnover', 0.0)
+        self.max_order_rate: int = risk.get('max_order_rate', 0)
+        # per stock state: volume, sellable volume, cost of the position, working buy notional & sell volume
+        n = len(self.stock_ids)
+        self.volume = np.zeros(n)
+        self.available = np.zeros(n)
+        self.cost = np.zeros(n)
+        self.pending_buy = np.zeros(n)
+        self.pending_sell = np.zeros(n)
+        # derived, kept in step by every update instead of recomputed per check: cost + working buy notional per
+        # stock, its sum per strategy & the total working buy notional
+        self.committed = np.zeros(n)
+        self.strategy_committed = np.zeros(len(stock_id_tuples))
+        self.pending_buy_total: float = 0.0
+        self.cash: float = 0.0
+        self.total_asset: float = 0.0
+        # per strategy notional traded today, [day_start, day_end) in epoch seconds
+        self.turnover = np.zeros(len(stock_id_tuples))
+        self.day = None
+        self.day_start: float = math.inf
+        self.day_end: float = -math.inf
+        # submit times of the last max_order_rate orders, seconds
+        self.order_times = np.full(max(self.max_order_rate, 1), -np.inf)
+        self.order_count: int = 0
+        # live orders by id: [strategy id, limit price, remaining volume released], kept for the day so trade &
+        # order pushes release the working volume once and attribute turnover to the strategy
+        self.orders: Dict[int, list] = {}
+        # order & trade pushes arrive on the xt callback thread
+        self.lock = threading.RLock()
+
+    def __getstate__(self) -> dict:
+        # pickled with backtest checkpoints
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    def row(self, stock_id: str) -> int:
+        # stocks outside the config, e.g. held from before or bought by hand, are added when first held or
+        # ordered, they belong to no strategy
+        i = self.index.get(stock_id)
+        if i is not None:
+            return i
+        i = len(self.stock_ids)
+        self.volume = np.append(self.volume, 0.0)
+        self.available = np.append(self.available, 0.0)
+        self.cost = np.append(self.cost, 0.0)
+        self.pending_buy = np.append(self.pending_buy, 0.0)
+        self.pending_sell = np.append(self.pending_sell, 0.0)
+        self.committed = np.append(self.committed, 0.0)
+        self.membership = np.concatenate([self.membership, np.zeros((len(self.membership), 1))], axis=1)
+        self.owners.append([])
+        self.stock_ids.append(stock_id)
+        self.index[stock_id] = i
+        return i
+
+    def load(self, positions: List[XtPosition], asset: XtAsset, orders: List[XtOrder]):
+        # full sync from queried account data
+        with self.lock:
+            self.volume[:] = 0
+            self.available[:] = 0
+            self.cost[:] = 0
+            self.pending_buy[:] = 0
+            self.pending_sell[:] = 0
+            for position in positions or []:
+                i = self.row(position.stock_code)
+                self.volume[i] = position.can_use_volume + position.frozen_volume
+                # can_use_volume excludes the volume frozen by working sells, which pending_sell counts
+                self.available[i] = position.can_use_volume + position.frozen_volume
+                # use open_price, because avg price may be 0
+                self.cost[i] = position.open_price * self.volume[i]
+            for order in orders or []:
+                if order.order_status not in RiskManager.WORKING_STATUS:
+                    continue
+                i = self.row(order.stock_code)
+                # counted again until a push closes it
+                self.orders.setdefault(order.order_id, [-1, order.price, False])[2] = False
+                remaining = order.order_volume - order.traded_volume
+                if order.order_type == xtconstant.STOCK_BUY:
+                    self.pending_buy[i] += remaining * order.price
+                else:
+                    self.pending_sell[i] += remaining
+            if asset is not None:
+                # QMT cash is what is left after freezing the working buys, which pending_buy counts again
+                self.cash = asset.cash + asset.frozen_cash
+                self.total_asset = asset.total_asset
+            self.committed = self.cost + self.pending_buy
+            self.strategy_committed = self.membership @ self.committed
+            self.pending_buy_total = float(self.pending_buy.sum())
+
+    def roll_day(self, now: float):
+        if self.day_start <= now < self.day_end:
+            return
+        day = datetime.fromtimestamp(now).date()
+        self.day_start = datetime.combine(day, datetime.min.time()).timestamp()
+        self.day_end = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
+        if day != self.day:
+            self.day = day
+            self.turnover[:] = 0
+            self.orders = {}
+
+    def check(self, stock_ids: List[str], order_types: np.ndarray, volumes: np.ndarray, prices: np.ndarray,
+              strategy_ids: np.ndarray, now: float = None) -> Tuple[np.ndarray, np.ndarray]:
+        # returns (pass mask, max allowed volume) of a batch of orders, checked in order: earlier orders of the
+        # batch use up room at their requested volume
+        with self.lock:
+            now = time.time() if now is None else now
+            self.roll_day(now)
+            if len(stock_ids) == 1:
+                # single orders, e.g. can_buy & max_can_sell, skip the array setup of the batch
+                passed, max_volume = self.check_one(stock_ids[0], int(order_types[0]), float(volumes[0]),
+                                                    float(prices[0]), int(strategy_ids[0]), now)
+                return np.array([passed]), np.array([max_volume], dtype=np.int64)
+            return self.check_batch(stock_ids, order_types, volumes, prices, strategy_ids, now)
+
+    def check_one(self, stock_id: str, order_type: int, volume: float, price: float, strategy_id: int,
+                  now: float) -> Tuple[bool, int]:
+        # check_batch of a single order on python scalars
+        i = self.index.get(stock_id)
+        total_asset = self.total_asset
+        if order_type == xtconstant.STOCK_BUY:
+            if price <= 0:
+                return False, 0
+            strategy_used = self.strategy_committed.item(strategy_id)
+            room = min(self.position_limits.item(strategy_id) * total_asset - strategy_used,
+                       self.max_symbol_weight * total_asset - (0.0 if i is None else self.committed.item(i)),
+                       self.cash - self.pending_buy_total)
+            if self.max_turnover > 0:
+                room = min(room, self.max_turnover * total_asset - self.turnover.item(strategy_id))
+            sizing_room = (total_asset - strategy_used) / RiskManager.SIZING_DIVISOR
+            max_volume = min(math.floor(max(min(sizing_room, room), 0) / price), volume)
+            passed = volume > 0 and volume * price <= room
+        elif order_type == xtconstant.STOCK_SELL:
+            if i is None:
+                return False, 0
+            max_volume = self.available.item(i) - self.pending_sell.item(i)
+            if self.max_turnover > 0:
+                turnover_price = price
+                if price <= 0 < self.volume.item(i):
+                    turnover_price = self.cost.item(i) / self.volume.item(i)
+                if turnover_price > 0:
+                    turnover_room = self.max_turnover * total_asset - self.turnover.item(strategy_id)
+                    max_volume = min(max_volume, math.floor(max(turnover_room, 0) / turnover_price))
+            passed = 0 < volume <= max_volume
+            max_volume = max(max_volume, 0)
+        else:
+            return False, 0
+        if passed and self.max_order_rate > 0:
+            passed = int((self.order_times > now - 1).sum()) < self.max_order_rate
+        return passed, int(max_volume)
+
+    def check_batch(self, stock_ids: List[str], order_types: np.ndarray, volumes: np.ndarray, prices: np.ndarray,
+                    strategy_ids: np.ndarray, now: float) -> Tuple[np.ndarray, np.ndarray]:
+        # unseen stocks get negative keys, one per stock id, to sum earlier orders of the same stock
+        unseen = {}
+        keys = np.array([self.index[stock_id] if stock_id in self.index else
+                         unseen.setdefault(stock_id, -1 - len(unseen)) for stock_id in stock_ids], dtype=np.int64)
+        order_types = np.asarray(order_types)
+        volumes = np.asarray(volumes, dtype=np.float64)
+        prices = np.asarray(prices, dtype=np.float64)
+        strategy_ids = np.asarray(strategy_ids, dtype=np.int64)
+        # stocks never held or ordered have no position & no working orders
+        known = keys >= 0
+        stocks = np.where(known, keys, 0)
+        is_buy = order_types == xtconstant.STOCK_BUY
+        is_sell = order_types == xtconstant.STOCK_SELL
+        notional = volumes * prices
+        buy_notional = np.where(is_buy, notional, 0.0)
+        # room left by current positions & working orders
+        in_strategy = np.where(known, self.membership[strategy_ids, stocks], 0.0)
+        strategy_used = self.strategy_committed[strategy_ids] + RiskManager.prior_sum(buy_notional * in_strategy,
+                                                                                       strategy_ids)
+        strategy_room = self.position_limits[strategy_ids] * self.total_asset - strategy_used
+        symbol_room = self.max_symbol_weight * self.total_asset - np.where(known, self.committed[stocks], 0.0) - \
+            RiskManager.prior_sum(buy_notional, keys)
+        cash_room = self.cash - self.pending_buy_total - (np.cumsum(buy_notional) - buy_notional)
+        # max buy volumes are sized like Trader.max_can_buy always did: a tenth of the assets not used by the
+        # strategy's positions & working buys, capped by every room the order is checked against
+        sizing_room = (self.total_asset - strategy_used) / RiskManager.SIZING_DIVISOR
+        buy_room = np.minimum(strategy_room, np.minimum(symbol_room, cash_room))
+        if self.max_turnover > 0:
+            # sells checked without a price (e.g. Trader.can_sell) count at the average cost of the position
+            with np.errstate(divide='ignore', invalid='ignore'):
+                avg_cost = np.where(self.volume[stocks] > 0, self.cost[stocks] / self.volume[stocks], 0.0)
+            turnover_prices = np.where(is_sell & (prices <= 0) & known, avg_cost, prices)
+            turnover_room = self.max_turnover * self.total_asset - self.turnover[strategy_ids] - RiskManager.prior_sum(
+                volumes * turnover_prices, strategy_ids)
+            buy_room = np.minimum(buy_room, turnover_room)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            max_buy = np.where(prices > 0, np.floor(np.maximum(np.minimum(sizing_room, buy_room), 0) / prices), 0.0)
+            if self.max_turnover > 0:
+                max_turnover_volume = np.where(turnover_prices > 0, np.maximum(turnover_room, 0) / turnover_prices,
+                                               np.inf)
+            else:
+                max_turnover_volume = np.full(len(volumes), np.inf)
+        # never more than requested, an order of max_buy passes the same check
+        max_buy = np.minimum(max_buy, volumes)
+        sell_volumes = np.where(known & is_sell, volumes, 0.0)
+        max_sell = np.minimum(self.available[stocks] - self.pending_sell[stocks] - RiskManager.prior_sum(
+            sell_volumes, keys), np.floor(max_turnover_volume))
+        max_sell = np.where(known, max_sell, 0.0)
+        max_volumes = np.where(is_buy, max_buy, np.where(is_sell, np.maximum(max_sell, 0), 0.0)).astype(np.int64)
+        fits = np.where(is_buy, (notional <= buy_room) & (prices > 0), volumes <= max_sell)
+        mask = (is_buy | is_sell) & (volumes > 0) & fits
+        if self.max_order_rate > 0:
+            # orders beyond the free slots of the last second are rejected
+            free = self.max_order_rate - int((self.order_times > now - 1).sum())
+            mask &= np.cumsum(mask) <= free
+        return mask, max_volumes
+
+    @staticmethod
+    def prior_sum(values: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        # sum of values of the earlier batch entries with the same key, batches are small so a
+        # (batch x batch) mask beats sorting
+        if len(values) <= 1:
+            return np.zeros(len(values))
+        return np.tril(keys[:, None] == keys[None, :], -1) @ values
+
+    # incremental updates, the derived sums follow every change of cost & pending_buy
+    def add_committed(self, i: int, amount: float):
+        self.committed[i] += amount
+        for strategy_id in self.owners[i]:
+            self.strategy_committed[strategy_id] += amount
+
+    def add_cost(self, i: int, amount: float):
+        self.cost[i] += amount
+        self.add_committed(i, amount)
+
+    def add_pending_buy(self, i: int, amount: float):
+        # releases beyond the working notional are dropped, pending_buy stays >= 0
+        amount = max(amount, -self.pending_buy.item(i))
+        self.pending_buy[i] += amount
+        self.pending_buy_total += amount
+        self.add_committed(i, amount)
+
+    def on_submit(self, stock_id: str, order_type: int, volume: int, price: float, strategy_id: int,
+                  now: float = None, order_id: int = -1):
+        # order_id: of the live order, its pushes then release the working volume
+        with self.lock:
+            now = time.time() if now is None else now
+            self.roll_day(now)
+            i = self.row(stock_id)
+            if order_type == xtconstant.STOCK_BUY:
+                self.add_pending_buy(i, volume * price)
+            else:
+                self.pending_sell[i] += volume
+            self.order_times[self.order_count % len(self.order_times)] = now
+            self.order_count += 1
+            if order_id > 0:
+                self.track(order_id, strategy_id, price)
+
+    def track(self, order_id: int, strategy_id: int, price: float):
+        # e.g. once an async order's id is pushed
+        with self.lock:
+            self.orders.setdefault(order_id, [strategy_id, price, False])[0] = strategy_id
+
+    def on_cancel(self, stock_id: str, order_type: int, volume: int, price: float):
+        # volume: the canceled remaining volume
+        with self.lock:
+            i = self.index.get(stock_id)
+            if i is None:
+                return
+            if order_type == xtconstant.STOCK_BUY:
+                self.add_pending_buy(i, -volume * price)
+            else:
+                self.pending_sell[i] = max(self.pending_sell.item(i) - volume, 0.0)
+
+    def on_fill(self, stock_id: str, order_type: int, volume: int, price: float, strategy_id: int,
+                order_price: float = None):
+        # order_price: limit price of the filled order, its working notional is released
+        with self.lock:
+            i = self.row(stock_id)
+            order_price = price if order_price is None else order_price
+            notional = volume * price
+            if 0 <= strategy_id < len(self.turnover):
+                self.turnover[strategy_id] += notional
+            if order_type == xtconstant.STOCK_BUY:
+                self.add_pending_buy(i, -volume * order_price)
+                self.volume[i] += volume
+                self.available[i] += volume
+                self.add_cost(i, notional)
+                self.cash -= notional
+            else:
+                # python scalars via item(), numpy scalar arithmetic costs more than the update itself
+                self.pending_sell[i] = max(self.pending_sell.item(i) - volume, 0.0)
+                held = self.volume.item(i)
+                if held > 0:
+                    self.add_cost(i, self.cost.item(i) * (max(held - volume, 0.0) / held - 1))
+                self.volume[i] = max(held - volume, 0.0)
+                self.available[i] = max(self.available.item(i) - volume, 0.0)
+                self.cash += notional
+
+    # live pushes, called from the xt trader callback thread
+    def on_order(self, order: XtOrder):
+        with self.lock:
+            entry = self.orders.get(order.order_id)
+            if entry is None or entry[2] or order.order_status not in RiskManager.CLOSED_STATUS:
+                return
+            # the traded part is released by its trade pushes
+            entry[2] = True
+            self.on_cancel(order.stock_code, order.order_type, order.order_volume - order.traded_volume, entry[1])
+
+    def on_trade(self, trade: XtTrade):
+        with self.lock:
+            entry = self.orders.get(trade.order_id)
+            strategy_id, order_price = (-1, trade.traded_price) if entry is None else (entry[0], entry[1])
+            self.on_fill(trade.stock_code, trade.order_type, trade.traded_volume, trade.traded_price, strategy_id,
+                         order_price)
+
+    def strategy_exposure(self) -> np.ndarray:
+        return self.membership @ self.cost
@@ -1,61 +1,234 @@
 from datetime import datetime
 import time
 
-import xtquant.xtdata as xtdata
 from open_quant_app.trade.Trader import Trader
+from open_quant_app.backtest.Checkpoint import Checkpoint
+from open_quant_app.backtest.VectorBackTester import VectorBackTester
 from open_quant_app.utils.FixedQueue import FixedQueue
+from open_quant_app.utils.QuoteQueue import QuoteQueue
+from open_quant_app.utils.QuoteRecorder import QuoteRecorder
+from open_quant_app.utils.RingBuffer import RingBuffer
 from open_quant_app.manager.OrderManager import OrderManager
 from open_quant_app.utils.TimeUtils import TimeUtils
+from open_quant_app.utils.TradingCalendar import TradingCalendar
 
 from loguru import logger
+import numpy as np
 
 
 class StrategyData:
-    def __init__(self, strategy_id: int = -1, timestamp: datetime = datetime.now()):
+    def __init__(self, strategy_id: int = -1, timestamp: datetime = None):
         self.strategy_id: int = strategy_id
-        self.timestamp: datetime = timestamp
+        self.timestamp: datetime = datetime.now() if timestamp is None else timestamp
 
     def empty(self) -> bool:
         return False
 
 
 class Strategy:
+    # set a (structured) numpy dtype named after the StrategyData fields to keep records in a typed RingBuffer
+    record_dtype = None
+
     def __init__(self, strategy_id: int, trader: Trader, config: dict = None):
         self.strategy_id: int = strategy_id
         self.trader: Trader = trader
+        self.config: dict = config
         self.stock_ids: [str] = config['stock']['stock_ids'][self.strategy_id]
         self.period: float = config['strategy']['periods']
-        self.order_manager: OrderManager = OrderManager(trader, self.stock_ids)
-        self.records: FixedQueue[StrategyData] = FixedQueue(config['ui']['record_length'])
+        self.order_manager: OrderManager = OrderManager(trader, self.stock_ids, config['stock']['check_order_delay'],
+                                                        config['stock']['sliding_point'])
+        if self.record_dtype is None:
+            self.records: FixedQueue[StrategyData] = FixedQueue(config['ui']['record_length'])
+        else:
+            self.records: RingBuffer = RingBuffer(config['ui']['record_length'], self.record_dtype)
+        # latest quote per (stock, period), e.g. self.quotes[('600000.SH', 'tick')], filled in event mode
+        self.quote_queue: QuoteQueue = QuoteQueue(config['strategy'].get('quote_queue_size', 1024))
+        self.quotes: dict = {}
+        # raw payloads saved for MarketReplay when [replay] record_dir is set
+        self.recorder: QuoteRecorder = QuoteRecorder.from_config(config, strategy_id)
+        if self.recorder is not None and trader is not None:
+            trader.recorders.append(self.recorder)
+        # set by StrategyScheduler.register, gives access to the shared worker pool
+        self.scheduler = None
+        # shared MarketDataHub, latest ticks & bars without going back to xtdata
+        self.hub = None
+        # vector backtests run without a trader
+        if trader is not None:
+            trader.register(self)
 
     def subscribe_quotes(self, period_list: [str]):
+        if self.hub is not None:
+            self.hub.subscribe(self.stock_ids, period_list, self.on_data_callback)
+            return
+        # xtdata starts its client on import, only loaded once live quotes are subscribed
+        import xtquant.xtdata as xtdata
         for stock_id in self.stock_ids:
             for period in period_list:
-                xtdata.subscribe_quote(stock_id, period=period, callback=self.on_data_callback)
+                xtdata.subscribe_quote(stock_id, period=period,
+                                       callback=lambda data_cbk, period=period: self.on_data_callback(data_cbk, period))
 
-    def on_data_callback(self, data_cbk):
-        pass
+    def on_data_callback(self, data_cbk, period: str = 'tick'):
+        if self.recorder is not None:
+            self.recorder.record(data_cbk, period=period)
+        self.quote_queue.put(data_cbk, period)
+
+    def flush_quotes(self):
+        # on loop exit, recorded quotes still queued for the writer reach disk
+        if self.recorder is not None:
+            self.recorder.flush()
 
     def exec(self, timestamp: datetime = None) -> StrategyData:
         return StrategyData()
 
-    def main_loop(self):
-        while True:
-            timestamp = datetime.now()
-            if TimeUtils.judge_trade_time(timestamp):
-                record = self.exec(timestamp)
+    def timed_exec(self, timestamp: datetime) -> StrategyData:
+        start = self.trader.profiler.start()
+        record = self.exec(timestamp)
+        self.trader.profiler.stop('exec', start)
+        return record
+
+    def save_state(self) -> dict:
+        # strategy defined state kept in backtest checkpoints, e.g. indicators & signal history
+        return {}
+
+    def load_state(self, state: dict):
+        pass
+
+    def checkpoint_params(self) -> dict:
+        # plain attributes, e.g. set by BackTestRunner grid tasks, are part of the checkpoint key
+        return {name: value for name, value in vars(self).items()
+                if not name.startswith('_') and isinstance(value, (bool, int, float, str))}
+
+    def checkpoint_state(self, next_timestamp: datetime) -> dict:
+        # next_timestamp: where the timestamp loop continues after the day
+        return {
+            'next_timestamp': next_timestamp,
+            'back_tester': self.trader.back_tester.state(),
+            'order_manager': self.order_manager.state(),
+            'records': self.records,
+            'strategy': self.save_state(),
+        }
+
+    def restore_checkpoint(self, state: dict):
+        self.trader.back_tester.load_state(state['back_tester'])
+        self.order_manager.load_state(state['order_manager'])
+        self.records = state['records']
+        self.load_state(state['strategy'])
+
+    def exec_vector(self, timestamps: np.ndarray, prices: np.ndarray) -> np.ndarray:
+        # return target positions, shape = (timestamps, stocks in tuple)
+        return np.zeros(prices.shape, dtype=np.int64)
+
+    def main_loop(self, calendar: TradingCalendar = None):
+        if calendar is not None:
+            self.main_loop_calendar(calendar)
+            return
+        try:
+            while True:
+                timestamp = datetime.now()
+                if TimeUtils.judge_trade_time(timestamp):
+                    record = self.timed_exec(timestamp)
+                    if not record.empty():
+                        self.records.append(record)
+                else:
+                    logger.warning(f"curr timestamp =  {timestamp} not in trade time!")
+                time.sleep(self.period)
+        finally:
+            self.flush_quotes()
+
+    def main_loop_calendar(self, calendar: TradingCalendar):
+        # sleep through closed hours, then exec on the precomputed tick grid
+        if len(calendar.days) == 0:
+            logger.warning("no trading day in the calendar range")
+            return
+        end = datetime.combine(calendar.days[-1].astype(datetime), datetime.max.time())
+        try:
+            for timestamp in calendar.iter_timestamps(datetime.now(), end, self.period):
+                delay = (timestamp - datetime.now()).total_seconds()
+                if delay < 0:
+                    continue
+                time.sleep(delay)
+                record = self.timed_exec(timestamp)
                 if not record.empty():
                     self.records.append(record)
-            else:
-                logger.warning(f"curr timestamp =  {timestamp} not in trade time!")
-            time.sleep(self.period)
+        finally:
+            self.flush_quotes()
 
-    def main_loop_back(self, start: datetime, end: datetime = datetime.now()):
-        curr_timestamp = start
+    def main_loop_event(self, timeout: float = 1, stats_interval: int = 1000):
+        # exec as soon as quotes arrive, bursts are coalesced to the latest quote per stock & period
+        decisions = 0
+        try:
+            while True:
+                batch = self.quote_queue.get(timeout)
+                if len(batch) == 0:
+                    continue
+                if not self.on_quote_batch(batch, datetime.now()):
+                    continue
+                decisions += 1
+                if decisions % stats_interval == 0:
+                    logger.info(f"id = {self.strategy_id}: quote queue stats = {self.quote_queue.stats()}")
+        finally:
+            self.flush_quotes()
+
+    def on_quote_batch(self, batch: dict, timestamp: datetime) -> bool:
+        # one event loop step, shared with MarketReplay, returns False if no decision was made
+        if len(batch) == 0:
+            return False
+        if not TimeUtils.judge_trade_time(timestamp):
+            logger.warning(f"curr timestamp =  {timestamp} not in trade time!")
+            return False
+        for key, (quote, arrival) in batch.items():
+            self.quotes[key] = quote
+        record = self.timed_exec(timestamp)
+        if not record.empty():
+            self.records.append(record)
+        self.quote_queue.record_latency(batch, self.trader.profiler)
+        return True
+
+    def main_loop_back(self, start: datetime, end: datetime = None, calendar: TradingCalendar = None,
+                       report: bool = True):
+        end = datetime.now() if end is None else end
         print(start)
-        while curr_timestamp < end:
-            record = self.exec(curr_timestamp)
+        # with [backtest] checkpoint_dir set, state is saved after every simulated day and the run resumes
+        # after the latest day a previous run with the same config, code & start already simulated
+        checkpoint = Checkpoint.from_config(self.config, type(self), {
+            'start': start, 'cash': self.trader.back_tester.account.initial_cash, **self.checkpoint_params()})
+        resume_day, resume_timestamp = None, None
+        if checkpoint is not None:
+            resume_day, state = checkpoint.latest(end)
+            if resume_day is not None:
+                self.restore_checkpoint(state)
+                resume_timestamp = state['next_timestamp']
+                logger.success(f"id = {self.strategy_id}: resume backtest after {resume_day}")
+        if calendar is not None:
+            timestamps = calendar.iter_timestamps(start if resume_timestamp is None else resume_timestamp, end,
+                                                  self.period)
+        else:
+            timestamps = self.back_timestamps(start if resume_timestamp is None else resume_timestamp, end)
+        day, last_timestamp = None, None
+        for timestamp in timestamps:
+            if resume_day is not None and timestamp.date() <= resume_day:
+                continue
+            if checkpoint is not None and day is not None and timestamp.date() != day:
+                checkpoint.save(day, self.checkpoint_state(timestamp))
+            day, last_timestamp = timestamp.date(), timestamp
+            self.trader.back_tester.advance(timestamp)
+            record = self.exec(timestamp)
             if not record.empty():
                 self.records.append(record)
+        if checkpoint is not None and day is not None and Checkpoint.day_closed(day, end):
+            checkpoint.save(day, self.checkpoint_state(TimeUtils.next_trade_timestamp(last_timestamp, self.period)))
+        if report:
+            self.trader.back_tester.report(self.strategy_id, save_as_file=True)
+
+    def back_timestamps(self, start: datetime, end: datetime):
+        curr_timestamp = start
+        while curr_timestamp < end:
+            yield curr_timestamp
             curr_timestamp = TimeUtils.next_trade_timestamp(curr_timestamp, self.period)
-        self.trader.back_tester.report(self.strategy_id, save_as_file=True)
+
+    def main_loop_vector(self, back_tester: VectorBackTester, report: bool = True):
+        targets = self.exec_vector(back_tester.timestamps, back_tester.strategy_prices(self.strategy_id))
+        back_tester.set_targets(self.strategy_id, targets)
+        back_tester.run()
+        if report:
+            back_tester.report(self.strategy_id, save_as_file=True)
@@ -0,0 +1,117 @@
+from typing import List
+from concurrent.futures import ProcessPoolExecutor, Future
+from datetime import datetime
+import heapq
+import itertools
+import time
+
+from open_quant_app.data.MarketDataHub import MarketDataHub
+from open_quant_app.strategy.Strategy import Strategy
+from open_quant_app.trade.Trader import Trader
+from open_quant_app.utils.TimeUtils import TimeUtils
+
+from loguru import logger
+
+
+class ScheduledStrategy:
+    def __init__(self, strategy: Strategy, period: float, priority: int):
+        self.strategy: Strategy = strategy
+        self.period: float = period
+        # smaller runs first when several strategies are due at the same time
+        self.priority: int = priority
+        self.runs: int = 0
+        self.overruns: int = 0
+        self.max_duration: float = 0.0
+
+
+class StrategyScheduler:
+    def __init__(self, trader: Trader, cpu_workers: int = 0, hub: MarketDataHub = None):
+        # one trader (one QMT session) & one market data hub shared by every registered strategy
+        self.trader: Trader = trader
+        self.hub: MarketDataHub = hub if hub is not None else MarketDataHub()
+        self.entries: List[ScheduledStrategy] = []
+        self.cpu_workers: int = cpu_workers
+        self.pool: ProcessPoolExecutor = None
+        self.seq = itertools.count()
+        self.running: bool = False
+
+    def register(self, strategy: Strategy, period: float = None, priority: int = 0):
+        if strategy.trader is not self.trader:
+            logger.warning(f"id = {strategy.strategy_id}: strategy uses its own trader, orders bypass the shared one")
+        entry = ScheduledStrategy(strategy, period if period is not None else strategy.period, priority)
+        self.entries.append(entry)
+        strategy.scheduler = self
+        strategy.hub = self.hub
+
+    def subscribe_quotes(self, period_list: [str]):
+        # one subscription per (stock, period) no matter how many strategies watch it, every strategy only
+        # sees its own stocks
+        for entry in self.entries:
+            self.hub.subscribe(entry.strategy.stock_ids, period_list, entry.strategy.on_data_callback)
+        logger.info(f"{len(self.hub.subscriptions)} quote subscriptions for {len(self.entries)} strategies")
+
+    def unsubscribe_quotes(self):
+        self.hub.unsubscribe()
+
+    def on_data_callback(self, data_cbk, period: str = 'tick'):
+        self.hub.on_data_callback(data_cbk, period)
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        # cpu heavy work goes to worker processes so it does not delay other strategies' exec
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.cpu_workers if self.cpu_workers > 0 else None)
+        return self.pool.submit(fn, *args, **kwargs)
+
+    def run_once(self, entry: ScheduledStrategy, timestamp: datetime):
+        begin = time.perf_counter()
+        try:
+            record = entry.strategy.exec(timestamp)
+            if not record.empty():
+                entry.strategy.records.append(record)
+        except Exception as e:
+            logger.error(f"id = {entry.strategy.strategy_id}: exec failed: {e}")
+        duration = time.perf_counter() - begin
+        if self.trader.profiler.enabled:
+            self.trader.profiler.record('exec', int(duration * 1e9))
+        entry.runs += 1
+        entry.max_duration = max(entry.max_duration, duration)
+        if duration > entry.period:
+            entry.overruns += 1
+            logger.warning(f"id = {entry.strategy.strategy_id}: exec took {duration:.4f}s > period "
+                           f"{entry.period}s, {entry.overruns} overruns")
+
+    def main_loop(self):
+        self.running = True
+        now = time.monotonic()
+        schedule = [(now, entry.priority, next(self.seq), entry) for entry in self.entries]
+        heapq.heapify(schedule)
+        while self.running and len(schedule) != 0:
+            due, priority, seq, entry = heapq.heappop(schedule)
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            timestamp = datetime.now()
+            if TimeUtils.judge_trade_time(timestamp):
+                self.run_once(entry, timestamp)
+            # skip beats missed by an overrun instead of bursting to catch up
+            next_due = due + entry.period
+            now = time.monotonic()
+            if next_due < now:
+                next_due += ((now - next_due) // entry.period + 1) * entry.period
+            heapq.heappush(schedule, (next_due, entry.priority, next(self.seq), entry))
+
+    def stop(self):
+        self.running = False
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+    def stats(self) -> List[dict]:
+        return [{
+            'strategy_id': entry.strategy.strategy_id,
+            'period': entry.period,
+            'priority': entry.priority,
+            'runs': entry.runs,
+            'overruns': entry.overruns,
+            'max_duration': entry.max_duration,
+        } for entry in self.entries]
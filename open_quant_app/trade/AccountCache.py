@@ -0,0 +1,58 @@
+from typing import List, Dict
+import threading
+import time
+
+from xtquant.xttype import XtOrder, XtAsset, XtPosition
+
+
+class AccountCache:
+    def __init__(self, max_age: float = 3):
+        self.max_age: float = max_age
+        self.lock = threading.Lock()
+        self.positions: Dict[str, XtPosition] = {}
+        self.orders: Dict[int, XtOrder] = {}
+        self.asset: XtAsset = None
+        self.refresh_timestamp: float = 0
+        self.dirty: bool = True
+        # seconds, simulated in replay
+        self.clock = time.monotonic
+
+    def is_stale(self) -> bool:
+        return self.dirty or self.clock() - self.refresh_timestamp > self.max_age
+
+    def invalidate(self):
+        self.dirty = True
+
+    def load(self, positions: List[XtPosition], asset: XtAsset, orders: List[XtOrder]):
+        with self.lock:
+            self.positions = {position.stock_code: position for position in (positions or [])}
+            self.orders = {order.order_id: order for order in (orders or [])}
+            self.asset = asset
+            self.refresh_timestamp = self.clock()
+            self.dirty = False
+
+    def get_position(self, stock_id: str) -> XtPosition:
+        return self.positions.get(stock_id)
+
+    def get_asset(self) -> XtAsset:
+        return self.asset
+
+    def get_orders(self) -> List[XtOrder]:
+        return list(self.orders.values())
+
+    # callback updates, called from the xt trader thread
+    def on_position(self, position: XtPosition):
+        with self.lock:
+            self.positions[position.stock_code] = position
+
+    def on_asset(self, asset: XtAsset):
+        with self.lock:
+            self.asset = asset
+
+    def on_order(self, order: XtOrder):
+        with self.lock:
+            self.orders[order.order_id] = order
+
+    def on_trade(self):
+        # a fill changes cash & positions, push/pull consistency is restored by the next refresh
+        self.dirty = True
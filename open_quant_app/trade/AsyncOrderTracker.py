@@ -0,0 +1,108 @@
+from typing import Dict, Tuple
+from concurrent.futures import Future
+import threading
+import time
+
+from xtquant.xttype import XtOrderResponse, XtOrderError
+
+from loguru import logger
+
+
+class AsyncOrderError(Exception):
+    def __init__(self, seq: int, order_id: int, error_msg: str):
+        super().__init__(f"async order seq = {seq}, order id = {order_id} failed: {error_msg}")
+        self.seq = seq
+        self.order_id = order_id
+        self.error_msg = error_msg
+
+
+class AsyncOrderTracker:
+    def __init__(self, timeout: float = 10, max_early: int = 1024):
+        # timeout: seconds before a future without response fails, e.g. errors pushed without seq
+        self.timeout: float = timeout
+        self.max_early: int = max_early
+        self.lock = threading.Lock()
+        # seq -> (future, deadline), in registration order so deadlines are increasing
+        self.futures: Dict[int, Tuple[Future, float]] = {}
+        # responses that arrive before order_stock_async has returned the seq, with their arrival time
+        self.early_responses: Dict[int, Tuple[XtOrderResponse, float]] = {}
+        self.clock = time.monotonic
+
+    def register(self, seq: int) -> Future:
+        future = Future()
+        now = self.clock()
+        with self.lock:
+            expired = self.sweep(now)
+            early = self.early_responses.pop(seq, None)
+            if early is None:
+                self.futures[seq] = (future, now + self.timeout)
+        self.fail(expired)
+        if early is not None:
+            self.resolve(future, early[0])
+        return future
+
+    def sweep(self, now: float) -> list:
+        # caller holds the lock, returns the expired (seq, future) to fail outside of it
+        expired = []
+        for seq, (future, deadline) in self.futures.items():
+            if deadline > now:
+                break
+            expired.append((seq, future))
+        for seq, future in expired:
+            del self.futures[seq]
+        # responses whose seq was never registered, e.g. orders sent around Trader
+        stale = []
+        for seq, (response, arrival) in self.early_responses.items():
+            if arrival + self.timeout > now:
+                break
+            stale.append(seq)
+        for seq in stale:
+            del self.early_responses[seq]
+        return expired
+
+    def fail(self, expired: list):
+        for seq, future in expired:
+            logger.error(f"async order seq = {seq}: no response within {self.timeout}s")
+            future.set_exception(AsyncOrderError(seq, -1, f"no response within {self.timeout}s"))
+
+    def expire(self):
+        # fails futures past their deadline without waiting for the next register or push
+        with self.lock:
+            expired = self.sweep(self.clock())
+        self.fail(expired)
+
+    def pending(self) -> int:
+        return len(self.futures)
+
+    @staticmethod
+    def resolve(future: Future, response: XtOrderResponse):
+        if response.order_id is None or response.order_id <= 0:
+            future.set_exception(AsyncOrderError(response.seq, response.order_id, response.error_msg))
+        else:
+            future.set_result(response.order_id)
+
+    def on_response(self, response: XtOrderResponse):
+        now = self.clock()
+        with self.lock:
+            expired = self.sweep(now)
+            entry = self.futures.pop(response.seq, None)
+            if entry is None:
+                if len(self.early_responses) >= self.max_early:
+                    # oldest first
+                    del self.early_responses[next(iter(self.early_responses))]
+                self.early_responses[response.seq] = (response, now)
+        self.fail(expired)
+        if entry is not None:
+            self.resolve(entry[0], response)
+
+    def on_error(self, order_error: XtOrderError):
+        seq = getattr(order_error, 'seq', None)
+        with self.lock:
+            expired = self.sweep(self.clock())
+            entry = self.futures.pop(seq, None) if seq is not None else None
+        self.fail(expired)
+        future = entry[0] if entry is not None else None
+        if future is not None:
+            future.set_exception(AsyncOrderError(seq, order_error.order_id, order_error.error_msg))
+        else:
+            logger.error(f"order id = {order_error.order_id} rejected: {order_error.error_msg}")
@@ -1,3 +1,10 @@
+from typing import List, Callable
+
+from open_quant_app.manager.RiskManager import RiskManager
+from open_quant_app.trade.AccountCache import AccountCache
+from open_quant_app.trade.AsyncOrderTracker import AsyncOrderTracker
+from open_quant_app.utils.AsyncLogger import AsyncLogger
+from open_quant_app.utils.Profiler import Profiler
 from xtquant.xttrader import XtQuantTraderCallback
 from xtquant.xttype import XtOrder, XtAsset, XtOrderError, XtOrderResponse, XtPosition, XtCancelError, \
     XtAccountStatus, XtTrade
@@ -6,37 +13,73 @@ from loguru import logger
 
 
 class CommonXtQuantTraderCallback(XtQuantTraderCallback):
+    def __init__(self, account_cache: AccountCache = None, order_tracker: AsyncOrderTracker = None,
+                 profiler: Profiler = None, log=None, risk_manager: RiskManager = None):
+        super().__init__()
+        self.account_cache: AccountCache = account_cache
+        # working volume of canceled orders & fills are applied between full syncs
+        self.risk_manager: RiskManager = risk_manager
+        self.order_tracker: AsyncOrderTracker = order_tracker
+        self.profiler: Profiler = profiler if profiler is not None else Profiler()
+        # AsyncLogger or the loguru logger, both take a "{}" template with args
+        self.log: AsyncLogger = log if log is not None else logger
+        # e.g. OrderManager.on_order, called with every order status push
+        self.order_listeners: List[Callable[[XtOrder], None]] = []
+        # e.g. OrderManager.on_cancel_error, called when a cancel is rejected asynchronously
+        self.cancel_error_listeners: List[Callable[[XtCancelError], None]] = []
+
     def on_disconnected(self):
         logger.error("Warning: connection lost!")
 
     def on_stock_order(self, order: XtOrder):
-        logger.info("on order callback")
-        logger.info(order.stock_code, order.order_status, order.order_sysid)
+        start = self.profiler.start()
+        self.log.info("on order callback: stock = {}, status = {}, sysid = {}", order.stock_code,
+                      order.order_status, order.order_sysid)
+        if self.account_cache is not None:
+            self.account_cache.on_order(order)
+        if self.risk_manager is not None:
+            self.risk_manager.on_order(order)
+        for listener in self.order_listeners:
+            listener(order)
+        self.profiler.stop('order_callback', start)
 
     def on_stock_asset(self, asset: XtAsset):
-        logger.info("on asset callback")
-        logger.info(asset.account_id, asset.cash, asset.total_asset)
+        self.log.info("on asset callback: account id = {}, cash = {}, total asset = {}", asset.account_id,
+                      asset.cash, asset.total_asset)
+        if self.account_cache is not None:
+            self.account_cache.on_asset(asset)
 
     def on_stock_trade(self, trade: XtTrade):
-        logger.info("on trade callback")
-        logger.info(trade.account_id, trade.stock_code, trade.order_id)
+        self.log.info("on trade callback: account id = {}, stock = {}, order id = {}", trade.account_id,
+                      trade.stock_code, trade.order_id)
+        if self.account_cache is not None:
+            self.account_cache.on_trade()
+        if self.risk_manager is not None:
+            self.risk_manager.on_trade(trade)
 
     def on_stock_position(self, position: XtPosition):
-        logger.info("on position callback")
-        logger.info(position.stock_code, position.volume)
+        self.log.info("on position callback: stock = {}, volume = {}", position.stock_code, position.volume)
+        if self.account_cache is not None:
+            self.account_cache.on_position(position)
 
     def on_order_error(self, order_error: XtOrderError):
-        logger.info("on order_error callback")
-        logger.info(order_error.order_id, order_error.error_id, order_error.error_msg)
+        self.log.info("on order_error callback: order id = {}, error id = {}, error msg = {}", order_error.order_id,
+                      order_error.error_id, order_error.error_msg)
+        if self.order_tracker is not None:
+            self.order_tracker.on_error(order_error)
 
     def on_cancel_error(self, cancel_error: XtCancelError):
-        logger.info("on cancel_error callback")
-        logger.info(cancel_error.order_id, cancel_error.error_id, cancel_error.error_msg)
+        self.log.info("on cancel_error callback: order id = {}, error id = {}, error msg = {}",
+                      cancel_error.order_id, cancel_error.error_id, cancel_error.error_msg)
+        for listener in self.cancel_error_listeners:
+            listener(cancel_error)
 
     def on_order_stock_async_response(self, response: XtOrderResponse):
-        logger.info("on_order_stock_async_response")
-        logger.info(response.account_id, response.order_id, response.seq)
+        self.log.info("on_order_stock_async_response: account id = {}, order id = {}, seq = {}",
+                      response.account_id, response.order_id, response.seq)
+        if self.order_tracker is not None:
+            self.order_tracker.on_response(response)
 
     def on_account_status(self, status: XtAccountStatus):
-        logger.info("on_account_status")
-        logger.info(status.account_id, status.account_type, status.status)
+        self.log.info("on_account_status: account id = {}, account type = {}, status = {}", status.account_id,
+                      status.account_type, status.status)
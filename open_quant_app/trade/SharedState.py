@@ -0,0 +1,306 @@
+from typing import Dict
+from datetime import datetime
+import json
+import os
+import threading
+import time
+
+from open_quant_app.manager.RiskManager import RiskManager
+
+from loguru import logger
+import numpy as np
+
+
+class SharedState:
+    # live portfolio state in one shared memory segment: account, positions, per strategy pnl, open orders and
+    # the latest StrategyData records. The trading process publishes snapshots of what the trader already holds
+    # (AccountCache, RiskManager, strategy records) from its own thread, never querying QMT; any number of
+    # processes attach by name and copy a consistent snapshot under a seqlock, without locks or ipc to the writer.
+    #   writer: trader.shared_state, set from [share] name, published every [share] interval seconds
+    #   reader: SharedState.attach(name).read()
+    MAGIC = 0x4f51534841524531
+    # written once at create, tells readers the table sizes and later writers the process owning the segment
+    LAYOUT_DTYPE = np.dtype([('magic', 'u8'), ('max_positions', 'i8'), ('max_orders', 'i8'),
+                             ('max_strategies', 'i8'), ('record_length', 'i8'), ('record_size', 'i8'),
+                             ('owner_pid', 'i8')])
+    # rewritten by every publish, counts are the used rows of each table, records is the total published
+    HEADER_DTYPE = np.dtype([('time', 'f8'), ('cash', 'f8'), ('frozen_cash', 'f8'), ('market_value', 'f8'),
+                             ('total_asset', 'f8'), ('positions', 'i8'), ('orders', 'i8'), ('strategies', 'i8'),
+                             ('records', 'i8')])
+    POSITION_DTYPE = np.dtype([('stock_code', 'S16'), ('volume', 'i8'), ('can_use_volume', 'i8'),
+                               ('frozen_volume', 'i8'), ('open_price', 'f8'), ('market_value', 'f8')])
+    ORDER_DTYPE = np.dtype([('order_id', 'i8'), ('stock_code', 'S16'), ('order_type', 'i4'), ('order_status', 'i4'),
+                            ('order_volume', 'i8'), ('traded_volume', 'i8'), ('price', 'f8'),
+                            ('traded_price', 'f8'), ('order_time', 'i8')])
+    # cost & value of the strategy's stocks, as in RiskManager.strategy_exposure, turnover of today
+    STRATEGY_DTYPE = np.dtype([('strategy_id', 'i8'), ('cost', 'f8'), ('value', 'f8'), ('pnl', 'f8'),
+                               ('turnover', 'f8'), ('records', 'i8')])
+
+    def __init__(self, shm, owner: bool, interval: float = 0.5):
+        self.shm = shm
+        self.owner: bool = owner
+        self.interval: float = interval
+        buf = shm.buf
+        self.seq: np.ndarray = np.ndarray((1,), dtype=np.uint64, buffer=buf, offset=0)
+        self.layout: np.ndarray = np.ndarray((1,), dtype=SharedState.LAYOUT_DTYPE, buffer=buf, offset=8)
+        if not owner and self.layout['magic'][0] != SharedState.MAGIC:
+            raise ValueError(f"{shm.name} is not a shared state segment")
+        layout = self.layout[0]
+        self.record_size: int = int(layout['record_size'])
+        self.record_dtype = np.dtype([('strategy_id', 'i8'), ('timestamp', 'f8'), ('data', f'S{self.record_size}')])
+        offset = 64
+        tables = {}
+        for name, dtype, rows in [('header', SharedState.HEADER_DTYPE, 1),
+                                  ('positions', SharedState.POSITION_DTYPE, int(layout['max_positions'])),
+                                  ('orders', SharedState.ORDER_DTYPE, int(layout['max_orders'])),
+                                  ('strategies', SharedState.STRATEGY_DTYPE, int(layout['max_strategies'])),
+                                  ('records', self.record_dtype, int(layout['record_length']))]:
+            tables[name] = np.ndarray((rows,), dtype=dtype, buffer=buf, offset=offset)
+            # 64 byte aligned tables
+            offset += (rows * dtype.itemsize + 63) // 64 * 64
+        self.header: np.ndarray = tables['header']
+        self.positions: np.ndarray = tables['positions']
+        self.orders: np.ndarray = tables['orders']
+        self.strategies: np.ndarray = tables['strategies']
+        self.records: np.ndarray = tables['records']
+        if not owner:
+            # readers never write the segment
+            for table in (self.seq, self.layout, self.header, self.positions, self.orders, self.strategies,
+                          self.records):
+                table.setflags(write=False)
+        # writer side, strategies whose records are published & the record counts already published
+        self.sources: list = []
+        self.published: Dict[int, int] = {}
+        self.record_count: int = 0
+        self.publishes: int = 0
+        self.running: bool = False
+        self.thread: threading.Thread = None
+        self.warned: bool = False
+
+    @staticmethod
+    def size(max_positions: int, max_orders: int, max_strategies: int, record_length: int,
+             record_size: int) -> int:
+        record_itemsize = np.dtype([('strategy_id', 'i8'), ('timestamp', 'f8'), ('data', f'S{record_size}')]).itemsize
+        size = 64
+        for itemsize, rows in [(SharedState.HEADER_DTYPE.itemsize, 1),
+                               (SharedState.POSITION_DTYPE.itemsize, max_positions),
+                               (SharedState.ORDER_DTYPE.itemsize, max_orders),
+                               (SharedState.STRATEGY_DTYPE.itemsize, max_strategies),
+                               (record_itemsize, record_length)]:
+            size += (rows * itemsize + 63) // 64 * 64
+        return size
+
+    @staticmethod
+    def create(name: str, max_positions: int = 256, max_orders: int = 1024, max_strategies: int = 64,
+               record_length: int = 256, record_size: int = 512, interval: float = 0.5):
+        from multiprocessing import shared_memory
+        size = SharedState.size(max_positions, max_orders, max_strategies, record_length, record_size)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            layout = np.ndarray((1,), dtype=SharedState.LAYOUT_DTYPE, buffer=stale.buf, offset=8)[0].copy()
+            stale.close()
+            # only a segment left over by a crashed session is taken over, never one of a running trader
+            if layout['magic'] != SharedState.MAGIC:
+                raise FileExistsError(f"{name} exists and is not a shared state segment")
+            if SharedState.alive(int(layout['owner_pid'])):
+                raise FileExistsError(f"shared state {name} is in use by process {int(layout['owner_pid'])}")
+            logger.warning(f"shared state {name} left by process {int(layout['owner_pid'])}, recreate it")
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        layout = np.ndarray((1,), dtype=SharedState.LAYOUT_DTYPE, buffer=shm.buf, offset=8)
+        layout[0] = (SharedState.MAGIC, max_positions, max_orders, max_strategies, record_length, record_size,
+                     os.getpid())
+        logger.info(f"shared state {name}: {size} bytes")
+        return SharedState(shm, True, interval)
+
+    @staticmethod
+    def alive(pid: int) -> bool:
+        if pid <= 0:
+            return False
+        if os.name != 'posix':
+            # windows frees a segment with its last handle, an existing one is held by a live process.
+            # os.kill would terminate the process there
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    @staticmethod
+    def attach(name: str):
+        from multiprocessing import shared_memory
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # python < 3.13 tracks attached segments too and unlinks them when the reader exits
+            shm = shared_memory.SharedMemory(name=name)
+            if os.name == 'posix':
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(shm._name, 'shared_memory')
+        return SharedState(shm, False)
+
+    @staticmethod
+    def from_config(config: dict):
+        # None when sharing is off
+        share = config.get('share', {})
+        if share.get('name', '') == '':
+            return None
+        return SharedState.create(share['name'], share.get('max_positions', 256), share.get('max_orders', 1024),
+                                  share.get('max_strategies', 64), share.get('record_length', 256),
+                                  share.get('record_size', 512), share.get('interval', 0.5))
+
+    # writer
+    def add(self, strategy):
+        # records of the strategy are published from now on
+        self.sources.append(strategy)
+        self.published[strategy.strategy_id] = strategy.records.count
+
+    def encode(self, record) -> bytes:
+        # StrategyData attributes or RingBuffer fields as json
+        if isinstance(record, np.void):
+            record = dict(zip(record.dtype.names, record.tolist()))
+        else:
+            record = vars(record)
+        data = json.dumps(record, default=lambda value: value.tolist() if hasattr(value, 'tolist') else str(value))
+        data = data.encode()
+        if len(data) > self.record_size:
+            if not self.warned:
+                self.warned = True
+                logger.warning(f"strategy record of {len(data)} bytes > [share] record_size = {self.record_size}, "
+                               f"published as truncated")
+            data = json.dumps({'truncated': True}).encode()
+        return data
+
+    def new_records(self) -> list:
+        # (strategy id, timestamp, json) appended since the last publish, at most record_length
+        rows = []
+        for strategy in self.sources:
+            records = strategy.records
+            count = records.count
+            n = min(count - self.published.get(strategy.strategy_id, 0), len(records), len(self.records))
+            self.published[strategy.strategy_id] = count
+            for i in range(-n, 0):
+                try:
+                    record = records[i]
+                except IndexError:
+                    # appended & evicted meanwhile
+                    continue
+                timestamp = record['timestamp'] if isinstance(record, np.void) else record.timestamp
+                if isinstance(timestamp, datetime):
+                    timestamp = timestamp.timestamp()
+                elif isinstance(timestamp, np.datetime64):
+                    timestamp = timestamp.astype('datetime64[ms]').astype(np.int64) / 1000
+                rows.append((strategy.strategy_id, float(timestamp), self.encode(record)))
+        return rows[-len(self.records):]
+
+    def publish(self, trader):
+        # account data comes from the push-maintained caches, copied under the cache lock
+        cache = trader.account_cache
+        with cache.lock:
+            positions = list(cache.positions.values())
+            orders = [order for order in cache.orders.values() if order.order_status in RiskManager.WORKING_STATUS]
+            asset = cache.asset
+        positions = positions[:len(self.positions)]
+        orders = orders[:len(self.orders)]
+        risk = trader.risk_manager
+        market_value = np.zeros(len(risk.stock_ids))
+        for position in positions:
+            i = risk.index.get(position.stock_code)
+            if i is not None:
+                market_value[i] = position.market_value
+        cost, value = risk.membership @ risk.cost, risk.membership @ market_value
+        strategy_ids = range(min(len(cost), len(self.strategies)))
+        records = self.new_records()
+
+        # seqlock: odd while writing, readers retry when it is odd or changed during their copy
+        self.seq[0] += 1
+        header = self.header[0]
+        header['time'] = time.time()
+        if asset is not None:
+            header['cash'], header['frozen_cash'] = asset.cash, asset.frozen_cash
+            header['market_value'], header['total_asset'] = asset.market_value, asset.total_asset
+        header['positions'], header['orders'], header['strategies'] = len(positions), len(orders), len(strategy_ids)
+        for i, position in enumerate(positions):
+            self.positions[i] = (position.stock_code, position.volume, position.can_use_volume,
+                                 position.frozen_volume, position.open_price, position.market_value)
+        for i, order in enumerate(orders):
+            self.orders[i] = (order.order_id, order.stock_code, order.order_type, order.order_status,
+                              order.order_volume, order.traded_volume, order.price, order.traded_price,
+                              order.order_time)
+        for i in strategy_ids:
+            self.strategies[i] = (i, cost[i], value[i], value[i] - cost[i], risk.turnover[i],
+                                  self.published.get(i, 0))
+        for row in records:
+            self.records[self.record_count % len(self.records)] = row
+            self.record_count += 1
+        header['records'] = self.record_count
+        self.seq[0] += 1
+        self.publishes += 1
+
+    def start(self, trader):
+        def loop():
+            while self.running:
+                try:
+                    self.publish(trader)
+                except Exception as e:
+                    logger.error(f"shared state publish failed: {e}")
+                time.sleep(self.interval)
+
+        self.running = True
+        self.thread = threading.Thread(target=loop, name='shared-state', daemon=True)
+        self.thread.start()
+        logger.info(f"publish shared state {self.shm.name} every {self.interval}s")
+
+    # reader
+    def read(self, retries: int = 10000) -> dict:
+        # consistent copy of the segment, None when the writer kept it busy for all retries
+        for _ in range(retries):
+            begin = int(self.seq[0])
+            if begin % 2 == 1:
+                time.sleep(0)
+                continue
+            header = self.header[0].copy()
+            positions = self.positions[:header['positions']].copy()
+            orders = self.orders[:header['orders']].copy()
+            strategies = self.strategies[:header['strategies']].copy()
+            records = self.records.copy()
+            if int(self.seq[0]) != begin:
+                continue
+            total = int(header['records'])
+            if total <= len(records):
+                records = records[:total]
+            else:
+                k = total % len(records)
+                records = np.concatenate([records[k:], records[:k]])
+            return {
+                'seq': begin,
+                'time': float(header['time']),
+                'cash': float(header['cash']),
+                'frozen_cash': float(header['frozen_cash']),
+                'market_value': float(header['market_value']),
+                'total_asset': float(header['total_asset']),
+                'positions': positions,
+                'orders': orders,
+                'strategies': strategies,
+                # oldest first
+                'records': [(int(row['strategy_id']), float(row['timestamp']), json.loads(row['data']))
+                            for row in records],
+            }
+        logger.warning(f"shared state {self.shm.name}: no consistent snapshot after {retries} retries")
+        return None
+
+    def close(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        # views into the buffer must go before the mapping is closed
+        self.seq = self.layout = self.header = self.positions = self.orders = self.strategies = self.records = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
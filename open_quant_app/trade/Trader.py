@@ -1,13 +1,19 @@
 import enum
-from typing import List
-import math
+from typing import List, Tuple, Callable
+from concurrent.futures import Future
+import time
 
-from open_quant_app.manager.PositionManager import PositionManager
-from xtquant.xttrader import XtQuantTrader
+from open_quant_app.manager.RiskManager import RiskManager
 from xtquant.xttype import StockAccount, XtOrder, XtAsset, XtPosition
 from xtquant import xtconstant
-from open_quant_app.trade.CommonTradeCallback import CommonXtQuantTraderCallback
+from open_quant_app.trade.AccountCache import AccountCache
+from open_quant_app.trade.AsyncOrderTracker import AsyncOrderTracker
+from open_quant_app.trade.SharedState import SharedState
 from open_quant_app.backtest.BackTester import BackTester
+from open_quant_app.backtest.FillModel import TickFillModel
+from open_quant_app.utils.AsyncLogger import AsyncLogger
+from open_quant_app.utils.Profiler import Profiler
+from open_quant_app.utils.QuoteRecorder import QuoteRecorder
 
 from loguru import logger
 import numpy as np
@@ -19,21 +25,63 @@ class TradeMode(enum.Enum):
 
 
 class Trader:
-    def __init__(self, config: dict = None, mode: TradeMode = TradeMode.MARKET, cash: float = 100000):
+    def __init__(self, config: dict = None, mode: TradeMode = TradeMode.MARKET, cash: float = 100000,
+                 fill_model: TickFillModel = None, xt_trader=None):
+        # xt_trader: e.g. a SimBroker replaying recorded quotes, XtQuantTrader by default
         self.env_path = config['trade']['env_path']
         self.session_id = config['trade']['session_id']
         self.account_id = config['trade']['account_id']
         self.stock_ids = config['stock']['stock_ids']
         self.mode = mode
+        self.config = config
+        self.cash = cash
+        self.fill_model = fill_model
 
-        self.xt_trader = XtQuantTrader(self.env_path, self.session_id)
+        # broker connection, back tester & trade callback are built on first use, see __getattr__
+        if xt_trader is not None:
+            self.xt_trader = xt_trader
         self.account = StockAccount(self.account_id)
-        self.callback = CommonXtQuantTraderCallback()
-        self.back_tester = BackTester(config, cash)
-        self.position_manager = PositionManager(config)
+        self.account_cache = AccountCache(config['trade'].get('cache_max_age', 3))
+        self.order_tracker = AsyncOrderTracker(config['trade'].get('async_timeout', 10))
+        self.profiler = Profiler.from_config(config)
+        # hot path logging, formatted & written off the order path when [log] async = true
+        self.log = AsyncLogger.from_config(config)
+        # live & simulated order pushes reach the same listeners
+        self.order_listeners: List[Callable] = []
+        self.cancel_error_listeners: List[Callable] = []
+        self.risk_manager = RiskManager(config)
+        # epoch seconds of risk checks, simulated in replay
+        self.clock = time.time
+        # portfolio state for monitoring processes, published from the caches when [share] name is set. the
+        # segment is created by start() in market mode, strategies registered before are added then
+        self.shared_state: SharedState = None
+        self.strategies: list = []
+        # quote recorders of the strategies, flushed & stopped on close
+        self.recorders: List[QuoteRecorder] = []
+
+    def __getattr__(self, name: str):
+        # only called for missing attributes: the component is built once, later reads are plain attribute reads
+        if name == 'xt_trader':
+            # xtquant's trade client is only loaded for the broker connection
+            from xtquant.xttrader import XtQuantTrader
+            value = XtQuantTrader(self.env_path, self.session_id)
+        elif name == 'callback':
+            from open_quant_app.trade.CommonTradeCallback import CommonXtQuantTraderCallback
+            value = CommonXtQuantTraderCallback(self.account_cache, self.order_tracker, self.profiler, self.log,
+                                                self.risk_manager)
+            value.order_listeners = self.order_listeners
+            value.cancel_error_listeners = self.cancel_error_listeners
+        elif name == 'back_tester':
+            value = BackTester(self.config, self.cash, fill_model=self.fill_model)
+            value.order_listeners = self.order_listeners
+        else:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        setattr(self, name, value)
+        return value
 
     def start(self):
         # start trade thread
+        self.xt_trader.register_callback(self.callback)
         self.xt_trader.start()
         connection_result = self.xt_trader.connect()
         if connection_result != 0:
@@ -46,6 +94,18 @@ class Trader:
             logger.error(f"subscribe to account id = {self.account_id} failed !")
         else:
             logger.success(f"subscribe to account id = {self.account_id} success !")
+        if self.mode == TradeMode.MARKET and self.shared_state is None:
+            self.shared_state = SharedState.from_config(self.config)
+            if self.shared_state is not None:
+                for strategy in self.strategies:
+                    self.shared_state.add(strategy)
+                self.shared_state.start(self)
+
+    def register(self, strategy):
+        # strategies trading through this trader, their records are published with the shared state
+        self.strategies.append(strategy)
+        if self.shared_state is not None:
+            self.shared_state.add(strategy)
 
     def info(self):
         logger.info("begin checking basic status")
@@ -66,23 +126,92 @@ class Trader:
                     price_type: int = xtconstant.FIX_PRICE, strategy_name: str = '', comment: str = '') -> int:
         if volume == 0:
             return 0
+        start = self.profiler.start()
         order_id = -1
         if self.mode == TradeMode.MARKET:
-            if order_type == xtconstant.STOCK_BUY and self.can_buy(volume, price, strategy_id):
-                order_id = self.xt_trader.order_stock(self.account, stock_id, order_type, volume
-                                                      , price_type, price, strategy_name, comment)
-            elif order_type == xtconstant.STOCK_SELL and self.can_sell(stock_id, volume, strategy_id):
+            if (order_type == xtconstant.STOCK_BUY and self.can_buy(volume, price, strategy_id, stock_id)) or (
+                    order_type == xtconstant.STOCK_SELL and self.can_sell(stock_id, volume, strategy_id, price)):
+                broker_start = self.profiler.start()
                 order_id = self.xt_trader.order_stock(self.account, stock_id, order_type, volume
                                                       , price_type, price, strategy_name, comment)
+                self.profiler.stop('broker_order', broker_start)
+            if order_id > 0:
+                # the cached account catches up through the order push, or after max_age
+                self.risk_manager.on_submit(stock_id, order_type, volume, price, strategy_id, self.clock(), order_id)
         elif self.mode == TradeMode.BACKTEST:
             order_id = self.back_tester.order_stock(stock_id, order_type, volume, price, strategy_id)
+        self.profiler.stop('order_stock', start)
         if order_id != -1:
-            logger.success(
-                f"trading: {'buy' if order_type == xtconstant.STOCK_BUY else 'sell'} {stock_id} volume = {volume}"
-                f", price = {price}")
+            self.log.success("trading: {} {} volume = {}, price = {}",
+                             'buy' if order_type == xtconstant.STOCK_BUY else 'sell', stock_id, volume, price)
         return order_id
 
+    def order_stock_async(self, stock_id: str, order_type: int, volume: int, price: float, strategy_id: int,
+                          price_type: int = xtconstant.FIX_PRICE, strategy_name: str = '',
+                          comment: str = '') -> Future:
+        return self.order_stocks_async([(stock_id, order_type, volume, price)], strategy_id, price_type,
+                                       strategy_name, comment)[0]
+
+    def order_stocks_async(self, orders: List[Tuple[str, int, int, float]], strategy_id: int,
+                           price_type: int = xtconstant.FIX_PRICE, strategy_name: str = '',
+                           comment: str = '') -> List[Future]:
+        # orders: (stock_id, order_type, volume, price), futures resolve to order id, -1 if the check fails
+        # run every pre-trade check first, then send all legs in one burst to minimize leg-to-leg skew
+        start = self.profiler.start()
+        if self.mode == TradeMode.MARKET and len(orders) != 0:
+            stock_ids, order_types, volumes, prices = zip(*orders)
+            mask, max_volumes = self.check_orders(list(stock_ids), order_types, volumes, prices,
+                                                  [strategy_id] * len(orders))
+            passed = [volumes[i] != 0 and bool(mask[i]) for i in range(len(orders))]
+            for i in range(len(orders)):
+                if volumes[i] != 0 and not passed[i]:
+                    self.log.warning("id = {}: risk check failed for {} volume = {}, price = {}, max volume = {}",
+                                     strategy_id, stock_ids[i], volumes[i], prices[i], max_volumes[i])
+        else:
+            passed = [volume != 0 for stock_id, order_type, volume, price in orders]
+        seqs = []
+        for i in range(len(orders)):
+            stock_id, order_type, volume, price = orders[i]
+            if not passed[i]:
+                seqs.append(-1)
+            elif self.mode == TradeMode.MARKET:
+                broker_start = self.profiler.start()
+                seqs.append(self.xt_trader.order_stock_async(self.account, stock_id, order_type, volume, price_type,
+                                                             price, strategy_name, comment))
+                self.profiler.stop('broker_order_async', broker_start)
+                if seqs[i] > 0:
+                    self.risk_manager.on_submit(stock_id, order_type, volume, price, strategy_id, self.clock())
+            else:
+                seqs.append(self.back_tester.order_stock(stock_id, order_type, volume, price, strategy_id))
+        self.profiler.stop('order_batch', start)
+        futures = []
+        for i in range(len(orders)):
+            stock_id, order_type, volume, price = orders[i]
+            if self.mode == TradeMode.MARKET and seqs[i] > 0:
+                futures.append(self.order_tracker.register(seqs[i]))
+                futures[i].add_done_callback(lambda future, order=orders[i]: self.on_async_order(future, order,
+                                                                                                 strategy_id))
+            else:
+                future = Future()
+                future.set_result(0 if volume == 0 else seqs[i])
+                futures.append(future)
+            if passed[i] and seqs[i] != -1:
+                self.log.success("trading async: {} {} volume = {}, price = {}",
+                                 'buy' if order_type == xtconstant.STOCK_BUY else 'sell', stock_id, volume, price)
+        return futures
+
+    def on_async_order(self, future: Future, order: Tuple[str, int, int, float], strategy_id: int):
+        # the order id is known once the response is pushed, a failed order releases its working volume
+        stock_id, order_type, volume, price = order
+        order_id = future.result() if future.exception() is None else -1
+        if order_id > 0:
+            self.risk_manager.track(order_id, strategy_id, price)
+        else:
+            self.risk_manager.on_cancel(stock_id, order_type, volume, price)
+
     def cancel_order_stock(self, order_id: int) -> int:
+        if self.mode == TradeMode.BACKTEST:
+            return self.back_tester.cancel_order_stock(order_id)
         ret = self.xt_trader.cancel_order_stock(self.account, order_id)
         if ret != 0:
             print(f"Err: cancel order id = {order_id} failed !")
@@ -108,65 +237,71 @@ class Trader:
         asset = self.xt_trader.query_stock_asset(self.account)
         return asset
 
+    def refresh_cache(self):
+        positions, asset, orders = self.query_positions(), self.query_stock_asset(), self.query_orders()
+        self.account_cache.load(positions, asset, orders)
+        self.risk_manager.load(positions, asset, orders)
+
+    def cached(self) -> AccountCache:
+        if self.account_cache.is_stale():
+            self.refresh_cache()
+        return self.account_cache
+
     def close(self):
-        self.xt_trader.unsubscribe(self.account)
-        self.xt_trader.stop()
-
-    def can_sell(self, stock_id: str, volume: int, strategy_id: int) -> bool:
-        position = self.query_position_by_stock(stock_id)
-        if position is None:
-            logger.warning(f"you have 0 position for stock {stock_id}, cannot sell !")
-            return False
-        elif volume > position.can_use_volume:
-            logger.warning(f"position available volume = {position.can_use_volume} < sell volume {volume}, cancel !")
-            return False
-        else:
-            return True
+        if 'xt_trader' in self.__dict__:
+            self.xt_trader.unsubscribe(self.account)
+            self.xt_trader.stop()
+        self.profiler.close()
+        for recorder in self.recorders:
+            recorder.close()
+        if self.shared_state is not None:
+            self.shared_state.close()
+        if isinstance(self.log, AsyncLogger):
+            self.log.close()
 
-    def max_can_sell(self, stock_id: str, strategy_id: int, volume: int) -> int:
-        can_use_vol = self.query_position_by_stock(stock_id).can_use_volume
-        if self.query_position_by_stock(stock_id).can_use_volume < volume:
-            logger.warning(f"cannot sell {volume}, choose max sell volume: {can_use_vol}")
-            return can_use_vol
-        else:
-            return volume
-
-    def can_buy(self, volume: int, price: float, strategy_id: int) -> bool:
-        # query position
-        position_data = []
-        stock_id_tuple = self.stock_ids[strategy_id]
-        for stock_id in stock_id_tuple:
-            position_data.append(self.query_position_by_stock(stock_id))
-        # query assets
-        total_assets = self.query_stock_asset().total_asset
-        return not self.position_manager.is_position_limit(position_data, strategy_id, volume, price, total_assets)
-
-    def max_can_buy(self, volume, price, strategy_id: int) -> int:
-        # query position
-        stock_id_tuple = self.stock_ids[strategy_id]
-        position_val = 0.0
-        for stock_id in stock_id_tuple:
-            position = self.query_position_by_stock(stock_id)
-            if position is None:
-                continue
-            # use open_price, because avg price may be 0
-            position_val += (position.can_use_volume + position.frozen_volume) * position.open_price
-        # query order
-        order_val = 0.0
-        for order in self.query_orders():
-            if order.stock_code in stock_id_tuple:
-                order_val += order.order_volume * order.price
-        # query asset
-        if self.query_stock_asset() is None:
-            return 0
-        total_asset = self.query_stock_asset().total_asset
-        # check
-        if price == 0 or volume == 0 or np.isnan((total_asset - position_val - order_val) / price / 10):
-            return 0
-        # calc max
-        can_buy_vol = max(math.floor((total_asset - position_val - order_val) / price / 10), 0)
-        if volume > can_buy_vol:
-            logger.critical(f"id = {strategy_id}: cannot buy {volume}, choose max buy volume: {can_buy_vol}")
-            return can_buy_vol
+    def check_orders(self, stock_ids: List[str], order_types: List[int], volumes: List[int], prices: List[float],
+                     strategy_ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        # (pass mask, max allowed volumes) of a batch of orders, checked in one vectorized call
+        start = self.profiler.start()
+        if self.mode == TradeMode.BACKTEST:
+            result = self.back_tester.check_orders(stock_ids, order_types, volumes, prices, strategy_ids)
         else:
-            return volume
+            # refreshes the risk state together with the cache
+            self.cached()
+            result = self.risk_manager.check(stock_ids, order_types, volumes, prices, strategy_ids, self.clock())
+            if self.account_cache.get_asset() is None:
+                # no asset from QMT, cash is unknown
+                buys = np.asarray(order_types) == xtconstant.STOCK_BUY
+                if buys.any():
+                    logger.error("asset query returned nothing, reject buy orders")
+                    result[0][buys], result[1][buys] = False, 0
+        self.profiler.stop('risk_check', start)
+        return result
+
+    def can_sell(self, stock_id: str, volume: int, strategy_id: int, price: float = 0.0) -> bool:
+        # price: of the sell order, 0 = unknown, the turnover limit then uses the average cost
+        mask, max_volumes = self.check_orders([stock_id], [xtconstant.STOCK_SELL], [volume], [price], [strategy_id])
+        if not mask[0]:
+            self.log.warning("position available volume = {} < sell volume {}, cancel !", max_volumes[0], volume)
+        return bool(mask[0])
+
+    def max_can_sell(self, stock_id: str, strategy_id: int, volume: int, price: float = 0.0) -> int:
+        mask, max_volumes = self.check_orders([stock_id], [xtconstant.STOCK_SELL], [volume], [price], [strategy_id])
+        if not mask[0]:
+            self.log.warning("cannot sell {}, choose max sell volume: {}", volume, max_volumes[0])
+            return int(max_volumes[0])
+        return volume
+
+    def can_buy(self, volume: int, price: float, strategy_id: int, stock_id: str = None) -> bool:
+        mask, max_volumes = self.check_orders([stock_id], [xtconstant.STOCK_BUY], [volume], [price], [strategy_id])
+        if not mask[0]:
+            self.log.warning("id = {}: cannot buy {} volume = {}, price = {}, max buy volume = {}", strategy_id,
+                             stock_id, volume, price, max_volumes[0])
+        return bool(mask[0])
+
+    def max_can_buy(self, volume, price, strategy_id: int, stock_id: str = None) -> int:
+        mask, max_volumes = self.check_orders([stock_id], [xtconstant.STOCK_BUY], [volume], [price], [strategy_id])
+        if not mask[0]:
+            self.log.critical("id = {}: cannot buy {}, choose max buy volume: {}", strategy_id, volume, max_volumes[0])
+            return int(max_volumes[0])
+        return volume
@@ -0,0 +1,176 @@
+from collections import deque
+import json
+import threading
+import time
+
+from loguru import logger
+
+
+class AsyncLogger:
+    # drop-in for the loguru calls on the hot path: logger.info("price = {}, volume = {}", price, volume)
+    # the caller only appends (time, level, thread, template, args) to a bounded queue, a background writer
+    # formats & writes in batches. like loguru, expensive args can be passed as zero-argument callables through
+    # opt(lazy=True), they are only called by the writer and never below the level
+    LEVELS = {'TRACE': 5, 'DEBUG': 10, 'INFO': 20, 'SUCCESS': 25, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+
+    def __init__(self, path: str = '', level: str = 'INFO', max_size: int = 65536, batch_size: int = 512,
+                 flush_interval: float = 0.05):
+        # path = '': records are forwarded to loguru sinks from the writer thread,
+        # otherwise written to path as json lines
+        self.path: str = path
+        self.level: int = AsyncLogger.LEVELS[level]
+        self.max_size: int = max_size
+        self.batch_size: int = batch_size
+        self.flush_interval: float = flush_interval
+        self.queue: deque = deque()
+        self.received: int = 0
+        self.written: int = 0
+        self.dropped: int = 0
+        # records lost by failed writes, counted by the writer thread only
+        self.failed: int = 0
+        self.max_depth: int = 0
+        self.running: bool = True
+        self.wakeup = threading.Event()
+        self.writer = threading.Thread(target=self.write_loop, name='async-logger', daemon=True)
+        self.writer.start()
+
+    @staticmethod
+    def from_config(config: dict):
+        # the loguru logger itself when async logging is off
+        log_config = config.get('log', {})
+        if not log_config.get('async', False):
+            return logger
+        return AsyncLogger(log_config.get('path', ''), log_config.get('level', 'INFO'),
+                           log_config.get('queue_size', 65536), log_config.get('batch_size', 512),
+                           log_config.get('flush_interval', 0.05))
+
+    def opt(self, lazy: bool = False):
+        return LazyLogger(self) if lazy else self
+
+    def log(self, level: str, message: str, *args, **kwargs):
+        self.put(level, message, args, kwargs, False)
+
+    def put(self, level: str, message: str, args: tuple, kwargs: dict, lazy: bool):
+        if AsyncLogger.LEVELS[level] < self.level:
+            return
+        self.received += 1
+        depth = len(self.queue)
+        if depth >= self.max_size:
+            self.dropped += 1
+            return
+        if depth >= self.max_depth:
+            self.max_depth = depth + 1
+        self.queue.append((time.time(), level, threading.current_thread().name, message, args, kwargs, lazy))
+
+    def trace(self, message: str, *args, **kwargs):
+        self.log('TRACE', message, *args, **kwargs)
+
+    def debug(self, message: str, *args, **kwargs):
+        self.log('DEBUG', message, *args, **kwargs)
+
+    def info(self, message: str, *args, **kwargs):
+        self.log('INFO', message, *args, **kwargs)
+
+    def success(self, message: str, *args, **kwargs):
+        self.log('SUCCESS', message, *args, **kwargs)
+
+    def warning(self, message: str, *args, **kwargs):
+        self.log('WARNING', message, *args, **kwargs)
+
+    def error(self, message: str, *args, **kwargs):
+        self.log('ERROR', message, *args, **kwargs)
+
+    def critical(self, message: str, *args, **kwargs):
+        self.log('CRITICAL', message, *args, **kwargs)
+
+    @staticmethod
+    def format(message: str, args: tuple, kwargs: dict, lazy: bool) -> str:
+        if lazy:
+            args = tuple(arg() for arg in args)
+            kwargs = {key: value() for key, value in kwargs.items()}
+        if len(args) == 0 and len(kwargs) == 0:
+            return str(message)
+        message = str(message)
+        try:
+            if '{' in message:
+                return message.format(*args, **kwargs)
+        except (IndexError, KeyError, ValueError):
+            pass
+        # a message without matching placeholders keeps every argument
+        return ' '.join(str(value) for value in (message,) + args + tuple(kwargs.values()))
+
+    def write_batch(self, batch: list):
+        if self.path == '':
+            for timestamp, level, thread_name, message, args, kwargs, lazy in batch:
+                logger.log(level, "[{}] {}", thread_name, self.format(message, args, kwargs, lazy))
+        else:
+            # structured records: the template is kept for grouping, the formatted message for reading
+            lines = [json.dumps({'time': timestamp, 'level': level, 'thread': thread_name, 'template': str(message),
+                                 'message': self.format(message, args, kwargs, lazy)}, ensure_ascii=False)
+                     for timestamp, level, thread_name, message, args, kwargs, lazy in batch]
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        self.written += len(batch)
+
+    def drain(self):
+        while len(self.queue) != 0:
+            batch = []
+            while len(self.queue) != 0 and len(batch) < self.batch_size:
+                batch.append(self.queue.popleft())
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"async logger write failed, {len(batch)} records dropped: {e}")
+
+    def write_loop(self):
+        while self.running:
+            # poll instead of signaling per record, callers never touch a lock
+            self.wakeup.wait(self.flush_interval)
+            self.drain()
+        self.drain()
+
+    def stats(self) -> dict:
+        return {
+            'depth': len(self.queue),
+            'max_depth': self.max_depth,
+            'received': self.received,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+        }
+
+    def close(self):
+        self.running = False
+        self.wakeup.set()
+        self.writer.join()
+
+
+class LazyLogger:
+    # AsyncLogger.opt(lazy=True), args are zero-argument callables
+    def __init__(self, async_logger: AsyncLogger):
+        self.async_logger: AsyncLogger = async_logger
+
+    def log(self, level: str, message: str, *args, **kwargs):
+        self.async_logger.put(level, message, args, kwargs, True)
+
+    def trace(self, message: str, *args, **kwargs):
+        self.log('TRACE', message, *args, **kwargs)
+
+    def debug(self, message: str, *args, **kwargs):
+        self.log('DEBUG', message, *args, **kwargs)
+
+    def info(self, message: str, *args, **kwargs):
+        self.log('INFO', message, *args, **kwargs)
+
+    def success(self, message: str, *args, **kwargs):
+        self.log('SUCCESS', message, *args, **kwargs)
+
+    def warning(self, message: str, *args, **kwargs):
+        self.log('WARNING', message, *args, **kwargs)
+
+    def error(self, message: str, *args, **kwargs):
+        self.log('ERROR', message, *args, **kwargs)
+
+    def critical(self, message: str, *args, **kwargs):
+        self.log('CRITICAL', message, *args, **kwargs)
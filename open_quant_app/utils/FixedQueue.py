@@ -4,6 +4,13 @@ from collections import deque
 class FixedQueue(deque):
     def __init__(self, size):
         super().__init__(maxlen=size)
+        # total number of appended items, like RingBuffer.count
+        self.count: int = 0
 
     def append(self, item):
         super().append(item)
+        self.count += 1
+
+    def __reduce__(self):
+        # deque pickles as (iterable, maxlen), rebuild with this constructor and append the items
+        return self.__class__, (self.maxlen,), None, iter(self)
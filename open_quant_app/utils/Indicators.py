@@ -0,0 +1,302 @@
+import math
+
+import numpy as np
+
+
+class RollingSums:
+    # ring buffer of the last `window` values of several channels and their running sums
+    def __init__(self, window: int, channels: int = 1):
+        self.window: int = window
+        self.buffer = np.zeros((window, channels))
+        self.sums = [0.0] * channels
+        self.count: int = 0
+
+    def full(self) -> bool:
+        return self.count >= self.window
+
+    def push(self, *values: float):
+        i = self.count % self.window
+        row = self.buffer[i]
+        if self.count >= self.window:
+            for c in range(len(values)):
+                self.sums[c] += values[c] - row[c]
+        else:
+            for c in range(len(values)):
+                self.sums[c] += values[c]
+        row[:] = values
+        self.count += 1
+        # recompute once per window to stop floating point drift, amortized O(1)
+        if self.count % self.window == 0:
+            self.sums = self.buffer.sum(axis=0).tolist()
+
+    @staticmethod
+    def batch(values: np.ndarray, window: int) -> np.ndarray:
+        # rolling sums along axis 0, NaN until the window is full
+        values = np.asarray(values, dtype=np.float64)
+        result = np.full(values.shape, np.nan)
+        if len(values) < window:
+            return result
+        csum = np.cumsum(values, axis=0)
+        result[window - 1] = csum[window - 1]
+        result[window:] = csum[window:] - csum[:-window]
+        return result
+
+
+class RollingMean:
+    def __init__(self, window: int):
+        self.sums = RollingSums(window)
+        self.value: float = math.nan
+
+    def update(self, x: float) -> float:
+        self.sums.push(x)
+        if self.sums.full():
+            self.value = self.sums.sums[0] / self.sums.window
+        return self.value
+
+    @staticmethod
+    def batch(x: np.ndarray, window: int) -> np.ndarray:
+        return RollingSums.batch(x, window) / window
+
+
+class RollingVariance:
+    def __init__(self, window: int, ddof: int = 1):
+        self.sums = RollingSums(window, 2)
+        self.ddof: int = ddof
+        self.mean: float = math.nan
+        self.value: float = math.nan
+
+    def update(self, x: float) -> float:
+        self.sums.push(x, x * x)
+        if self.sums.full():
+            n = self.sums.window
+            s, ss = self.sums.sums
+            self.mean = s / n
+            self.value = max(ss - s * s / n, 0.0) / (n - self.ddof)
+        return self.value
+
+    @staticmethod
+    def batch(x: np.ndarray, window: int, ddof: int = 1) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        # variance is shift invariant, centering keeps the cumulative sums small
+        x = x - x[0] if len(x) != 0 else x
+        s = RollingSums.batch(x, window)
+        ss = RollingSums.batch(x * x, window)
+        return np.maximum(ss - s * s / window, 0.0) / (window - ddof)
+
+
+class RollingZScore:
+    def __init__(self, window: int, ddof: int = 1):
+        self.variance = RollingVariance(window, ddof)
+        self.value: float = math.nan
+
+    def update(self, x: float) -> float:
+        variance = self.variance.update(x)
+        if not math.isnan(variance):
+            self.value = (x - self.variance.mean) / math.sqrt(variance) if variance > 0 else 0.0
+        return self.value
+
+    @staticmethod
+    def batch(x: np.ndarray, window: int, ddof: int = 1) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        std = np.sqrt(RollingVariance.batch(x, window, ddof))
+        mean = RollingMean.batch(x, window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(std > 0, (x - mean) / std, np.where(np.isnan(std), np.nan, 0.0))
+
+
+class EMA:
+    def __init__(self, span: float = None, alpha: float = None):
+        self.alpha: float = alpha if alpha is not None else 2 / (span + 1)
+        self.value: float = math.nan
+
+    def update(self, x: float) -> float:
+        if math.isnan(self.value):
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+    @staticmethod
+    def batch(x: np.ndarray, span: float = None, alpha: float = None) -> np.ndarray:
+        # closed form y_t = d^t * (y_0 + a * sum_{0<j<=t} x_j / d^j), evaluated in chunks so d^-j stays finite
+        alpha = alpha if alpha is not None else 2 / (span + 1)
+        x = np.asarray(x, dtype=np.float64)
+        result = np.empty(len(x))
+        if len(x) == 0:
+            return result
+        decay = 1 - alpha
+        if decay == 0:
+            return x.copy()
+        chunk = max(int(150 / -math.log10(decay)), 1)
+        prev = x[0]
+        result[0] = prev
+        for begin in range(1, len(x), chunk):
+            values = x[begin:begin + chunk]
+            powers = decay ** np.arange(1, len(values) + 1)
+            result[begin:begin + len(values)] = powers * (prev + alpha * np.cumsum(values / powers))
+            prev = result[begin + len(values) - 1]
+        return result
+
+
+class RollingExtreme:
+    # monotonic deque over preallocated ring arrays, amortized O(1) per update
+    def __init__(self, window: int, is_max: bool = True):
+        self.window: int = window
+        self.is_max: bool = is_max
+        self.values = np.zeros(window)
+        self.indexes = np.zeros(window, dtype=np.int64)
+        self.head: int = 0
+        self.size: int = 0
+        self.count: int = 0
+        self.value: float = math.nan
+
+    def update(self, x: float) -> float:
+        window = self.window
+        # pop expired
+        if self.size != 0 and self.indexes[self.head] <= self.count - window:
+            self.head = (self.head + 1) % window
+            self.size -= 1
+        # pop dominated from the tail
+        while self.size != 0:
+            tail = (self.head + self.size - 1) % window
+            last = self.values[tail]
+            if (last <= x) if self.is_max else (last >= x):
+                self.size -= 1
+            else:
+                break
+        tail = (self.head + self.size) % window
+        self.values[tail] = x
+        self.indexes[tail] = self.count
+        self.size += 1
+        self.count += 1
+        if self.count >= window:
+            self.value = float(self.values[self.head])
+        return self.value
+
+    @staticmethod
+    def batch(x: np.ndarray, window: int, is_max: bool = True) -> np.ndarray:
+        # van Herk/Gil-Werman: block prefix & suffix extremes, O(n) for any window
+        x = np.asarray(x, dtype=np.float64)
+        n = len(x)
+        result = np.full(n, np.nan)
+        if n < window:
+            return result
+        op = np.maximum if is_max else np.minimum
+        blocks = -(-n // window)
+        padded = np.full(blocks * window, -np.inf if is_max else np.inf)
+        padded[:n] = x
+        padded = padded.reshape(blocks, window)
+        prefix = op.accumulate(padded, axis=1).ravel()
+        suffix = op.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+        starts = np.arange(n - window + 1)
+        result[window - 1:] = op(suffix[starts], prefix[starts + window - 1])
+        return result
+
+
+class RollingMax(RollingExtreme):
+    def __init__(self, window: int):
+        super().__init__(window, True)
+
+    @staticmethod
+    def batch(x: np.ndarray, window: int) -> np.ndarray:
+        return RollingExtreme.batch(x, window, True)
+
+
+class RollingMin(RollingExtreme):
+    def __init__(self, window: int):
+        super().__init__(window, False)
+
+    @staticmethod
+    def batch(x: np.ndarray, window: int) -> np.ndarray:
+        return RollingExtreme.batch(x, window, False)
+
+
+class VWAP:
+    # window = None: cumulative (session) vwap
+    def __init__(self, window: int = None):
+        self.sums = RollingSums(window, 2) if window is not None else None
+        self.amount: float = 0.0
+        self.volume: float = 0.0
+        self.value: float = math.nan
+
+    def update(self, price: float, volume: float) -> float:
+        if self.sums is None:
+            self.amount += price * volume
+            self.volume += volume
+        else:
+            self.sums.push(price * volume, volume)
+            if not self.sums.full():
+                return self.value
+            self.amount, self.volume = self.sums.sums
+        if self.volume > 0:
+            self.value = self.amount / self.volume
+        return self.value
+
+    @staticmethod
+    def batch(price: np.ndarray, volume: np.ndarray, window: int = None) -> np.ndarray:
+        price = np.asarray(price, dtype=np.float64)
+        volume = np.asarray(volume, dtype=np.float64)
+        if window is None:
+            amount, total = np.cumsum(price * volume), np.cumsum(volume)
+        else:
+            amount, total = RollingSums.batch(price * volume, window), RollingSums.batch(volume, window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(total > 0, amount / total, np.nan)
+
+
+class RollingCorrelation:
+    def __init__(self, window: int):
+        self.sums = RollingSums(window, 5)
+        self.beta: float = math.nan
+        self.value: float = math.nan
+
+    def update(self, x: float, y: float) -> float:
+        self.sums.push(x, y, x * x, y * y, x * y)
+        if self.sums.full():
+            correlation, beta = RollingCorrelation.from_sums(self.sums.window, *self.sums.sums)
+            self.value, self.beta = float(correlation), float(beta)
+        return self.value
+
+    @staticmethod
+    def from_sums(n, sx, sy, sxx, syy, sxy):
+        cov = np.float64(sxy - sx * sy / n)
+        var_x = sxx - sx * sx / n
+        var_y = np.float64(syy - sy * sy / n)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = cov / np.sqrt(var_x * var_y)
+            beta = cov / var_y
+        return correlation, beta
+
+    @staticmethod
+    def batch(x: np.ndarray, y: np.ndarray, window: int) -> np.ndarray:
+        return RollingCorrelation.batch_with_beta(x, y, window)[0]
+
+    @staticmethod
+    def batch_with_beta(x: np.ndarray, y: np.ndarray, window: int):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        # correlation & beta are shift invariant, centering keeps the cumulative sums small
+        cx = x - x[0] if len(x) != 0 else x
+        cy = y - y[0] if len(y) != 0 else y
+        sums = [RollingSums.batch(values, window) for values in (cx, cy, cx * cx, cy * cy, cx * cy)]
+        return RollingCorrelation.from_sums(window, *sums)
+
+
+class RollingSpread:
+    # spread = x - beta * y, beta is the rolling OLS hedge ratio of x on y
+    def __init__(self, window: int):
+        self.correlation = RollingCorrelation(window)
+        self.value: float = math.nan
+
+    def update(self, x: float, y: float) -> float:
+        self.correlation.update(x, y)
+        if not math.isnan(self.correlation.beta):
+            self.value = x - self.correlation.beta * y
+        return self.value
+
+    @staticmethod
+    def batch(x: np.ndarray, y: np.ndarray, window: int) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        beta = RollingCorrelation.batch_with_beta(x, y, window)[1]
+        return x - beta * y
@@ -0,0 +1,156 @@
+from typing import Dict, List, Tuple
+import os
+import threading
+import time
+
+from loguru import logger
+import numpy as np
+
+
+class StageBuffer:
+    # ring of recent span durations (ns) of one stage, written by a single thread only
+    def __init__(self, size: int):
+        self.durations = np.zeros(size, dtype=np.int64)
+        self.count: int = 0
+        self.total: int = 0
+        self.max: int = 0
+
+    def record(self, duration: int):
+        self.durations[self.count % len(self.durations)] = duration
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+
+class Profiler:
+    # monotonic spans around the trade path stages, e.g.
+    #   start = profiler.start()
+    #   ...
+    #   profiler.stop('order_stock', start)
+    # disabled: start() returns 0 and stop() returns at once
+    def __init__(self, enabled: bool = False, buffer_size: int = 4096):
+        self.enabled: bool = enabled
+        self.buffer_size: int = buffer_size
+        self.local = threading.local()
+        # (thread name, stage, buffer) of every thread, appended once per new (thread, stage)
+        self.buffers: List[Tuple[str, str, StageBuffer]] = []
+        self.lock = threading.Lock()
+        self.exporting: bool = False
+        self.server = None
+
+    @staticmethod
+    def from_config(config: dict):
+        profiler_config = config.get('profiler', {})
+        profiler = Profiler(profiler_config.get('enabled', False), profiler_config.get('buffer_size', 4096))
+        if profiler.enabled:
+            if profiler_config.get('export_path', '') != '':
+                profiler.start_export(profiler_config['export_path'], profiler_config.get('export_interval', 10))
+            if profiler_config.get('port', 0) != 0:
+                profiler.serve(profiler_config['port'])
+        return profiler
+
+    def start(self) -> int:
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def stop(self, stage: str, start: int):
+        if start == 0:
+            return
+        self.record(stage, time.perf_counter_ns() - start)
+
+    def record(self, stage: str, duration: int):
+        buffers = getattr(self.local, 'buffers', None)
+        if buffers is None:
+            buffers = self.local.buffers = {}
+        buffer = buffers.get(stage)
+        if buffer is None:
+            buffer = buffers[stage] = StageBuffer(self.buffer_size)
+            with self.lock:
+                self.buffers.append((threading.current_thread().name, stage, buffer))
+        buffer.record(duration)
+
+    def stats(self) -> Dict[str, dict]:
+        # merge the buffers of all threads per stage, reads race with writers and may miss the latest spans
+        with self.lock:
+            buffers = list(self.buffers)
+        stages: Dict[str, List[StageBuffer]] = {}
+        for thread_name, stage, buffer in buffers:
+            stages.setdefault(stage, []).append(buffer)
+        result = {}
+        for stage, stage_buffers in stages.items():
+            durations = np.concatenate([buffer.durations[:min(buffer.count, len(buffer.durations))]
+                                        for buffer in stage_buffers])
+            if len(durations) == 0:
+                continue
+            p50, p99 = np.percentile(durations, [50, 99])
+            result[stage] = {
+                'count': sum(buffer.count for buffer in stage_buffers),
+                'sum_ms': sum(buffer.total for buffer in stage_buffers) / 1e6,
+                'p50_ms': float(p50) / 1e6,
+                'p99_ms': float(p99) / 1e6,
+                'max_ms': max(buffer.max for buffer in stage_buffers) / 1e6,
+            }
+        return result
+
+    def export_text(self) -> str:
+        # prometheus text exposition format, p50 & p99 over the recent spans, max over the whole run
+        lines = ['# TYPE open_quant_stage_latency_seconds summary']
+        stats = self.stats()
+        for stage, stage_stats in stats.items():
+            lines.append(f'open_quant_stage_latency_seconds{{stage="{stage}",quantile="0.5"}} '
+                         f'{stage_stats["p50_ms"] / 1e3:.9f}')
+            lines.append(f'open_quant_stage_latency_seconds{{stage="{stage}",quantile="0.99"}} '
+                         f'{stage_stats["p99_ms"] / 1e3:.9f}')
+            lines.append(f'open_quant_stage_latency_seconds_sum{{stage="{stage}"}} {stage_stats["sum_ms"] / 1e3:.9f}')
+            lines.append(f'open_quant_stage_latency_seconds_count{{stage="{stage}"}} {stage_stats["count"]}')
+        lines.append('# TYPE open_quant_stage_latency_max_seconds gauge')
+        for stage, stage_stats in stats.items():
+            lines.append(f'open_quant_stage_latency_max_seconds{{stage="{stage}"}} {stage_stats["max_ms"] / 1e3:.9f}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        # replace atomically, e.g. for the node exporter textfile collector
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(self.export_text())
+        os.replace(temp_path, path)
+
+    def start_export(self, path: str, interval: float = 10):
+        def loop():
+            while self.exporting:
+                time.sleep(interval)
+                try:
+                    self.write(path)
+                except OSError as e:
+                    logger.error(f"latency export to {path} failed: {e}")
+
+        self.exporting = True
+        threading.Thread(target=loop, name='profiler-export', daemon=True).start()
+        logger.info(f"export latency stats to {path} every {interval}s")
+
+    def serve(self, port: int):
+        # http.server (& email, asyncio...) costs ~30 ms of import, only paid when the endpoint is on
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        profiler = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = profiler.export_text().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+        threading.Thread(target=self.server.serve_forever, name='profiler-http', daemon=True).start()
+        logger.info(f"serve latency stats on http://127.0.0.1:{port}/metrics")
+
+    def close(self):
+        self.exporting = False
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
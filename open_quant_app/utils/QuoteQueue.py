@@ -0,0 +1,78 @@
+from typing import Dict, Tuple
+import threading
+import time
+
+from open_quant_app.utils.Profiler import Profiler
+
+import numpy as np
+
+
+class QuoteQueue:
+    def __init__(self, max_size: int = 1024, latency_length: int = 4096):
+        self.max_size: int = max_size
+        self.condition = threading.Condition()
+        # (stock id, period) -> (latest quote, arrival time in ns of the oldest unprocessed quote), a tick never
+        # replaces a bar of the same stock
+        self.pending: Dict[Tuple[str, str], Tuple[object, int]] = {}
+        self.received: int = 0
+        self.coalesced: int = 0
+        self.dropped: int = 0
+        self.max_depth: int = 0
+        # ring of recent tick-to-decision latencies in ns
+        self.latencies = np.zeros(latency_length, dtype=np.int64)
+        self.latency_count: int = 0
+
+    def put(self, data: dict, period: str = 'tick'):
+        # period: of the subscription the payload came from
+        now = time.perf_counter_ns()
+        with self.condition:
+            for stock_id, quote in data.items():
+                self.received += 1
+                key = (stock_id, period)
+                if key in self.pending:
+                    # keep only the latest snapshot, latency is measured from the first unprocessed one
+                    self.pending[key] = (quote, self.pending[key][1])
+                    self.coalesced += 1
+                elif len(self.pending) >= self.max_size:
+                    self.dropped += 1
+                else:
+                    self.pending[key] = (quote, now)
+            self.max_depth = max(self.max_depth, len(self.pending))
+            self.condition.notify()
+
+    def get(self, timeout: float = None) -> Dict[Tuple[str, str], Tuple[object, int]]:
+        with self.condition:
+            if len(self.pending) == 0:
+                self.condition.wait(timeout)
+            batch = self.pending
+            self.pending = {}
+        return batch
+
+    def depth(self) -> int:
+        return len(self.pending)
+
+    def record_latency(self, batch: Dict[Tuple[str, str], Tuple[object, int]], profiler: Profiler = None):
+        now = time.perf_counter_ns()
+        for quote, arrival in batch.values():
+            self.latencies[self.latency_count % len(self.latencies)] = now - arrival
+            self.latency_count += 1
+            if profiler is not None and profiler.enabled:
+                profiler.record('tick_to_decision', now - arrival)
+
+    def stats(self) -> dict:
+        latencies = self.latencies[:min(self.latency_count, len(self.latencies))]
+        if len(latencies) != 0:
+            p50, p99 = (float(value) / 1e6 for value in np.percentile(latencies, [50, 99]))
+            max_latency = float(latencies.max()) / 1e6
+        else:
+            p50, p99, max_latency = 0.0, 0.0, 0.0
+        return {
+            'depth': self.depth(),
+            'max_depth': self.max_depth,
+            'received': self.received,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'latency_p50_ms': p50,
+            'latency_p99_ms': p99,
+            'latency_max_ms': max_latency,
+        }
@@ -0,0 +1,110 @@
+from typing import List, Tuple, Dict
+from collections import deque
+from datetime import datetime, timedelta
+import json
+import os
+import threading
+import time
+
+from loguru import logger
+
+
+class QuoteRecorder:
+    # subscribe_quote payloads as json lines, one file per day: {"time": arrival epoch ms, "period": subscribed
+    # period, "data": payload}. the callback thread only appends to a queue, a background writer serializes the
+    # payloads & appends them to the day files, payloads must not be mutated after they are recorded
+    def __init__(self, record_dir: str, batch_size: int = 256, flush_interval: float = 0.2):
+        self.record_dir: str = record_dir
+        self.batch_size: int = batch_size
+        self.flush_interval: float = flush_interval
+        self.queue: deque = deque()
+        # records lost by failed writes
+        self.failed: int = 0
+        # the writer thread & flush() callers drain one at a time
+        self.lock = threading.Lock()
+        self.running: bool = True
+        self.wakeup = threading.Event()
+        self.writer = threading.Thread(target=self.write_loop, name='quote-recorder', daemon=True)
+        self.writer.start()
+
+    @staticmethod
+    def from_config(config: dict, strategy_id: int):
+        # None when recording is off, every strategy records its own subscriptions
+        record_dir = config.get('replay', {}).get('record_dir', '')
+        if record_dir == '':
+            return None
+        return QuoteRecorder(os.path.join(record_dir, str(strategy_id)))
+
+    @staticmethod
+    def to_json(value):
+        # numpy scalars & arrays in the payload
+        return value.tolist() if hasattr(value, 'tolist') else str(value)
+
+    def path(self, day: str) -> str:
+        return os.path.join(self.record_dir, f'{day}.jsonl')
+
+    def record(self, data: dict, timestamp: int = None, period: str = 'tick'):
+        timestamp = int(time.time() * 1000) if timestamp is None else timestamp
+        self.queue.append((timestamp, period, data))
+
+    def write_batch(self, batch: list):
+        days: Dict[str, List[str]] = {}
+        for timestamp, period, data in batch:
+            day = datetime.fromtimestamp(timestamp / 1000).strftime('%Y%m%d')
+            days.setdefault(day, []).append(
+                json.dumps({'time': timestamp, 'period': period, 'data': data}, default=QuoteRecorder.to_json))
+        os.makedirs(self.record_dir, exist_ok=True)
+        for day, lines in days.items():
+            with open(self.path(day), 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+
+    def drain(self):
+        with self.lock:
+            while len(self.queue) != 0:
+                batch = []
+                while len(self.queue) != 0 and len(batch) < self.batch_size:
+                    batch.append(self.queue.popleft())
+                try:
+                    self.write_batch(batch)
+                except Exception as e:
+                    self.failed += len(batch)
+                    logger.error(f"quote recorder write failed, {len(batch)} records dropped: {e}")
+
+    def write_loop(self):
+        while self.running:
+            self.wakeup.wait(self.flush_interval)
+            self.drain()
+        self.drain()
+
+    def flush(self):
+        # everything recorded so far is on disk when flush returns
+        self.drain()
+
+    def close(self):
+        if not self.running:
+            return
+        self.running = False
+        self.wakeup.set()
+        self.writer.join()
+
+    @staticmethod
+    def read(record_dir: str, start: datetime, end: datetime) -> List[Tuple[int, str, dict]]:
+        # (arrival epoch ms, period, payload) in [start, end), in recorded order
+        start_ms, end_ms = int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+        records = []
+        day = start.date()
+        while day <= end.date():
+            path = os.path.join(record_dir, f'{day:%Y%m%d}.jsonl')
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            # a torn last line of a crashed session
+                            logger.warning(f"skip broken quote record in {path}")
+                            continue
+                        if start_ms <= record['time'] < end_ms:
+                            records.append((record['time'], record.get('period', 'tick'), record['data']))
+            day += timedelta(days=1)
+        return records
@@ -0,0 +1,70 @@
+from typing import List
+
+import numpy as np
+
+
+class RingBuffer:
+    # fixed size typed ring with a deque-like api, dtype may be structured,
+    # e.g. [('timestamp', 'M8[ms]'), ('price', 'f8')]
+    def __init__(self, size: int, dtype=np.float64):
+        self.maxlen: int = size
+        self.dtype = np.dtype(dtype)
+        self.data: np.ndarray = np.zeros(size, dtype=self.dtype)
+        # total number of appended items, the next write goes to count % maxlen
+        self.count: int = 0
+
+    def __len__(self) -> int:
+        return min(self.count, self.maxlen)
+
+    def to_item(self, item):
+        # objects with attributes named after the fields, e.g. StrategyData, are stored field by field
+        if self.dtype.names is not None and not isinstance(item, (tuple, np.void)):
+            return tuple(getattr(item, name) for name in self.dtype.names)
+        return item
+
+    def append(self, item):
+        self.data[self.count % self.maxlen] = self.to_item(item)
+        self.count += 1
+
+    def extend(self, items):
+        items = np.asarray(items, dtype=self.dtype)
+        if len(items) >= self.maxlen:
+            # only the newest maxlen items survive
+            self.count += len(items) - self.maxlen
+            items = items[-self.maxlen:]
+        begin = self.count % self.maxlen
+        first = min(len(items), self.maxlen - begin)
+        self.data[begin:begin + first] = items[:first]
+        self.data[:len(items) - first] = items[first:]
+        self.count += len(items)
+
+    def clear(self):
+        self.count = 0
+
+    def views(self, n: int = None) -> List[np.ndarray]:
+        # zero copy views of the last n items, oldest first, two segments when the range wraps
+        size = len(self)
+        n = size if n is None else min(n, size)
+        end = self.count % self.maxlen if self.count >= self.maxlen else self.count
+        if n <= end:
+            return [self.data[end - n:end]]
+        return [self.data[self.maxlen - (n - end):], self.data[:end]]
+
+    def last(self, n: int = None) -> np.ndarray:
+        # a view when the last n items are contiguous, otherwise a copy
+        segments = self.views(n)
+        if len(segments) == 1:
+            return segments[0]
+        return np.concatenate(segments)
+
+    def __getitem__(self, i: int):
+        size = len(self)
+        if i < 0:
+            i += size
+        if not 0 <= i < size:
+            raise IndexError("ring buffer index out of range")
+        return self.data[(self.count - size + i) % self.maxlen]
+
+    def __iter__(self):
+        for segment in self.views():
+            yield from segment
@@ -3,19 +3,23 @@ from datetime import datetime, timedelta
 
 class TimeUtils:
     @staticmethod
-    def get_morning_start(timestamp: datetime = datetime.now()) -> datetime:
+    def get_morning_start(timestamp: datetime = None) -> datetime:
+        timestamp = datetime.now() if timestamp is None else timestamp
         return timestamp.replace(hour=9, minute=30, second=0)
 
     @staticmethod
-    def get_morning_end(timestamp: datetime = datetime.now()) -> datetime:
+    def get_morning_end(timestamp: datetime = None) -> datetime:
+        timestamp = datetime.now() if timestamp is None else timestamp
         return timestamp.replace(hour=11, minute=30, second=0, microsecond=0)
 
     @staticmethod
-    def get_afternoon_start(timestamp: datetime = datetime.now()) -> datetime:
+    def get_afternoon_start(timestamp: datetime = None) -> datetime:
+        timestamp = datetime.now() if timestamp is None else timestamp
         return timestamp.replace(hour=13, minute=0, second=0)
 
     @staticmethod
-    def get_afternoon_end(timestamp: datetime = datetime.now()) -> datetime:
+    def get_afternoon_end(timestamp: datetime = None) -> datetime:
+        timestamp = datetime.now() if timestamp is None else timestamp
         return timestamp.replace(hour=15, minute=0, second=0)
 
     @staticmethod
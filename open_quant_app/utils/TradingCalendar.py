@@ -0,0 +1,101 @@
+from typing import Set
+from datetime import datetime, date, timedelta
+import bisect
+import os
+
+from loguru import logger
+import numpy as np
+
+
+class TradingCalendar:
+    # (hour, minute) of [morning start, morning end, afternoon start, afternoon end]
+    SESSIONS = [(9, 30), (11, 30), (13, 0), (15, 0)]
+
+    def __init__(self, start: date, end: date, holidays: Set[date] = None):
+        self.holidays: Set[date] = holidays if holidays is not None else set()
+        if isinstance(start, datetime):
+            start = start.date()
+        if isinstance(end, datetime):
+            end = end.date()
+        if len(self.holidays) != 0 and end.year > max(self.holidays).year:
+            # holidays are published a year at a time, later weekday holidays count as trading days
+            logger.warning(f"holidays are only known up to {max(self.holidays).year}, days after are weekdays only")
+        # trading days in [start, end]
+        days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+        days = days[np.is_busday(days)]
+        if len(self.holidays) != 0:
+            days = days[~np.isin(days, np.array(sorted(self.holidays), dtype='datetime64[D]'))]
+        self.days: np.ndarray = days
+        # flattened session bounds in ms, 4 per day: even index = open, odd index = close
+        offsets = np.array([np.timedelta64(hour * 60 + minute, 'm') for hour, minute in self.SESSIONS],
+                           dtype='timedelta64[ms]')
+        self.bounds: np.ndarray = (days.astype('datetime64[ms]')[:, None] + offsets[None, :]).ravel()
+        self.bound_list = self.bounds.astype(np.int64).tolist()
+
+    @staticmethod
+    def load_holidays(path: str) -> Set[date]:
+        holidays = set()
+        if path == '' or not os.path.exists(path):
+            logger.warning(f"holiday file {path} not found, only weekends are closed")
+            return holidays
+        with open(path) as f:
+            for line in f:
+                line = line.split('#')[0].strip()
+                if line != '':
+                    holidays.add(datetime.strptime(line, "%Y%m%d").date())
+        return holidays
+
+    @staticmethod
+    def from_config(config: dict, start: date, end: date):
+        return TradingCalendar(start, end, TradingCalendar.load_holidays(config['calendar']['holiday_path']))
+
+    @staticmethod
+    def to_ms(timestamp: datetime) -> int:
+        return int(np.datetime64(timestamp, 'ms').astype(np.int64))
+
+    def is_trading_day(self, day: date) -> bool:
+        day = np.datetime64(day, 'D')
+        index = np.searchsorted(self.days, day)
+        return index < len(self.days) and self.days[index] == day
+
+    def is_trading(self, timestamp: datetime) -> bool:
+        ms = self.to_ms(timestamp)
+        index = bisect.bisect_left(self.bound_list, ms)
+        # on a bound (both ends inclusive, same as TimeUtils.judge_trade_time) or inside a session
+        return (index < len(self.bound_list) and self.bound_list[index] == ms) or index % 2 == 1
+
+    def next_tick(self, timestamp: datetime, period: float = 1) -> datetime:
+        ms = self.to_ms(timestamp) + int(round(period * 1000))
+        index = bisect.bisect_left(self.bound_list, ms)
+        if (index < len(self.bound_list) and self.bound_list[index] == ms) or index % 2 == 1:
+            return timestamp + timedelta(seconds=period)
+        if index >= len(self.bound_list):
+            logger.warning(f"timestamp {timestamp} is beyond calendar end {self.days[-1]}")
+            return timestamp + timedelta(seconds=period)
+        # jump to the next session open
+        return np.datetime64(self.bound_list[index], 'ms').astype(datetime)
+
+    def trading_timestamps(self, start: datetime, end: datetime, period: float = 1) -> np.ndarray:
+        step = int(round(period * 1000))
+        start_ms, end_ms = self.to_ms(start), self.to_ms(end)
+        opens = self.bounds[0::2].astype(np.int64)
+        closes = self.bounds[1::2].astype(np.int64)
+        # sessions overlapping [start, end), ticks aligned to session open
+        mask = (closes >= start_ms) & (opens < end_ms)
+        opens, closes = opens[mask], closes[mask]
+        first = opens + np.maximum(start_ms - opens + step - 1, 0) // step * step
+        last = np.minimum(closes, end_ms - 1)
+        counts = np.maximum((last - first) // step + 1, 0)
+        counts[last < first] = 0
+        begins = np.cumsum(counts) - counts
+        ticks = np.repeat(first, counts) + (np.arange(counts.sum()) - np.repeat(begins, counts)) * step
+        return ticks.astype('datetime64[ms]')
+
+    def iter_timestamps(self, start: datetime, end: datetime, period: float = 1):
+        # trading_timestamps one day at a time, a long range never holds every tick in memory
+        first = np.searchsorted(self.days, np.datetime64(start, 'D'))
+        last = np.searchsorted(self.days, np.datetime64(end, 'D'), 'right')
+        for day in self.days[first:last].tolist():
+            day_start = datetime.combine(day, datetime.min.time())
+            yield from self.trading_timestamps(max(start, day_start), min(end, day_start + timedelta(days=1)),
+                                               period).tolist()
@@ -0,0 +1,41 @@
+# backtest books over a wide universe, runs offline with benchmarks/fake_xtquant when xtquant is missing
+#   python -m pytest tests/test_back_ledger.py
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import toml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+try:
+    import xtquant
+except ImportError:
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks', 'fake_xtquant'))
+
+from open_quant_app.backtest.BackLedger import StrategyBook
+from open_quant_app.backtest.BackTester import BackTester
+
+
+def wide_config(stocks: int) -> dict:
+    config = toml.load(os.path.join(ROOT, 'config', 'config.toml'))
+    config['stock']['stock_ids'] = [[f'{600000 + i}.SH' for i in range(stocks)]]
+    return config
+
+
+def test_sample_with_more_stocks_than_book_capacity():
+    back_tester = BackTester(wide_config(70), cash=1e6)
+    back_tester.advance(datetime(2024, 1, 2, 9, 30))
+    back_tester.fill('600069.SH', 23, 100, 10.0, 0, 10.0)
+    back_tester.advance(datetime(2024, 1, 2, 9, 35))
+    curve = back_tester.equity.view()
+    assert len(curve['equity']) == 2
+    assert curve['strategy_values'][-1][0] == 0.0
+
+
+def test_strategy_book_values_pads_late_stocks():
+    book = StrategyBook(1, capacity=2)
+    book.fill(0, 1, True, 10.0, 100)
+    values = book.values(np.array([1.0, 11.0, 5.0, 7.0]))
+    assert values[0] == -1000.0 + 1100.0
@@ -0,0 +1,44 @@
+# backtest tasks run in one process, runs offline with benchmarks/fake_xtquant when xtquant is missing
+#   python -m pytest tests/test_back_test_runner.py
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import toml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+try:
+    import xtquant
+except ImportError:
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks', 'fake_xtquant'))
+
+from open_quant_app.backtest.BackTestRunner import BackTestRunner, BackTestTask
+from open_quant_app.data.BarStore import BarStore
+from open_quant_app.strategy.Strategy import Strategy
+
+
+class HoldStrategy(Strategy):
+    # buys volume of every stock on the first bar and holds
+    volume = 100
+
+    def exec_vector(self, timestamps: np.ndarray, prices: np.ndarray) -> np.ndarray:
+        return np.full(prices.shape, self.volume, dtype=np.int64)
+
+
+def test_run_vector_from_bar_store(tmp_path):
+    config = toml.load(os.path.join(ROOT, 'config', 'config.toml'))
+    config['stock']['stock_ids'] = [['A', 'B'], ['C']]
+    config['data']['store_path'] = str(tmp_path)
+    config['backtest']['report_dir'] = str(tmp_path / 'output')
+    store = BarStore.from_config(config)
+    times = BarStore.to_ms(datetime(2024, 3, 4, 9, 30)) + np.arange(3, dtype=np.int64) * 60000
+    for stock_id, close in [('A', [10.0, 11.0, 12.0]), ('B', [5.0, 5.0, 4.0]), ('C', [20.0, 20.0, 20.0])]:
+        store.append(stock_id, '1m', {'time': times, 'close': np.array(close)})
+    summary = BackTestRunner.run_vector(config, HoldStrategy, BackTestTask(0, {'volume': 200}),
+                                        datetime(2024, 3, 4), datetime(2024, 3, 5), 100000, '1m')
+    assert summary['strategy_id'] == 0
+    assert summary['buy_orders'] == 2 and summary['sell_orders'] == 0
+    # 200 A bought at 10, 200 B at 5, valued at the fill prices
+    assert summary['curr'] == 100000
@@ -0,0 +1,73 @@
+# instant fills & equity sampling of the back tester, runs offline with benchmarks/fake_xtquant when xtquant is missing
+#   python -m pytest tests/test_back_tester.py
+import os
+import sys
+from datetime import datetime, timedelta
+
+import toml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+try:
+    import xtquant
+except ImportError:
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks', 'fake_xtquant'))
+
+from xtquant import xtconstant
+
+from open_quant_app.backtest.BackTester import BackTester
+
+START = datetime(2024, 1, 2, 9, 30)
+
+
+def back_tester() -> BackTester:
+    config = toml.load(os.path.join(ROOT, 'config', 'config.toml'))
+    config['stock']['stock_ids'] = [['A', 'B'], ['C']]
+    return BackTester(config, cash=100000)
+
+
+def test_buy_fills_at_order_price():
+    tester = back_tester()
+    tester.advance(START)
+    assert tester.order_stock('A', xtconstant.STOCK_BUY, 100, 10.0, 0) == 0
+    assert tester.account.cash == 99000
+    assert tester.stocks.volume[tester.stocks.get('A')] == 100
+    assert len(tester.records) == 1
+    assert tester.value() == 100000
+
+
+def test_rejected_orders_do_not_fill():
+    tester = back_tester()
+    tester.advance(START)
+    # beyond the strategy's half of the assets, and a sell without a position
+    assert tester.order_stock('A', xtconstant.STOCK_BUY, 6000, 10.0, 0) == -1
+    assert tester.order_stock('C', xtconstant.STOCK_SELL, 100, 10.0, 1) == -1
+    assert len(tester.records) == 0
+    assert tester.account.cash == 100000
+
+
+def test_sample_attributes_pnl_per_strategy():
+    tester = back_tester()
+    tester.advance(START)
+    tester.order_stock('A', xtconstant.STOCK_BUY, 100, 10.0, 0)
+    tester.order_stock('C', xtconstant.STOCK_BUY, 200, 5.0, 1)
+    tester.mark('A', 11.0)
+    tester.advance(START + timedelta(seconds=30))
+    # sampled once per equity interval
+    assert len(tester.equity) == 1
+    tester.advance(START + timedelta(minutes=1))
+    tester.order_stock('C', xtconstant.STOCK_SELL, 200, 4.5, 1)
+    tester.advance(START + timedelta(minutes=2))
+    curve = tester.equity.view()
+    assert curve['equity'].tolist() == [100000, 100100, 100000]
+    assert curve['strategy_values'][-1].tolist() == [100, -100]
+    assert curve['cash'][-1] == 100000 - 1000 - 1000 + 900
+
+
+def test_report_creates_the_report_dir(tmp_path):
+    tester = back_tester()
+    tester.report_dir = str(tmp_path / 'output' / 'run')
+    tester.advance(START)
+    tester.order_stock('A', xtconstant.STOCK_BUY, 100, 10.0, 0)
+    tester.report(0, save_as_file=True)
+    assert os.path.exists(os.path.join(tester.report_dir, 'strategy-0.csv'))
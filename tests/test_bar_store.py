@@ -0,0 +1,39 @@
+# columnar bar store, python -m pytest tests/test_bar_store.py
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from open_quant_app.data.BarStore import BarStore
+
+
+def bars(n: int = 3) -> dict:
+    times = BarStore.to_ms(datetime(2024, 3, 4, 9, 30)) + np.arange(n, dtype=np.int64) * 60000
+    return {'time': times, 'close': np.arange(n, dtype=np.float64) + 10, 'volume': np.arange(n, dtype=np.int64)}
+
+
+def test_append_is_idempotent_and_read_back(tmp_path):
+    store = BarStore(str(tmp_path))
+    assert store.append('A', '1m', bars()) == 3
+    assert store.append('A', '1m', bars(4)) == 1
+    data = store.read('A', '1m', datetime(2024, 3, 4), datetime(2024, 3, 5))
+    assert data['close'].tolist() == [10.0, 11.0, 12.0, 13.0]
+    assert data['volume'].dtype == np.int64
+
+
+@pytest.mark.parametrize('column', [np.array(['a', 'b', 'c'], dtype=object), np.array(['a', 'b', 'c']),
+                                    np.zeros((3, 5))])
+def test_non_numeric_columns_are_rejected(tmp_path, column):
+    store = BarStore(str(tmp_path))
+    data = bars()
+    data['extra'] = column
+    with pytest.raises(ValueError):
+        store.append('A', 'tick', data)
+    # nothing is written
+    assert store.years('A', 'tick') == []
+    assert store.load_schema('A', 'tick') == {}
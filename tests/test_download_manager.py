@@ -0,0 +1,66 @@
+# download jobs into the bar store, runs offline with benchmarks/fake_xtquant when xtquant is missing
+#   python -m pytest tests/test_download_manager.py
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+import toml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+try:
+    import xtquant
+except ImportError:
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks', 'fake_xtquant'))
+
+from open_quant_app.data.BarStore import BarStore
+from open_quant_app.data.DownloadManager import DownloadManager
+import open_quant_app.data.DownloadManager as download_module
+
+
+def ticks() -> pd.DataFrame:
+    start = BarStore.to_ms(datetime(2024, 3, 4, 9, 30))
+    return pd.DataFrame({
+        'time': [start, start + 3000],
+        'lastPrice': [10.0, 10.1],
+        'stime': ['20240304093000', '20240304093003'],
+        'bidPrice': [[9.99, 9.98, 9.97, 9.96, 9.95], [10.09, 10.08, 10.07, 10.06, 10.05]],
+        'askPrice': [[10.0, 10.01, 10.02, 10.03, 10.04], [10.1, 10.11, 10.12, 10.13, 10.14]],
+        'bidVol': [[1, 2, 3, 4, 5], [6, 7, 8, 9, 10]],
+        'askVol': [[5, 4, 3, 2, 1], [10, 9, 8, 7, 6]],
+    })
+
+
+def manager(store: BarStore = None, **kwargs) -> DownloadManager:
+    config = toml.load(os.path.join(ROOT, 'config', 'config.toml'))
+    config['stock']['stock_ids'] = [['A']]
+    return DownloadManager(config, store, **kwargs)
+
+
+def test_ticks_are_stored_with_flat_book_levels(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_module.xt_data, 'get_market_data_ex', lambda *args, **kwargs: {'A': ticks()})
+    store = BarStore(str(tmp_path))
+    metrics = manager(store).run(['tick'], '20240304', '20240304')
+    assert metrics['bars_stored'] == 2
+    assert metrics['job_progress'] == [('tick', 'A', 1, 1, 1)]
+    data = store.read('A', 'tick', datetime(2024, 3, 4), datetime(2024, 3, 5))
+    assert 'stime' not in data and 'bidPrice' not in data
+    assert data['bidPrice1'].tolist() == [9.99, 10.09]
+    assert data['askPrice5'].tolist() == [10.04, 10.14]
+    assert data['askVol1'].tolist() == [5, 10]
+
+
+def test_failed_jobs_retry_with_backoff(monkeypatch):
+    calls, sleeps = [], []
+
+    def download(stock_ids, period, start_time, end_time, callback):
+        calls.append(stock_ids)
+        raise RuntimeError('disconnected')
+
+    monkeypatch.setattr(download_module.xt_data, 'download_history_data2', download)
+    monkeypatch.setattr(download_module.time, 'sleep', sleeps.append)
+    metrics = manager(retries=2, backoff=0.5).run(['1d'], '20240304', '20240304')
+    assert len(calls) == 3
+    assert sleeps == [0.5, 1.0]
+    assert metrics['failed_jobs'] == 1
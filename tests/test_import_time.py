@@ -0,0 +1,63 @@
+# startup budget of a backtest worker / live restart, runs offline with benchmarks/fake_xtquant when xtquant is missing
+#   python -m pytest tests/test_import_time.py
+#   IMPORT_BUDGET=0.5 python -m pytest tests/test_import_time.py
+import json
+import os
+import subprocess
+import sys
+
+import toml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET = float(os.environ.get('IMPORT_BUDGET', 1.0))
+HEAVY_MODULES = ['pandas', 'xtquant.xttrader', 'xtquant.xtdata']
+
+# fresh interpreter per check, sys.modules of the test process already holds everything
+PROBE = '''
+import json, os, sys, time
+sys.path.insert(0, {root!r})
+try:
+    import xtquant
+except ImportError:
+    sys.path.insert(0, os.path.join({root!r}, 'benchmarks', 'fake_xtquant'))
+start = time.perf_counter()
+from open_quant_app.trade.Trader import Trader, TradeMode
+from open_quant_app.strategy.Strategy import Strategy
+elapsed = time.perf_counter() - start
+config = json.loads({config!r})
+trader = Trader(config, {mode})
+strategy = Strategy(0, trader, config)
+{extra}
+print(json.dumps({{'elapsed': elapsed, 'modules': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def probe(mode: str = 'TradeMode.BACKTEST', extra: str = '') -> dict:
+    config = toml.load(os.path.join(ROOT, 'config', 'config.toml'))
+    config['stock']['stock_ids'] = [['600000.SH']]
+    code = PROBE.format(root=ROOT, config=json.dumps(config), mode=mode, extra=extra, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_backtest_startup_skips_heavy_modules():
+    result = probe()
+    assert result['modules'] == []
+
+
+def test_backtest_startup_within_budget():
+    # best of 3, the first run also pays for writing the bytecode cache
+    elapsed = min(probe()['elapsed'] for _ in range(3))
+    assert elapsed < BUDGET, f"import took {elapsed:.3f}s, budget {BUDGET}s"
+
+
+def test_backtest_order_builds_back_tester_only():
+    result = probe(extra="trader.order_stock('600000.SH', 23, 100, 10.0, 0)")
+    assert result['modules'] == []
+
+
+def test_market_mode_loads_broker_on_demand():
+    result = probe('TradeMode.MARKET', extra='trader.xt_trader')
+    assert 'xtquant.xttrader' in result['modules']
+    assert 'pandas' not in result['modules']
@@ -0,0 +1,116 @@
+# order timeouts, cancel & chase, runs offline with benchmarks/fake_xtquant when xtquant is missing
+#   python -m pytest tests/test_order_manager.py
+import os
+import sys
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+try:
+    import xtquant
+except ImportError:
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks', 'fake_xtquant'))
+
+from xtquant import xtconstant
+from xtquant.xttype import XtOrder, XtCancelError
+
+from open_quant_app.manager.OrderManager import OrderManager, OrderTuple, Order, OrderStatus
+
+START = datetime(2024, 1, 2, 9, 30)
+
+
+class RecordingTrader:
+    # the trader calls of OrderManager, order ids count up from 100
+    def __init__(self, cancel_result: int = 0):
+        self.order_listeners: list = []
+        self.cancel_error_listeners: list = []
+        self.cancel_result: int = cancel_result
+        self.orders: list = []
+        self.cancels: list = []
+
+    def order_stock(self, stock_id: str, order_type: int, volume: int, price: float, strategy_id: int) -> int:
+        self.orders.append((stock_id, order_type, volume, price, strategy_id))
+        return 100 + len(self.orders)
+
+    def cancel_order_stock(self, order_id: int) -> int:
+        self.cancels.append(order_id)
+        return self.cancel_result
+
+
+def push(trader: RecordingTrader, order_id: int, status: int, traded_volume: int):
+    order = XtOrder('', 'A', order_id, '', 0, xtconstant.STOCK_BUY, 300, xtconstant.FIX_PRICE, 10.0, traded_volume,
+                    10.0, status)
+    for listener in trader.order_listeners:
+        listener(order)
+
+
+def manager(trader: RecordingTrader, max_chase: int = 5) -> OrderManager:
+    order_manager = OrderManager(trader, ['A'], delay=3, max_chase=max_chase)
+    order_manager.insert(OrderTuple(['A'], [Order(1, START, 'A', xtconstant.STOCK_BUY, 300, 10.0, 0)]))
+    return order_manager
+
+
+def test_cancel_after_timeout():
+    trader = RecordingTrader()
+    order_manager = manager(trader)
+    order_manager.handle(START + timedelta(seconds=2))
+    assert trader.cancels == []
+    order_manager.handle(START + timedelta(seconds=3))
+    assert trader.cancels == [1]
+    # a pending cancel is not sent again
+    order_manager.handle(START + timedelta(seconds=10))
+    assert trader.cancels == [1]
+
+
+def test_chase_remaining_volume_after_cancel():
+    trader = RecordingTrader()
+    order_manager = manager(trader)
+    order_manager.handle(START + timedelta(seconds=3))
+    push(trader, 1, xtconstant.ORDER_PART_CANCEL, 100)
+    order_manager.handle(START + timedelta(seconds=4))
+    # re-priced one tick up for the remaining volume
+    assert trader.orders == [('A', xtconstant.STOCK_BUY, 200, 10.01, 0)]
+    assert [order.order_id for order in order_manager.working_orders('A')] == [101]
+    assert order_manager.orders[0].status == OrderStatus.BUY_UNFINISHED
+
+
+def test_filled_order_finishes_tuple():
+    trader = RecordingTrader()
+    order_manager = manager(trader)
+    push(trader, 1, xtconstant.ORDER_SUCCEEDED, 300)
+    order_manager.handle(START + timedelta(seconds=4))
+    assert trader.cancels == []
+    assert order_manager.empty()
+
+
+def test_give_up_after_max_chase():
+    trader = RecordingTrader()
+    order_manager = manager(trader, max_chase=0)
+    order_manager.handle(START + timedelta(seconds=3))
+    push(trader, 1, xtconstant.ORDER_CANCELED, 0)
+    order_manager.handle(START + timedelta(seconds=4))
+    order_manager.handle(START + timedelta(seconds=5))
+    assert trader.orders == []
+    assert order_manager.empty()
+
+
+def test_rejected_cancel_is_retried():
+    trader = RecordingTrader(cancel_result=-1)
+    order_manager = manager(trader)
+    order_manager.handle(START + timedelta(seconds=3))
+    order_manager.handle(START + timedelta(seconds=5))
+    assert trader.cancels == [1]
+    order_manager.handle(START + timedelta(seconds=6))
+    assert trader.cancels == [1, 1]
+
+
+def test_async_cancel_error_rearms_timeout():
+    trader = RecordingTrader()
+    order_manager = manager(trader)
+    order_manager.handle(START + timedelta(seconds=3))
+    for listener in trader.cancel_error_listeners:
+        listener(XtCancelError('', 1, error_msg='order is filling'))
+    order_manager.handle(START + timedelta(seconds=5))
+    assert trader.cancels == [1]
+    order_manager.handle(START + timedelta(seconds=6))
+    assert trader.cancels == [1, 1]
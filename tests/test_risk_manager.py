@@ -0,0 +1,162 @@
+# vectorized pre-trade checks, runs offline with benchmarks/fake_xtquant when xtquant is missing
+#   python -m pytest tests/test_risk_manager.py
+import os
+import sys
+
+import numpy as np
+import toml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+try:
+    import xtquant
+except ImportError:
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks', 'fake_xtquant'))
+
+from xtquant import xtconstant
+from xtquant.xttype import XtPosition, XtAsset, XtOrder, XtTrade
+
+from open_quant_app.manager.RiskManager import RiskManager
+
+BUY, SELL = xtconstant.STOCK_BUY, xtconstant.STOCK_SELL
+
+
+def risk_manager(cash: float = 100000, frozen_cash: float = 0.0, orders: list = None,
+                 max_turnover: float = 0.0) -> RiskManager:
+    # strategy 0 trades A & B, strategy 1 trades C, each may use half of the assets, 1000 A held at 10
+    config = toml.load(os.path.join(ROOT, 'config', 'config.toml'))
+    config['stock']['stock_ids'] = [['A', 'B'], ['C']]
+    config['risk']['max_turnover'] = max_turnover
+    manager = RiskManager(config)
+    manager.load([XtPosition('', 'A', 1000, 1000, 10.0, 10000.0)], XtAsset('', cash, frozen_cash, 10000.0, 100000.0),
+                 orders or [])
+    return manager
+
+
+def test_buy_within_strategy_room():
+    manager = risk_manager()
+    mask, max_volumes = manager.check(['B'], [BUY], [100], [10.0], [0], 0)
+    assert mask.tolist() == [True]
+    assert max_volumes.tolist() == [100]
+    # a tenth of the assets not held by the strategy
+    mask, max_volumes = manager.check(['B'], [BUY], [1000], [10.0], [0], 0)
+    assert mask.tolist() == [True]
+    assert max_volumes.tolist() == [900]
+
+
+def test_buy_beyond_strategy_room():
+    mask, _ = risk_manager().check(['B'], [BUY], [4100], [10.0], [0], 0)
+    assert mask.tolist() == [False]
+
+
+def test_max_buy_fits_strategy_room():
+    # 20 strategies get 5% of the assets each, less than the tenth max buy volumes are sized from
+    config = toml.load(os.path.join(ROOT, 'config', 'config.toml'))
+    config['stock']['stock_ids'] = [[f'{600000 + i}.SH'] for i in range(20)]
+    manager = RiskManager(config)
+    manager.load([], XtAsset('', 1e6, 0.0, 0.0, 1e6), [])
+    mask, max_volumes = manager.check(['600000.SH'], [BUY], [6000], [10.0], [0], 0)
+    assert mask.tolist() == [False]
+    assert max_volumes.tolist() == [5000]
+    mask, _ = manager.check(['600000.SH'], [BUY], max_volumes, [10.0], [0], 0)
+    assert mask.tolist() == [True]
+
+
+def test_batch_buys_use_up_room_in_order():
+    mask, _ = risk_manager().check(['B', 'B', 'C'], [BUY, BUY, BUY], [2500, 2000, 2000], [10.0, 10.0, 10.0],
+                                   [0, 0, 1], 0)
+    assert mask.tolist() == [True, False, True]
+
+
+def test_buy_limited_by_cash():
+    manager = risk_manager(cash=5000)
+    mask, max_volumes = manager.check(['B'], [BUY], [600], [10.0], [0], 0)
+    assert mask.tolist() == [False]
+    assert max_volumes.tolist() == [500]
+    mask, _ = manager.check(['B'], [BUY], [500], [10.0], [0], 0)
+    assert mask.tolist() == [True]
+
+
+def test_frozen_cash_of_working_buys_counts_once():
+    working = XtOrder('', 'B', 1, '', 0, BUY, 100, xtconstant.FIX_PRICE, 10.0, 0, 0.0, xtconstant.ORDER_REPORTED)
+    manager = risk_manager(cash=5000, frozen_cash=1000, orders=[working])
+    mask, max_volumes = manager.check(['B', 'B'], [BUY, BUY], [500, 501], [10.0, 10.0], [0, 1], 0)
+    assert mask.tolist() == [True, False]
+    assert max_volumes[0] == 500
+
+
+def test_sell_limited_by_available_and_working_sells():
+    working = XtOrder('', 'A', 1, '', 0, SELL, 400, xtconstant.FIX_PRICE, 10.0, 0, 0.0, xtconstant.ORDER_REPORTED)
+    mask, max_volumes = risk_manager(orders=[working]).check(['A', 'A', 'Z'], [SELL, SELL, SELL], [600, 1, 100],
+                                                             [10.0, 10.0, 10.0], [0, 0, 0], 0)
+    assert mask.tolist() == [True, False, False]
+    assert max_volumes.tolist() == [600, 0, 0]
+
+
+def test_frozen_volume_of_working_sells_counts_once():
+    working = XtOrder('', 'A', 1, '', 0, SELL, 500, xtconstant.FIX_PRICE, 10.0, 0, 0.0, xtconstant.ORDER_REPORTED)
+    manager = risk_manager(orders=[working])
+    manager.load([XtPosition('', 'A', 1000, 500, 10.0, 10000.0, 500)], XtAsset('', 100000, 0.0, 10000.0, 100000.0),
+                 [working])
+    mask, max_volumes = manager.check(['A', 'A'], [SELL, SELL], [500, 1], [10.0, 10.0], [0, 0], 0)
+    assert mask.tolist() == [True, False]
+    assert max_volumes.tolist() == [500, 0]
+
+
+def test_stocks_outside_the_config_can_be_sold():
+    manager = risk_manager()
+    manager.load([XtPosition('', 'Z', 300, 300, 10.0, 3000.0)], XtAsset('', 100000, 0.0, 3000.0, 100000.0), [])
+    mask, max_volumes = manager.check(['Z', 'Z'], [SELL, SELL], [200, 101], [10.0, 10.0], [0, 0], 0)
+    assert mask.tolist() == [True, False]
+    assert max_volumes.tolist() == [300, 100]
+    # bought in the session, then sold
+    manager.on_submit('Y', BUY, 100, 10.0, 0, 0)
+    manager.on_fill('Y', BUY, 100, 10.0, 0)
+    mask, _ = manager.check(['Y'], [SELL], [100], [10.0], [0], 0)
+    assert mask.tolist() == [True]
+
+
+def test_turnover_limits_buys_and_unpriced_sells():
+    manager = risk_manager(max_turnover=0.1)
+    mask, _ = manager.check(['B', 'A'], [BUY, SELL], [1100, 1000], [10.0, 0.0], [0, 1], 0)
+    # the sell is priced at the average cost of A, 10000 <= 10% of the assets
+    assert mask.tolist() == [False, True]
+    manager.on_fill('B', BUY, 500, 10.0, 0)
+    mask, max_volumes = manager.check(['A'], [SELL], [1000], [0.0], [0], 0)
+    assert mask.tolist() == [False]
+    assert max_volumes.tolist() == [500]
+
+
+def test_single_order_path_matches_batch():
+    manager = risk_manager(cash=30000, max_turnover=0.2)
+    manager.on_submit('B', BUY, 500, 10.0, 0, 0)
+    manager.on_fill('A', SELL, 100, 11.0, 0, 11.0)
+    # the incrementally kept sums match a recompute
+    assert np.allclose(manager.strategy_committed, manager.membership @ (manager.cost + manager.pending_buy))
+    for stock_id, order_type, volume, price, strategy_id in [
+            ('A', BUY, 100, 10.0, 0), ('B', BUY, 3000, 10.0, 0), ('C', BUY, 5000, 5.0, 1), ('Z', BUY, 10, 1.0, 1),
+            ('B', BUY, 100, 0.0, 0), ('A', SELL, 900, 0.0, 0), ('A', SELL, 901, 12.0, 0), ('Z', SELL, 10, 1.0, 0),
+            ('A', 0, 100, 10.0, 0)]:
+        order = ([stock_id], [order_type], [volume], [price], [strategy_id])
+        single = manager.check(*order, 0)
+        batch = manager.check_batch(*order, 0)
+        assert single[0].tolist() == batch[0].tolist() and single[1].tolist() == batch[1].tolist(), order
+
+
+def test_pushes_release_working_volume_once():
+    manager = risk_manager(cash=5000)
+    manager.on_submit('B', BUY, 500, 10.0, 0, 0, 7)
+    mask, _ = manager.check(['B'], [BUY], [100], [10.0], [0], 0)
+    assert mask.tolist() == [False]
+    manager.on_trade(XtTrade('', 'B', BUY, 1, 0, 9.9, 200, 1980.0, 7, ''))
+    assert manager.pending_buy_total == 3000
+    assert manager.turnover.tolist()[0] == 1980
+    canceled = XtOrder('', 'B', 7, '', 0, BUY, 500, xtconstant.FIX_PRICE, 10.0, 200, 9.9, xtconstant.ORDER_PART_CANCEL)
+    manager.on_order(canceled)
+    assert manager.pending_buy_total == 0
+    mask, _ = manager.check(['B'], [BUY], [300], [10.0], [0], 0)
+    assert mask.tolist() == [True]
+    # a repeated push does not release the next order
+    manager.on_submit('B', BUY, 300, 10.0, 0, 0, 8)
+    manager.on_order(canceled)
+    assert manager.pending_buy_total == 3000
@@ -0,0 +1,20 @@
+# trading sessions & tick grids, python -m pytest tests/test_trading_calendar.py
+import os
+import sys
+from datetime import datetime, date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from open_quant_app.utils.TradingCalendar import TradingCalendar
+
+
+def test_iter_timestamps_matches_the_full_grid():
+    calendar = TradingCalendar(date(2024, 2, 28), date(2024, 3, 12), {date(2024, 3, 6)})
+    for start, end in [(datetime(2024, 2, 28), datetime(2024, 3, 12, 23)),
+                       (datetime(2024, 3, 1, 10, 15, 7), datetime(2024, 3, 5, 14)),
+                       (datetime(2024, 3, 2), datetime(2024, 3, 3)),
+                       (datetime(2024, 3, 6, 10), datetime(2024, 3, 7, 9, 31))]:
+        timestamps = list(calendar.iter_timestamps(start, end, 30))
+        assert timestamps == calendar.trading_timestamps(start, end, 30).tolist()
+        assert all(calendar.is_trading(timestamp) for timestamp in timestamps)
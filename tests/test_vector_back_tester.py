@@ -0,0 +1,63 @@
+# vectorized target position backtests, runs offline with benchmarks/fake_xtquant when xtquant is missing
+#   python -m pytest tests/test_vector_back_tester.py
+import os
+import sys
+
+import numpy as np
+import toml
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+try:
+    import xtquant
+except ImportError:
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks', 'fake_xtquant'))
+
+from open_quant_app.backtest.VectorBackTester import VectorBackTester
+
+
+def back_tester(prices: dict, stock_ids: list, cash: float) -> VectorBackTester:
+    config = toml.load(os.path.join(ROOT, 'config', 'config.toml'))
+    config['stock']['stock_ids'] = stock_ids
+    tester = VectorBackTester(config, cash)
+    rows = len(next(iter(prices.values())))
+    timestamps = np.datetime64('2024-03-04T09:30') + np.arange(rows) * np.timedelta64(1, 'm')
+    tester.load(timestamps, prices)
+    return tester
+
+
+def test_targets_within_limits_fill_as_set():
+    tester = back_tester({'A': [10.0, 11.0, 12.0]}, [['A']], 10000)
+    tester.set_targets(0, np.array([[100], [300], [0]]))
+    tester.run()
+    assert tester.targets[:, 0].tolist() == [100, 300, 0]
+    assert tester.value() == 10000 - 1000 - 2200 + 3600
+
+
+def test_buys_over_cash_are_rejected():
+    tester = back_tester({'A': [10.0, 10.0, 5.0]}, [['A']], 1500)
+    tester.set_targets(0, np.array([[100], [200], [200]]))
+    tester.run()
+    # 200 more would cost 2000 at 10, the target is reached once the price halves
+    assert tester.targets[:, 0].tolist() == [100, 100, 200]
+    assert tester.cash.tolist() == [500, 500, 0]
+    assert (tester.cash >= 0).all()
+
+
+def test_buys_over_position_limit_are_rejected():
+    # two strategies, half of the equity each
+    tester = back_tester({'A': [10.0, 10.0], 'B': [10.0, 10.0]}, [['A'], ['B']], 10000)
+    tester.set_targets(0, np.array([[600], [400]]))
+    tester.set_targets(1, np.array([[100], [100]]))
+    tester.run()
+    assert tester.targets.tolist() == [[0, 100], [400, 100]]
+    assert tester.records['volume'].tolist() == [100, 400]
+
+
+def test_report_creates_the_report_dir(tmp_path):
+    tester = back_tester({'A': [10.0, 11.0]}, [['A']], 10000)
+    tester.report_dir = str(tmp_path / 'output' / 'run')
+    tester.set_targets(0, np.array([[100], [100]]))
+    tester.run()
+    tester.report(0, save_as_file=True)
+    assert os.path.exists(os.path.join(tester.report_dir, 'strategy-0.csv'))